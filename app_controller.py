@@ -3,16 +3,18 @@ import threading
 import datetime
 import os
 import locale
-import time
+import sys
 
 from config import *
-from models import AppState
+from models import AppState, ConnectivityStrategy
 from utils import resource_path, FeatureCodeManager, SingleThreadPreciseTimer
+from candidates import Candidate
 from audio_manager import AudioManager
 from network_manager import NetworkManager
 from ui_manager import UIManager
 from state_manager import CallStateManager
 from event_handler import EventHandler
+from audio_codec import load_external_codecs
 from ui_handler import UIStateHandler
 
 class AppController:
@@ -63,6 +65,7 @@ class AppController:
         )
 
         self.network_manager.data_received_callback = self.event_handler.on_network_data_received
+        self.network_manager.punch_confirmed_callback = self.state_manager.handle_punch_confirmed
         
         self.ui_manager.app_callbacks = self.event_handler.get_ui_callbacks()
         if hasattr(self.ui_manager, '_assign_callbacks'):
@@ -89,6 +92,7 @@ class AppController:
         threading.Thread(target=self._perform_full_initialization_flow, daemon=True).start()
 
     def _perform_full_initialization_flow(self):
+        load_external_codecs(AUDIO_EXTERNAL_CODEC_MODULES, lambda msg, **kwargs: self.log_message(msg, "Audio", **kwargs))
         audio_init_success = self.audio_manager.initialize_pyaudio_core()
         network_init_success, network_msg = self.network_manager.start_listening_and_stun()
         
@@ -100,6 +104,8 @@ class AppController:
 
         if network_init_success:
             self.is_running_main_op = True
+            if self.network_manager.discovery_from_cache:
+                self.can_reliably_receive_calls = self.network_manager.is_cone_nat
             if self.master.winfo_exists():
                 self.master.after(0, lambda: self.ui_manager.set_local_ip_port_display(self.network_manager.public_ip, str(self.network_manager.public_port)))
                 self.master.after(0, self.generate_and_update_feature_code)
@@ -113,15 +119,28 @@ class AppController:
                 self.master.after(0, lambda: self.ui_manager.set_local_ip_port_display(self.network_manager.public_ip or "获取失败", "N/A"))
 
     def _perform_nat_test_in_background(self):
-        self.log_message("开始后台NAT开放性测试...")
-        nat_test_passed = self.network_manager.check_nat_openness_for_unsolicited_responses()
-        if not nat_test_passed:
-            self.log_message("首次NAT开放性测试失败。将在5秒后重试一次。", is_warning=True)
-            time.sleep(5)
-            self.log_message("正在重试NAT开放性测试...")
-            nat_test_passed = self.network_manager.check_nat_openness_for_unsolicited_responses()
-        
+        if self.network_manager.discovery_from_cache:
+            self.log_message("后台重新验证缓存的公网地址...")
+            revalidation = self.network_manager.revalidate_discovery()
+            if revalidation:
+                self.log_message("公网映射地址已变化，更新显示与特征码。", is_warning=True)
+                if self.master.winfo_exists():
+                    self.master.after(0, lambda: self.ui_manager.set_local_ip_port_display(self.network_manager.public_ip, str(self.network_manager.public_port)))
+                    self.master.after(0, self.generate_and_update_feature_code)
+            elif revalidation is False and self.network_manager.connectivity_strategy is not None:
+                # 映射未变：沿用缓存的 NAT 类型，只刷新缓存时间
+                self.network_manager.save_discovery()
+                self.log_message(f"缓存的公网地址验证通过，沿用缓存的NAT测试结果: {self.can_reliably_receive_calls}")
+                return
+
+        self.log_message("开始后台NAT行为探测 (RFC 5780)...")
+        behavior = self.network_manager.discover_nat_behavior()
+        # 只有端点无关过滤时陌生来源才能直达公网映射；其余情况需打洞或中继
+        nat_test_passed = behavior.strategy is ConnectivityStrategy.DIRECT
+
         self.can_reliably_receive_calls = nat_test_passed
+        self.network_manager.is_cone_nat = nat_test_passed
+        self.network_manager.save_discovery()
         self.log_message(f"后台NAT测试完成，最终结果: {self.can_reliably_receive_calls}")
 
         if self.master.winfo_exists():
@@ -177,9 +196,14 @@ class AppController:
 
     def on_peer_info_changed(self):
         self.ui_handler.update_ui_elements_for_state(self.state_manager.app_state, "peer info changed", None, None)
+        if self.is_running_main_op and self.ui_manager.is_peer_info_valid() and self.state_manager.app_state == AppState.IDLE:
+            # 空闲时即向新对方打洞，对方随后发来的呼叫请求才能穿过本端 NAT
+            self.state_manager.scheduler.call_soon(self.state_manager.prepare_path_to_peer,
+                                                   (self.ui_manager.get_peer_ip_entry(), int(self.ui_manager.get_peer_port_entry())))
     
     def generate_and_update_feature_code(self):
-        result = self.feature_code_manager.generate_feature_code(self.network_manager.public_ip, self.network_manager.public_port)
+        candidates = [candidate.as_tuple() for candidate in self.network_manager.gather_candidates()]
+        result = self.feature_code_manager.generate_feature_code(self.network_manager.public_ip, self.network_manager.public_port, candidates)
         
         if isinstance(result, tuple) and len(result) == 2:
             code, err_msg = result
@@ -203,17 +227,25 @@ class AppController:
             self.ui_manager.show_message("信息", "剪贴板为空，请先复制特征码。", type="info")
             return
             
-        ip, port, err_msg = self.feature_code_manager.parse_feature_code(code)
+        candidates, err_msg = self.feature_code_manager.parse_feature_code_candidates(code)
         if err_msg:
             self.ui_manager.show_message("解析失败", f"特征码{err_msg}\n请确保特征码正确无误。", type="error")
         else:
+            _, ip, port = candidates[0][:3]
+            peer_candidates = [c for c in (Candidate.from_tuple(value, index) for index, value in enumerate(candidates)) if c]
+            self.state_manager.scheduler.call_soon(self.state_manager.set_peer_candidates, peer_candidates)
             self.ui_manager.set_peer_ip_entry(ip)
             self.ui_manager.set_peer_port_entry(str(port))
-            self.ui_manager.show_message("解析成功", f"特征码已解析:\nIP: {ip}\n端口: {port}", type="info")
+            self.ui_manager.show_message("解析成功", f"特征码已解析:\nIP: {ip}\n端口: {port}\n候选地址: {len(candidates)} 个", type="info")
             
         self.on_peer_info_changed()
 
 if __name__ == "__main__":
+    if "--relay" in sys.argv:
+        # 中继模式：不启动界面，仅运行 UDP 中继服务
+        from relay import main as relay_main
+        sys.exit(relay_main(sys.argv[sys.argv.index("--relay") + 1:]))
+
     try:
         locale.setlocale(locale.LC_ALL, '') 
     except locale.Error as e:
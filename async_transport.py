@@ -0,0 +1,152 @@
+import asyncio
+import threading
+from typing import Callable, Optional, Tuple
+
+class LoopTimer:
+    """call_later 句柄的线程安全包装：可在任意线程创建与取消。"""
+    __slots__ = ("_loop", "_handle", "cancelled")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self.cancelled = False
+
+    def _arm(self, when: float, callback, args):
+        if not self.cancelled:
+            self._handle = self._loop.call_at(when, self._fire, callback, args)
+
+    def _fire(self, callback, args):
+        if not self.cancelled:
+            self.cancelled = True
+            callback(*args)
+
+    def cancel(self):
+        self.cancelled = True
+        handle = self._handle
+        if handle is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(handle.cancel)
+
+class EventLoopThread:
+    """
+    在独立守护线程上运行的 asyncio 事件循环，承载 UDP 收发与信令定时器；
+    回调均在该线程上串行执行。多个 NetworkManager/会话可共享同一实例 (见 shared_event_loop)。
+    """
+    def __init__(self, log_callback, name: str = "NetworkEventLoopThread"):
+        self.log_callback = log_callback
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self.loop
+            self.loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True, name=self.name)
+            self._thread.start()
+            ready.wait()
+            return self.loop
+
+    def _run(self, ready: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run_coroutine(self, coro, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay_s: float, callback, *args) -> LoopTimer:
+        timer = LoopTimer(self.loop)
+        when = self.loop.time() + delay_s
+        if self.in_loop_thread():
+            timer._arm(when, callback, args)
+        else:
+            self.loop.call_soon_threadsafe(timer._arm, when, callback, args)
+        return timer
+
+    def stop(self, timeout: float = 1.5):
+        with self._lock:
+            thread, loop = self._thread, self.loop
+            self._thread = None
+        if not thread or not thread.is_alive():
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+            if thread.is_alive():
+                self.log_callback("事件循环线程join超时。", is_warning=True)
+
+_shared_event_loop: Optional[EventLoopThread] = None
+_shared_event_loop_lock = threading.Lock()
+
+def shared_event_loop(log_callback) -> EventLoopThread:
+    """进程内共享的网络事件循环；首次调用时创建并启动。"""
+    global _shared_event_loop
+    with _shared_event_loop_lock:
+        if _shared_event_loop is None:
+            _shared_event_loop = EventLoopThread(log_callback)
+        _shared_event_loop.start()
+        return _shared_event_loop
+
+class _DatagramReceiver(asyncio.DatagramProtocol):
+    def __init__(self, data_callback: Callable[[memoryview, Tuple[str, int]], None], log_callback):
+        self.data_callback = data_callback
+        self.log_callback = log_callback
+
+    def datagram_received(self, data: bytes, addr):
+        if data:
+            # 与线程接收循环保持同一契约：回调拿到 memoryview
+            self.data_callback(memoryview(data), addr)
+
+    def error_received(self, exc: Exception):
+        self.log_callback(f"接收数据时发生socket错误: {exc}", is_warning=True)
+
+class AsyncioDatagramTransport:
+    """把已绑定的 UDP 套接字交给事件循环读取，取代轮询式接收线程。"""
+    def __init__(self, event_loop: EventLoopThread, udp_socket, data_callback, log_callback):
+        self.event_loop = event_loop
+        self.udp_socket = udp_socket
+        self.data_callback = data_callback
+        self.log_callback = log_callback
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def start(self) -> bool:
+        async def _open():
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DatagramReceiver(self.data_callback, self.log_callback), sock=self.udp_socket)
+            return transport
+        try:
+            self.transport = self.event_loop.run_coroutine(_open(), timeout=5.0)
+        except Exception as e:
+            self.log_callback(f"启动 asyncio 数据报传输失败: {e}", is_error=True)
+            return False
+        return True
+
+    def close(self):
+        transport, self.transport = self.transport, None
+        if transport is None or not self.event_loop.is_running():
+            return
+        if self.event_loop.in_loop_thread():
+            transport.close()
+            return
+        async def _close():
+            transport.close()
+        try:
+            # 等到循环线程注销读事件后再返回，调用方随后关闭套接字才是安全的
+            self.event_loop.run_coroutine(_close(), timeout=1.5)
+        except Exception as e:
+            self.log_callback(f"关闭 asyncio 数据报传输时出错: {e}", is_warning=True)
@@ -0,0 +1,239 @@
+import struct
+import importlib
+import warnings
+from array import array
+from typing import Dict, List, Optional, Type
+
+from media_packet import RESERVED_PAYLOAD_TYPES
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+SAMPLE_WIDTH = 2
+
+_ULAW_SEGMENT_ENDS = (0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF)
+
+def _linear_to_ulaw_sample(sample):
+    value = sample >> 2
+    if value < 0:
+        value, mask = -value, 0x7F
+    else:
+        mask = 0xFF
+    value = min(value, 8159) + 33
+    for segment, segment_end in enumerate(_ULAW_SEGMENT_ENDS):
+        if value <= segment_end:
+            return ((segment << 4) | ((value >> (segment + 1)) & 0x0F)) ^ mask
+    return 0x7F ^ mask
+
+def _ulaw_to_linear_sample(code):
+    code = ~code & 0xFF
+    sign, exponent, mantissa = code & 0x80, (code >> 4) & 0x07, code & 0x0F
+    sample = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return -sample if sign else sample
+
+def _linear_to_alaw_sample(sample):
+    sign = 0x00 if sample < 0 else 0x80
+    if sample < 0:
+        sample = -sample - 1 if sample > -32768 else 32767
+    sample = min(sample, 32767)
+    if sample >= 256:
+        exponent = 7
+        mask = 0x4000
+        while exponent > 1 and not (sample & mask):
+            exponent -= 1
+            mask >>= 1
+        mantissa = (sample >> (exponent + 3)) & 0x0F
+        code = (exponent << 4) | mantissa
+    else:
+        code = sample >> 4
+    return (code | sign) ^ 0x55
+
+def _alaw_to_linear_sample(code):
+    code ^= 0x55
+    sign, exponent, mantissa = code & 0x80, (code >> 4) & 0x07, code & 0x0F
+    sample = (mantissa << 4) + 8
+    if exponent:
+        sample = (sample + 0x100) << (exponent - 1)
+    return sample if sign else -sample
+
+class _G711Tables:
+    """无 audioop 时的查表实现；首次使用时构建 64K 编码表与 256 项解码表。"""
+    def __init__(self, encode_sample, decode_sample):
+        self._encode_sample = encode_sample
+        self._decode_sample = decode_sample
+        self._encode_table = None
+        self._decode_table = None
+
+    def encode(self, pcm):
+        if self._encode_table is None:
+            self._encode_table = bytes(self._encode_sample(s - 65536 if s >= 32768 else s) for s in range(65536))
+        table = self._encode_table
+        return bytes(table[s] for s in array('H', pcm))
+
+    def decode(self, payload):
+        if self._decode_table is None:
+            self._decode_table = [self._decode_sample(c) for c in range(256)]
+        table = self._decode_table
+        return array('h', [table[c] for c in payload]).tobytes()
+
+_ULAW_TABLES = _G711Tables(_linear_to_ulaw_sample, _ulaw_to_linear_sample)
+_ALAW_TABLES = _G711Tables(_linear_to_alaw_sample, _alaw_to_linear_sample)
+
+class AudioCodec:
+    """编解码器基类。payload_type 随每个音频包发送，接收端据此选择解码器；bits_per_sample 用于协商时比较码率。"""
+    name = ""
+    payload_type = -1
+    bits_per_sample = 16
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    def encode(self, pcm: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, payload: bytes) -> bytes:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+class PcmCodec(AudioCodec):
+    name = "L16"
+    payload_type = 0
+
+    def encode(self, pcm):
+        return pcm
+
+    def decode(self, payload):
+        return payload
+
+class MuLawCodec(AudioCodec):
+    name = "PCMU"
+    payload_type = 1
+    bits_per_sample = 8
+
+    def encode(self, pcm):
+        if audioop:
+            return audioop.lin2ulaw(pcm, SAMPLE_WIDTH)
+        return _ULAW_TABLES.encode(pcm)
+
+    def decode(self, payload):
+        if audioop:
+            return audioop.ulaw2lin(payload, SAMPLE_WIDTH)
+        return _ULAW_TABLES.decode(payload)
+
+class ALawCodec(AudioCodec):
+    name = "PCMA"
+    payload_type = 2
+    bits_per_sample = 8
+
+    def encode(self, pcm):
+        if audioop:
+            return audioop.lin2alaw(pcm, SAMPLE_WIDTH)
+        return _ALAW_TABLES.encode(pcm)
+
+    def decode(self, payload):
+        if audioop:
+            return audioop.alaw2lin(payload, SAMPLE_WIDTH)
+        return _ALAW_TABLES.decode(payload)
+
+class ImaAdpcmCodec(AudioCodec):
+    """
+    IMA-ADPCM (4 bit/样本)。每个包前置编码器状态 (预测值, 步长索引)，
+    因此包之间互不依赖，丢包不会使解码器状态失步。
+    """
+    name = "IMA-ADPCM"
+    payload_type = 3
+    bits_per_sample = 4
+    STATE_HEADER = struct.Struct("!hB")
+
+    def __init__(self):
+        self._encoder_state = None
+
+    @classmethod
+    def is_available(cls):
+        return audioop is not None
+
+    def encode(self, pcm):
+        valpred, index = self._encoder_state or (0, 0)
+        encoded, self._encoder_state = audioop.lin2adpcm(pcm, SAMPLE_WIDTH, self._encoder_state)
+        return self.STATE_HEADER.pack(valpred, index) + encoded
+
+    def decode(self, payload):
+        if len(payload) <= self.STATE_HEADER.size:
+            return b""
+        state = self.STATE_HEADER.unpack_from(payload)
+        decoded, _ = audioop.adpcm2lin(payload[self.STATE_HEADER.size:], SAMPLE_WIDTH, state)
+        return decoded
+
+    def reset(self):
+        self._encoder_state = None
+
+_CODECS_BY_NAME: Dict[str, Type[AudioCodec]] = {}
+_CODECS_BY_PAYLOAD_TYPE: Dict[int, Type[AudioCodec]] = {}
+
+def register_codec(codec_cls: Type[AudioCodec]):
+    """注册编解码器。外部编解码器模块在导入时调用此函数即可接入。"""
+    if not (0 <= codec_cls.payload_type <= 0xFF):
+        raise ValueError(f"payload_type 超出范围 (0-255): {codec_cls.payload_type}")
+    if codec_cls.payload_type in RESERVED_PAYLOAD_TYPES:
+        raise ValueError(f"payload_type {codec_cls.payload_type} 为协议保留值")
+    existing = _CODECS_BY_PAYLOAD_TYPE.get(codec_cls.payload_type)
+    if existing is not None and existing is not codec_cls:
+        raise ValueError(f"payload_type {codec_cls.payload_type} 已被 {existing.name} 占用")
+    _CODECS_BY_NAME[codec_cls.name] = codec_cls
+    _CODECS_BY_PAYLOAD_TYPE[codec_cls.payload_type] = codec_cls
+    return codec_cls
+
+for _builtin_codec in (PcmCodec, MuLawCodec, ALawCodec, ImaAdpcmCodec):
+    register_codec(_builtin_codec)
+
+def load_external_codecs(module_names: List[str], log_callback):
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+            log_callback(f"已加载外部编解码器模块: {module_name}")
+        except Exception as e:
+            log_callback(f"加载外部编解码器模块 {module_name} 失败: {e}", is_warning=True)
+
+def available_codec_names() -> List[str]:
+    return [name for name, codec_cls in _CODECS_BY_NAME.items() if codec_cls.is_available()]
+
+def create_codec(name: str) -> Optional[AudioCodec]:
+    codec_cls = _CODECS_BY_NAME.get(name)
+    if codec_cls is None or not codec_cls.is_available():
+        return None
+    return codec_cls()
+
+def create_codec_by_payload_type(payload_type: int) -> Optional[AudioCodec]:
+    codec_cls = _CODECS_BY_PAYLOAD_TYPE.get(payload_type)
+    if codec_cls is None or not codec_cls.is_available():
+        return None
+    return codec_cls()
+
+def create_preferred_codec(preference: List[str]) -> AudioCodec:
+    for name in preference:
+        codec = create_codec(name)
+        if codec is not None:
+            return codec
+    return PcmCodec()
+
+def offered_codec_names(preference: List[str]) -> List[str]:
+    """本端可解码的全部编解码器，偏好列表中的排在前面。"""
+    available = available_codec_names()
+    return [name for name in preference if name in available] + [name for name in available if name not in preference]
+
+def choose_cheapest_codec(offered: List[str], preference: List[str]) -> Optional[AudioCodec]:
+    """双方都可用的编解码器中每样本比特数最低者；相同时按本端偏好顺序。没有交集返回 None。"""
+    available = available_codec_names()
+    mutual = [name for name in offered if name in available]
+    if not mutual:
+        return None
+    rank = {name: index for index, name in enumerate(preference)}
+    best = min(mutual, key=lambda name: (_CODECS_BY_NAME[name].bits_per_sample, rank.get(name, len(rank))))
+    return _CODECS_BY_NAME[best]()
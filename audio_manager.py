@@ -2,8 +2,19 @@ import pyaudio
 import locale
 import sys
 import traceback
-from collections import deque
 from config import *
+from models import PacketSequenceStatus
+from replay_window import SequenceReplayWindow
+from jitter_buffer import AdaptiveJitterBuffer, AudioPlayout
+from ring_buffer import AudioRingBuffer
+from packet_loss_concealment import PacketLossConcealer
+from voice_activity import ComfortNoiseGenerator
+from resampler import FractionalResampler, create_resampler
+from clock_drift import ClockDriftEstimator
+
+def wire_frame_samples(wire_rate):
+    """线路帧长：按 PYAUDIO_CHUNK / PYAUDIO_RATE 的时长换算到给定采样率。"""
+    return max(1, round(PYAUDIO_CHUNK * wire_rate / PYAUDIO_RATE))
 
 class AudioManager:
     def __init__(self, log_callback, deduplication_callback=None):
@@ -13,7 +24,60 @@ class AudioManager:
         self.audio_stream_in = None
         self.audio_stream_out = None
         self.mic_muted = False
-        self.played_audio_seq_nums = deque(maxlen=SEQ_NUM_DEQUE_MAXLEN)
+        self.use_callback_streams = AUDIO_USE_CALLBACK_STREAMS
+        ring_bytes = PYAUDIO_CHUNK * PYAUDIO_CHANNELS * 2 * AUDIO_RING_BUFFER_CHUNKS
+        self.mic_ring = AudioRingBuffer(ring_bytes)
+        self.speaker_ring = AudioRingBuffer(ring_bytes)
+        self.replay_window = SequenceReplayWindow()
+        self.input_device_rate = PYAUDIO_RATE
+        self.output_device_rate = PYAUDIO_RATE
+        self._input_device_chunk = PYAUDIO_CHUNK
+        # 回调模式下麦克风读取与输出回调各自复用的预分配缓冲，按设备块长在打开流时重建
+        self._mic_chunk = bytearray(PYAUDIO_CHUNK * PYAUDIO_CHANNELS * 2)
+        self._speaker_chunk = bytearray(PYAUDIO_CHUNK * PYAUDIO_CHANNELS * 2)
+        self._speaker_chunk_view = memoryview(self._speaker_chunk)
+        self._speaker_chunk_out = self._speaker_chunk_view.toreadonly()
+        self._mic_resampler = create_resampler(PYAUDIO_RATE, PYAUDIO_RATE)
+        self._speaker_resampler = create_resampler(PYAUDIO_RATE, PYAUDIO_RATE)
+        self._mic_frames = bytearray()
+        self._drift_resampler = FractionalResampler()
+        self.configure_wire_rate(PYAUDIO_RATE)
+
+    def configure_wire_rate(self, wire_rate):
+        """设置线路采样率并重建与帧长相关的接收/播放组件；须在通话媒体启动前调用。"""
+        self.wire_rate = wire_rate
+        self.frame_samples = wire_frame_samples(wire_rate)
+        self.frame_bytes = self.frame_samples * PYAUDIO_CHANNELS * 2
+        self.frame_duration_s = self.frame_samples / wire_rate
+        self.jitter_buffer = AdaptiveJitterBuffer(self.frame_duration_s)
+        self.concealer = PacketLossConcealer(self.frame_samples, wire_rate)
+        self.comfort_noise = ComfortNoiseGenerator(self.frame_samples)
+        self.drift_estimator = ClockDriftEstimator(self.frame_duration_s)
+        self.playout = AudioPlayout(self.jitter_buffer, self.write_chunk_to_speaker, self.log_callback,
+                                    concealer=self.concealer, comfort_noise=self.comfort_noise,
+                                    drift_estimator=self.drift_estimator)
+
+    def _set_input_device_chunk(self, device_chunk):
+        self._input_device_chunk = device_chunk
+        size = device_chunk * PYAUDIO_CHANNELS * 2
+        if len(self._mic_chunk) != size:
+            self._mic_chunk = bytearray(size)
+
+    def _set_output_device_chunk(self, device_chunk):
+        size = device_chunk * PYAUDIO_CHANNELS * 2
+        if len(self._speaker_chunk) != size:
+            self._speaker_chunk = bytearray(size)
+            self._speaker_chunk_view = memoryview(self._speaker_chunk)
+            # PyAudio 只接受只读的类字节对象作为回调输出，并在回调返回时立即拷贝
+            self._speaker_chunk_out = self._speaker_chunk_view.toreadonly()
+
+    def _device_rate(self, device_info):
+        if AUDIO_USE_DEVICE_NATIVE_RATE:
+            try:
+                return int(device_info['defaultSampleRate'])
+            except (KeyError, TypeError, ValueError):
+                pass
+        return self.wire_rate
 
     def initialize_pyaudio_core(self):
         if self.p is not None:
@@ -68,14 +132,22 @@ class AudioManager:
             target_device_index = int(default_info['index'])
             final_device_info = self.p.get_device_info_by_index(target_device_index)
             device_name_log = self._decode_device_name(final_device_info['name'])
+            device_rate = self._device_rate(final_device_info)
 
+            self.speaker_ring.discard_all()
+            device_chunk = round(self.frame_samples * device_rate / self.wire_rate)
+            self._set_output_device_chunk(device_chunk)
             self.audio_stream_out = self.p.open(format=PYAUDIO_FORMAT,
                                                 channels=PYAUDIO_CHANNELS,
-                                                rate=PYAUDIO_RATE,
+                                                rate=device_rate,
                                                 output=True,
-                                                frames_per_buffer=PYAUDIO_CHUNK,
-                                                output_device_index=target_device_index)
-            self.log_callback(f"输出音频流已打开: '{device_name_log}' (Index: {target_device_index})")
+                                                frames_per_buffer=device_chunk,
+                                                output_device_index=target_device_index,
+                                                stream_callback=self._output_stream_callback if self.use_callback_streams else None)
+            self.output_device_rate = device_rate
+            self._speaker_resampler = create_resampler(self.wire_rate, device_rate)
+            self.log_callback(f"输出音频流已打开: '{device_name_log}' (Index: {target_device_index}, 回调模式: {self.use_callback_streams}, "
+                              f"设备采样率: {device_rate}, 线路采样率: {self.wire_rate})")
             return True
         except IOError as e:
              self.log_callback(f"打开输出音频流时发生IOError: {e}. 检查采样率/格式兼容性。", is_error=True)
@@ -95,15 +167,23 @@ class AudioManager:
             device_info = self.p.get_default_input_device_info()
             input_device_index = int(device_info['index'])
             device_name = self._decode_device_name(device_info['name'])
-            self.log_callback(f"尝试打开输入流: '{device_name}' (Index: {input_device_index})")
+            device_rate = self._device_rate(device_info)
+            self.log_callback(f"尝试打开输入流: '{device_name}' (Index: {input_device_index}, 设备采样率: {device_rate})")
 
+            self.mic_ring.discard_all()
+            self._mic_frames.clear()
+            device_chunk = round(self.frame_samples * device_rate / self.wire_rate)
+            self._set_input_device_chunk(device_chunk)
             self.audio_stream_in = self.p.open(format=PYAUDIO_FORMAT,
                                                channels=PYAUDIO_CHANNELS,
-                                               rate=PYAUDIO_RATE,
+                                               rate=device_rate,
                                                input=True,
-                                               frames_per_buffer=PYAUDIO_CHUNK,
-                                               input_device_index=input_device_index)
-            self.log_callback("输入音频流已成功打开。")
+                                               frames_per_buffer=device_chunk,
+                                               input_device_index=input_device_index,
+                                               stream_callback=self._input_stream_callback if self.use_callback_streams else None)
+            self.input_device_rate = device_rate
+            self._mic_resampler = create_resampler(device_rate, self.wire_rate)
+            self.log_callback(f"输入音频流已成功打开。(回调模式: {self.use_callback_streams}, 线路采样率: {self.wire_rate})")
             return True
         except IOError as e:
              self.log_callback(f"打开输入音频流时发生IOError: {e}. 检查采样率/格式兼容性。", is_error=True)
@@ -114,6 +194,28 @@ class AudioManager:
             self.audio_stream_in = None
             return False
 
+    def streams_open(self):
+        return self.audio_stream_in is not None and self.audio_stream_out is not None
+
+    def resume_warm_streams(self):
+        """复用提前打开的音频流：线路采样率可能在打开之后才协商确定，按当前值重建重采样器，并丢弃预热期间积累的麦克风数据。"""
+        self._set_input_device_chunk(round(self.frame_samples * self.input_device_rate / self.wire_rate))
+        self._mic_resampler = create_resampler(self.input_device_rate, self.wire_rate)
+        self._speaker_resampler = create_resampler(self.wire_rate, self.output_device_rate)
+        self.discard_mic_input()
+        self.mic_ring.overflow_bytes = 0
+
+    def _input_stream_callback(self, in_data, frame_count, time_info, status):
+        if in_data:
+            self.mic_ring.write(in_data)
+        return (None, pyaudio.paContinue)
+
+    def _output_stream_callback(self, in_data, frame_count, time_info, status):
+        if frame_count * PYAUDIO_CHANNELS * 2 != len(self._speaker_chunk):
+            self._set_output_device_chunk(frame_count)
+        self.speaker_ring.fill_or_silence(self._speaker_chunk_view)
+        return (self._speaker_chunk_out, pyaudio.paContinue)
+
     def read_chunk_from_mic(self):
         if not self.p:
             self.log_callback("AudioManager: PyAudio (self.p) is None, cannot read mic.", is_error=True)
@@ -128,7 +230,21 @@ class AudioManager:
             is_active = self.audio_stream_in.is_active() if self.audio_stream_in else False
             
             if is_active:
-                return self.audio_stream_in.read(PYAUDIO_CHUNK, exception_on_overflow=False)
+                # 设备块经重采样后长度不一定恰为一帧，在 _mic_frames 中拼接后按线路帧长切出
+                while len(self._mic_frames) < self.frame_bytes:
+                    if self.use_callback_streams:
+                        chunk = self._mic_chunk
+                        if not self.mic_ring.wait_available(len(chunk), timeout=MIC_CALLBACK_READ_TIMEOUT_S):
+                            if self.audio_stream_in is None:
+                                return None
+                            raise IOError("回调模式下等待麦克风数据超时")
+                        self.mic_ring.read_into(chunk)
+                    else:
+                        chunk = self.audio_stream_in.read(self._input_device_chunk, exception_on_overflow=False)
+                    self._mic_frames += self._mic_resampler.process(chunk)
+                frame = bytes(self._mic_frames[:self.frame_bytes])
+                del self._mic_frames[:self.frame_bytes]
+                return frame
             else:
                 self.log_callback(f"AudioManager: Input stream (ID: {current_stream_obj_id}) is not active. Returning None.", is_warning=True)
                 return None
@@ -142,28 +258,78 @@ class AudioManager:
             self._safe_close_stream('audio_stream_in')
             return None
 
-    def write_chunk_to_speaker(self, audio_data, seq_num):
+    def discard_mic_input(self):
+        self._mic_frames.clear()
+        if self.use_callback_streams:
+            return self.mic_ring.discard_all()
+        stream = self.audio_stream_in
+        if not stream:
+            return 0
+        try:
+            pending_frames = stream.get_read_available()
+            if pending_frames > 0:
+                stream.read(pending_frames, exception_on_overflow=False)
+            return pending_frames * PYAUDIO_CHANNELS * 2
+        except (IOError, OSError):
+            return 0
+
+    def enqueue_received_chunk(self, audio_data, seq_num, arrival_time=None):
         if not audio_data:
             return False
-        is_duplicate = seq_num in self.played_audio_seq_nums
-        if is_duplicate:
+        status = self.replay_window.check_and_update(seq_num)
+        if status is PacketSequenceStatus.DUPLICATE:
             if self.deduplication_callback:
                 self.deduplication_callback()
             return True
-        else:
-            self.played_audio_seq_nums.append(seq_num)
-            if not self.audio_stream_out:
-                self.log_callback("尝试写入扬声器但输出流未打开或已关闭。", is_warning=True)
-                return False
-            try:
-                self.audio_stream_out.write(audio_data)
-                return True
-            except (IOError, OSError) as e:
-                self.log_callback(f"写入输出流时错误 (IO/OS): {e}. 音频播放可能中断。", is_warning=True)
-                return False
-            except Exception as e_write:
-                self.log_callback(f"写入输出流时发生未知错误: {e_write}", is_warning=True)
-                return False
+        if status is PacketSequenceStatus.TOO_OLD:
+            return False
+        if status is PacketSequenceStatus.NEW:
+            self.drift_estimator.on_arrival(seq_num, arrival_time)
+        if isinstance(audio_data, memoryview):
+            # 接收缓冲会被复用；只有真正进入抖动缓冲的帧才复制一次，重复包不产生拷贝
+            audio_data = audio_data.tobytes()
+        return self.jitter_buffer.put(seq_num, audio_data, arrival_time)
+
+    def enqueue_comfort_noise(self, level_rms, seq_num):
+        self.playout.start_comfort_noise(seq_num, level_rms)
+
+    def write_chunk_to_speaker(self, audio_data):
+        if not audio_data:
+            return False
+        if not self.audio_stream_out:
+            self.log_callback("尝试写入扬声器但输出流未打开或已关闭。", is_warning=True)
+            return False
+        audio_data = self._speaker_resampler.process(self._drift_resampler.process(audio_data, self.drift_estimator.ratio))
+        if not audio_data:
+            return True
+        if self.use_callback_streams:
+            return self.speaker_ring.write(audio_data) == len(audio_data)
+        try:
+            self.audio_stream_out.write(audio_data)
+            return True
+        except (IOError, OSError) as e:
+            self.log_callback(f"写入输出流时错误 (IO/OS): {e}. 音频播放可能中断。", is_warning=True)
+            return False
+        except Exception as e_write:
+            self.log_callback(f"写入输出流时发生未知错误: {e_write}", is_warning=True)
+            return False
+
+    def start_playout(self):
+        self.jitter_buffer.reset()
+        self.concealer.reset()
+        self.drift_estimator.reset()
+        self._drift_resampler.reset()
+        self.playout.reset_comfort_noise()
+        self.playout.start()
+
+    def stop_playout(self):
+        self.playout.stop()
+        stats = self.jitter_buffer.stats
+        self.log_callback(f"抖动缓冲统计: 目标深度={self.jitter_buffer.target_depth}帧, "
+                          f"抖动={self.jitter_buffer.jitter_s * 1000:.2f}ms, {stats}")
+        self.log_callback(f"丢包补偿统计: {self.concealer.stats}")
+        self.log_callback(f"时钟漂移补偿: {self.drift_estimator.ppm:+.1f}ppm, {self.drift_estimator.stats}")
+        self.log_callback(f"序列号窗口统计: {self.replay_window.counters}")
 
     def toggle_mic_mute(self):
         self.mic_muted = not self.mic_muted
@@ -171,15 +337,18 @@ class AudioManager:
         return self.mic_muted
 
     def clear_played_sequence_numbers(self):
-        self.played_audio_seq_nums.clear()
+        self.replay_window.reset()
+        self.jitter_buffer.reset()
 
     def close_input_stream(self):
         self._safe_close_stream('audio_stream_in')
+        self.mic_ring.wake()
 
     def close_output_stream(self):
         self._safe_close_stream('audio_stream_out')
 
     def terminate(self):
+        self.playout.stop()
         self._safe_close_stream('audio_stream_in')
         self._safe_close_stream('audio_stream_out')
         if self.p:
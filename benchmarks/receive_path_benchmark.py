@@ -0,0 +1,90 @@
+"""
+媒体接收路径微基准：对比 recvfrom 逐包分配 bytes + 切片复制 (旧路径)
+与 ReceiveBufferPool.recvfrom_into + memoryview 切片 (新路径)。
+
+    python benchmarks/receive_path_benchmark.py [数据报数]
+
+数据报为旧版格式的双发音频 (每个序列号两份)，经解析、去重后进入抖动缓冲。
+输出每个数据报的接收+处理耗时 (ns) 与瞬时分配峰值 (tracemalloc, 字节)。
+"""
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MAX_PACKET_SIZE, MAX_SEQ_NUM, PYAUDIO_CHUNK
+from audio_manager import AudioManager
+from media_packet import build_legacy_audio_packet, parse_legacy_audio_packet
+from network_manager import ReceiveBufferPool
+
+BATCH = 200
+PAYLOAD = bytes(PYAUDIO_CHUNK * 2)
+
+def _silent_log(message, **kwargs):
+    pass
+
+def recvfrom_receive(udp_socket):
+    return udp_socket.recvfrom(MAX_PACKET_SIZE)
+
+def process(audio_manager, data):
+    parsed = parse_legacy_audio_packet(data)
+    if parsed:
+        audio_manager.enqueue_received_chunk(parsed[1], parsed[0])
+        audio_manager.jitter_buffer.pop()
+
+def measure(name, receive, sender, receiver, address, count):
+    audio_manager = AudioManager(_silent_log)
+    seq = 0
+    elapsed = 0
+    transient = 0
+    traced = 0
+    tracemalloc.start()
+    for batch_start in range(0, count, BATCH):
+        batch = min(BATCH, count - batch_start)
+        for i in range(batch):
+            sender.sendto(build_legacy_audio_packet((seq + i // 2) % MAX_SEQ_NUM, PAYLOAD), address)
+        seq += batch // 2
+        if batch_start % (BATCH * 10) == 0:
+            # 抽样批次测量分配；其余批次只测时间，避免 tracemalloc 开销计入耗时
+            for _ in range(batch):
+                tracemalloc.reset_peak()
+                current, _ = tracemalloc.get_traced_memory()
+                data, _ = receive(receiver)
+                process(audio_manager, data)
+                del data
+                _, peak = tracemalloc.get_traced_memory()
+                transient += peak - current
+                traced += 1
+            continue
+        tracemalloc.stop()
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            data, _ = receive(receiver)
+            process(audio_manager, data)
+        elapsed += time.perf_counter_ns() - start
+        tracemalloc.start()
+    tracemalloc.stop()
+    timed = count - traced
+    print(f"{name:<36} {elapsed / max(1, timed):>8.0f} ns/报 {transient / max(1, traced):>8.1f} B/报 (瞬时分配峰值)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    receiver.bind(("127.0.0.1", 0))
+    address = receiver.getsockname()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    pool = ReceiveBufferPool()
+    print(f"负载 {len(PAYLOAD)} 字节, {count} 个数据报 (双发)")
+    measure("旧版: recvfrom + 切片复制", recvfrom_receive, sender, receiver, address, count)
+    measure("新版: recvfrom_into + memoryview", pool.receive_from, sender, receiver, address, count)
+
+    sender.close()
+    receiver.close()
+
+if __name__ == "__main__":
+    main()
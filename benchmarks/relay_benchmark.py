@@ -0,0 +1,108 @@
+"""
+中继负载基准：在独立进程中于回环地址运行 RelayServer，建立 N 对经中继配对的客户端，
+以轮转方式向中继灌入音频大小的数据报，统计中继转发吞吐与每个数据报的 CPU 耗时。
+
+    python benchmarks/relay_benchmark.py [配对数] [数据报数]
+
+按每路通话每秒 RELAY_BENCHMARK_CALL_PPS 个数据报 (双向、含冗余) 折算单核可承载的通话数。
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PYAUDIO_CHUNK
+from relay import (RELAY_CONTROL, RELAY_OP_ALLOCATE, RELAY_OP_CONNECT, RELAY_OP_CONNECTED, RELAY_OP_RELEASE,
+                   RelayServer, build_relay_control)
+
+# 双方各 20 ms 一帧、每帧连同冗余约两个数据报
+RELAY_BENCHMARK_CALL_PPS = 2 * 2 * 50
+PAYLOAD = bytes(4 + PYAUDIO_CHUNK * 2)
+BATCH = 64
+
+def _silent_log(message, **kwargs):
+    pass
+
+def _serve(ready, stop, results):
+    server = RelayServer(_silent_log, "127.0.0.1", 0)
+    server.udp_socket.settimeout(0.05)
+    ready.put(server.address)
+    # serve_forever 在套接字超时后检查 _running；由主进程通过 Event 通知停止
+    threading.Thread(target=lambda: (stop.wait(), server.stop()), daemon=True).start()
+    started = time.process_time()
+    server.serve_forever()
+    results.put((time.process_time() - started, server.stats()))
+    server.close()
+
+def _pair(relay_address, index):
+    token = index.to_bytes(8, "big")
+    callee = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    caller = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for s in (callee, caller):
+        s.bind(("127.0.0.1", 0))
+        s.settimeout(1.0)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    callee.sendto(build_relay_control(RELAY_OP_ALLOCATE, token), relay_address)
+    callee.recvfrom(64)
+    caller.sendto(build_relay_control(RELAY_OP_CONNECT, token), relay_address)
+    _, op, _ = RELAY_CONTROL.unpack(caller.recvfrom(64)[0])
+    assert op == RELAY_OP_CONNECTED, op
+    for s in (callee, caller):
+        s.setblocking(False)
+    return caller, callee
+
+def _drain(sockets):
+    received = 0
+    for s in sockets:
+        while True:
+            try:
+                s.recvfrom(2048)
+            except BlockingIOError:
+                break
+            received += 1
+    return received
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server_process = multiprocessing.Process(target=_serve, args=(ready, stop, results), daemon=True)
+    server_process.start()
+    relay_address = ready.get(timeout=10)
+
+    connections = [_pair(relay_address, index) for index in range(pairs)]
+    senders = [s for pair in connections for s in pair]
+    received = 0
+    started = time.perf_counter()
+    for batch_start in range(0, count, BATCH):
+        for i in range(batch_start, min(count, batch_start + BATCH)):
+            senders[i % len(senders)].sendto(PAYLOAD, relay_address)
+        # 每批之后收走已转发的数据报，避免接收缓冲区溢出而把丢包算作"转发"
+        received += _drain(senders)
+    deadline = time.perf_counter() + 1.0
+    while received < count and time.perf_counter() < deadline:
+        received += _drain(senders)
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+
+    for caller, _ in connections:
+        caller.sendto(build_relay_control(RELAY_OP_RELEASE), relay_address)
+    stop.set()
+    server_cpu_s, stats = results.get(timeout=10)
+    server_process.join(timeout=5)
+    for s in senders:
+        s.close()
+
+    cpu_per_packet_us = server_cpu_s / max(1, stats["packets"]) * 1e6
+    print(f"配对数 {pairs}, 发送 {count} 个 {len(PAYLOAD)} 字节数据报, 经中继收到 {received} ({received / count:.1%})")
+    print(f"吞吐 {received / elapsed:,.0f} 数据报/秒 (受限于单进程发送端), 中继转发 {stats['packets']} 个")
+    print(f"中继 CPU {server_cpu_s:.2f} s, 每个数据报 {cpu_per_packet_us:.2f} µs")
+    print(f"按每路通话 {RELAY_BENCHMARK_CALL_PPS} 数据报/秒折算，单核约可承载 {1e6 / cpu_per_packet_us / RELAY_BENCHMARK_CALL_PPS:,.0f} 路通话")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+信令定时器延迟基准：UI 线程繁忙时，各调度后端 (scheduler.py) 的定时器比预定时间晚多少触发。
+
+    python benchmarks/scheduler_latency_benchmark.py [定时器个数]
+
+每隔 TIMER_INTERVAL_S 安排一个定时器，同时模拟界面负载：每 UI_PERIOD_S 有一次持续 UI_BUSY_S 的界面回调。
+Tk 后端的负载就是 Tk 主循环里的回调本身；其余后端的负载是主线程上的纯 Python 计算 (只通过 GIL 产生影响)。
+没有图形环境时跳过 Tk 后端。
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_transport import EventLoopThread
+from scheduler import EventLoopScheduler, TimerThreadScheduler, TkScheduler
+
+TIMER_INTERVAL_S = 0.02
+UI_PERIOD_S = 0.25
+UI_BUSY_S = 0.1
+
+def _busy(duration_s: float):
+    end = time.perf_counter() + duration_s
+    while time.perf_counter() < end:
+        pass
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def _schedule_all(scheduler, count: int, lateness: list, done: threading.Event):
+    start = time.perf_counter()
+
+    def fire(due):
+        lateness.append((time.perf_counter() - due) * 1000)
+        if len(lateness) == count:
+            done.set()
+
+    for index in range(count):
+        delay_s = TIMER_INTERVAL_S * (index + 1)
+        scheduler.call_later(delay_s, fire, start + delay_s)
+
+def measure_threaded(scheduler, count: int) -> list:
+    lateness, done = [], threading.Event()
+    _schedule_all(scheduler, count, lateness, done)
+    while not done.is_set():
+        _busy(UI_BUSY_S)
+        done.wait(UI_PERIOD_S - UI_BUSY_S)
+    return lateness
+
+def measure_tk(count: int):
+    try:
+        import tkinter
+        root = tkinter.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    lateness, done = [], threading.Event()
+
+    def ui_load():
+        _busy(UI_BUSY_S)
+        if not done.is_set():
+            root.after(int((UI_PERIOD_S - UI_BUSY_S) * 1000), ui_load)
+        else:
+            root.quit()
+
+    _schedule_all(TkScheduler(root), count, lateness, done)
+    root.after(0, ui_load)
+    root.mainloop()
+    root.destroy()
+    return lateness
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    log = lambda message, **kwargs: None
+    results = {}
+    thread_scheduler = TimerThreadScheduler(log)
+    results["独立定时线程"] = measure_threaded(thread_scheduler, count)
+    thread_scheduler.stop()
+    event_loop = EventLoopThread(log, name="BenchmarkEventLoop")
+    event_loop.start()
+    results["asyncio 事件循环"] = measure_threaded(EventLoopScheduler(event_loop), count)
+    event_loop.stop()
+    results["Tk 主循环"] = measure_tk(count)
+
+    print(f"{count} 个定时器，间隔 {TIMER_INTERVAL_S * 1000:.0f} ms；界面每 {UI_PERIOD_S * 1000:.0f} ms 忙 {UI_BUSY_S * 1000:.0f} ms")
+    print(f"{'后端':<20}{'p50 ms':>10}{'p99 ms':>10}{'最大 ms':>10}")
+    for name, lateness in results.items():
+        if lateness is None:
+            print(f"{name:<20}{'(无图形环境，跳过)':>30}")
+            continue
+        print(f"{name:<20}{_percentile(lateness, 0.5):>10.2f}{_percentile(lateness, 0.99):>10.2f}{max(lateness):>10.2f}")
+
+if __name__ == "__main__":
+    main()
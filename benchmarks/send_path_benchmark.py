@@ -0,0 +1,90 @@
+"""
+媒体发送路径微基准：对比逐包 struct.pack + 拼接 + NetworkManager.send_packet (旧路径)
+与 MediaSender / MediaBundler 的预分配缓冲快速路径。
+
+    python benchmarks/send_path_benchmark.py [包数]
+
+输出每包耗时 (ns) 与每包瞬时分配峰值 (tracemalloc, 字节)。目标为本机回环上一个不读取的 UDP 套接字。
+"""
+import os
+import socket
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MAX_SEQ_NUM, PYAUDIO_CHUNK
+from network_manager import NetworkManager
+from packetization import MediaBundler
+from media_packet import build_audio_packet
+
+PAYLOAD = bytes(PYAUDIO_CHUNK * 2)
+
+def _silent_log(message, **kwargs):
+    pass
+
+def legacy_double_send(network_manager, address, seq):
+    packet = struct.pack("!I", seq) + PAYLOAD
+    network_manager.send_packet(packet, address)
+    network_manager.send_packet(packet, address)
+
+def fast_legacy_double_send(sender, seq):
+    sender.send_legacy_audio(seq, PAYLOAD, copies=2)
+
+def generic_media_send(network_manager, address, seq):
+    network_manager.send_packet(build_audio_packet(seq, 1, PAYLOAD), address)
+
+def fast_media_send(sender, bundler, seq):
+    datagram = bundler.add_frame(seq, 1, PAYLOAD)
+    if datagram:
+        sender.send(datagram)
+    datagram = bundler.tick()
+    if datagram:
+        sender.send(datagram)
+
+def measure(name, func, count):
+    for seq in range(1000):
+        func(seq)
+    start = time.perf_counter_ns()
+    for seq in range(count):
+        func(seq % MAX_SEQ_NUM)
+    elapsed = time.perf_counter_ns() - start
+
+    tracemalloc.start()
+    transient = 0
+    sample = min(count, 5000)
+    for seq in range(sample):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        func(seq)
+        _, peak = tracemalloc.get_traced_memory()
+        transient += peak - current
+    tracemalloc.stop()
+    print(f"{name:<40} {elapsed / count:>10.0f} ns/帧 {transient / sample:>10.1f} B/帧 (瞬时分配峰值)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    address = sink.getsockname()
+
+    network_manager = NetworkManager(_silent_log)
+    network_manager.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    network_manager.udp_socket.bind(("127.0.0.1", 0))
+    sender = network_manager.create_media_sender(address)
+
+    print(f"负载 {len(PAYLOAD)} 字节, {count} 帧")
+    measure("旧版: pack+拼接, send_packet x2", lambda seq: legacy_double_send(network_manager, address, seq), count)
+    measure("快速路径: pack_into, MediaSender x2", lambda seq: fast_legacy_double_send(sender, seq), count)
+    measure("通用: build_audio_packet + send_packet", lambda seq: generic_media_send(network_manager, address, seq), count)
+    for frames in (1, 2, 4):
+        bundler = MediaBundler(frames)
+        measure(f"快速路径: MediaBundler ({frames} 帧/包)", lambda seq: fast_media_send(sender, bundler, seq), count)
+
+    network_manager.stop_listening()
+    sink.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+信令分发微基准：对比旧的 startswith/== 比较链与 EventHandler 的首字节快速路径 + 查表分发。
+
+    python benchmarks/signal_dispatch_benchmark.py [每种数据报的分发次数]
+
+数据报以接收缓冲上的 memoryview 传入，与接收循环一致；状态机处理函数为空操作，
+输出只包含分发本身的耗时 (ns/数据报)。
+"""
+import functools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PYAUDIO_CHUNK
+from event_handler import EventHandler
+from media_packet import build_audio_packet
+from models import PacketType, SignalType
+from signaling import build_legacy_signal, build_signal
+
+ADDRESS = ("127.0.0.1", 50000)
+SESSION_ID = 0x1234ABCD
+
+def _ignore(*args, **kwargs):
+    return True
+
+class _NullStateManager:
+    pass
+
+for _name in ("handle_audio_data", "handle_call_request_signal", "handle_speaker_status_signal", "handle_receiver_report_signal",
+              "handle_ack_hangup_signal", "handle_ack_call_request_signal", "handle_call_accepted_signal", "handle_hangup_signal",
+              "handle_check_signal", "handle_relay_control", "handle_punch_signal", "accept_signal_session"):
+    setattr(_NullStateManager, _name, staticmethod(_ignore))
+
+def chain_dispatch(state_manager, data, addr):
+    """此前 on_network_data_received 的分发方式。"""
+    if data[:2] != b"__":
+        state_manager.handle_audio_data(data, addr)
+        return
+    data = bytes(data)
+    if data.startswith(SignalType.CALL_REQUEST_SIGNAL_PREFIX.value):
+        state_manager.handle_call_request_signal(addr, data[len(SignalType.CALL_REQUEST_SIGNAL_PREFIX.value):])
+    elif data.startswith(SignalType.SPEAKER_STATUS_SIGNAL_PREFIX.value):
+        state_manager.handle_speaker_status_signal(data[len(SignalType.SPEAKER_STATUS_SIGNAL_PREFIX.value):], addr)
+    elif data.startswith(SignalType.RECEIVER_REPORT_SIGNAL_PREFIX.value):
+        state_manager.handle_receiver_report_signal(data[len(SignalType.RECEIVER_REPORT_SIGNAL_PREFIX.value):], addr)
+    elif data == SignalType.ACK_HANGUP_SIGNAL.value:
+        state_manager.handle_ack_hangup_signal(addr)
+    elif data == SignalType.ACK_CALL_REQUEST_SIGNAL.value:
+        state_manager.handle_ack_call_request_signal(addr)
+    elif data.startswith(SignalType.CALL_ACCEPTED_SIGNAL.value):
+        payload = data[len(SignalType.CALL_ACCEPTED_SIGNAL.value):]
+        state_manager.handle_call_accepted_signal(addr, payload[1:] if payload.startswith(b":") else payload)
+    elif data == SignalType.HANGUP_SIGNAL.value:
+        state_manager.handle_hangup_signal(addr)
+    elif data.startswith(SignalType.CHECK_SIGNAL_PREFIX.value):
+        state_manager.handle_check_signal(addr, data[len(SignalType.CHECK_SIGNAL_PREFIX.value):], is_response=False)
+    elif data.startswith(SignalType.CHECK_RESPONSE_SIGNAL_PREFIX.value):
+        state_manager.handle_check_signal(addr, data[len(SignalType.CHECK_RESPONSE_SIGNAL_PREFIX.value):], is_response=True)
+    elif data.startswith(SignalType.RELAY_CONTROL_PREFIX.value):
+        state_manager.handle_relay_control(addr, data)
+    elif data == SignalType.PUNCH_SIGNAL.value or data == SignalType.PUNCH_ACK_SIGNAL.value:
+        state_manager.handle_punch_signal(addr, is_ack=(data == SignalType.PUNCH_ACK_SIGNAL.value))
+    else:
+        state_manager.handle_audio_data(data, addr)
+
+def measure(dispatch, data, count):
+    view = memoryview(bytearray(data))
+    started = time.perf_counter_ns()
+    for _ in range(count):
+        dispatch(view, ADDRESS)
+    return (time.perf_counter_ns() - started) / count
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    state_manager = _NullStateManager()
+    event_handler = EventHandler(None, state_manager, None, None, _ignore)
+    packets = [
+        ("音频", build_audio_packet(12345, 0, bytes(PYAUDIO_CHUNK * 2)), True),
+        ("扬声器状态 (旧版)", build_legacy_signal(PacketType.SPEAKER_STATUS, b"ON"), True),
+        ("挂断ACK (旧版)", build_legacy_signal(PacketType.ACK_HANGUP), True),
+        ("打洞应答 (旧版)", SignalType.PUNCH_ACK_SIGNAL.value, True),
+        ("扬声器状态 (二进制)", build_signal(PacketType.SPEAKER_STATUS, SESSION_ID, b"ON"), False),
+        ("挂断ACK (二进制)", build_signal(PacketType.ACK_HANGUP, SESSION_ID), False),
+    ]
+    print(f"{'数据报':<20}{'比较链 ns':>12}{'查表 ns':>12}")
+    for name, data, legacy_format in packets:
+        table_ns = measure(event_handler.on_network_data_received, data, count)
+        if legacy_format:
+            chain_ns = measure(functools.partial(chain_dispatch, state_manager), data, count)
+            print(f"{name:<20}{chain_ns:>12.0f}{table_ns:>12.0f}")
+        else:
+            print(f"{name:<20}{'-':>12}{table_ns:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import *
+from models import CandidateType, SignalType
+from async_transport import EventLoopThread, LoopTimer
+from discovery_cache import local_interface_ip
+
+Address = Tuple[str, int]
+
+# RFC 8445 5.1.2.2 推荐的类型偏好；本应用每端只有一个 UDP 套接字 (component 1)
+_TYPE_PREFERENCE = {CandidateType.HOST: 126, CandidateType.SERVER_REFLEXIVE: 100, CandidateType.RELAY: 0}
+CHECK_TRANSACTION_ID_SIZE = 8
+
+class Candidate:
+    # token 仅 relay 候选使用：对方在中继上登记的分配令牌
+    __slots__ = ("type", "address", "priority", "token")
+
+    def __init__(self, candidate_type: CandidateType, address: Address, local_preference: int = 65535, token: Optional[bytes] = None):
+        self.type = candidate_type
+        self.address = address
+        self.token = token
+        self.priority = (_TYPE_PREFERENCE[candidate_type] << 24) | (local_preference << 8) | (256 - 1)
+
+    def as_tuple(self) -> tuple:
+        return (self.type.value, self.address[0], self.address[1]) + ((self.token.hex(),) if self.token else ())
+
+    @classmethod
+    def from_tuple(cls, value: tuple, index: int = 0) -> Optional["Candidate"]:
+        try:
+            # 同类型候选按特征码中的先后顺序递减本地偏好
+            token = bytes.fromhex(value[3]) if len(value) > 3 else None
+            return cls(CandidateType(value[0]), (value[1], int(value[2])), max(0, 65535 - index), token)
+        except (ValueError, IndexError):
+            return None
+
+    def __repr__(self):
+        return f"{self.type.value}:{self.address[0]}:{self.address[1]}"
+
+def _host_addresses() -> List[str]:
+    # 选路得到的出口接口排在最前；其余接口 (如第二块网卡) 作为补充
+    addresses = []
+    primary = local_interface_ip()
+    if primary:
+        addresses.append(primary)
+    try:
+        for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET, socket.SOCK_DGRAM):
+            ip = info[4][0]
+            if ip not in addresses and not ip.startswith("127.") and not ip.startswith("169.254."):
+                addresses.append(ip)
+    except OSError:
+        pass
+    return addresses[:CANDIDATE_MAX_HOST_ADDRESSES]
+
+def gather_candidates(local_port: int, public_address: Optional[Address], relay_address: Optional[Address] = None,
+                      relay_token: Optional[bytes] = None) -> List[Candidate]:
+    """收集本端候选：各本地接口地址 (host)、STUN 映射地址 (srflx) 与可选的中继地址 (relay)，按优先级降序。"""
+    candidates = [Candidate(CandidateType.HOST, (ip, local_port), 65535 - index) for index, ip in enumerate(_host_addresses())]
+    if public_address and public_address not in [c.address for c in candidates]:
+        candidates.append(Candidate(CandidateType.SERVER_REFLEXIVE, public_address))
+    if relay_address:
+        candidates.append(Candidate(CandidateType.RELAY, relay_address, token=relay_token))
+    candidates.sort(key=lambda c: c.priority, reverse=True)
+    return candidates
+
+class _CheckTransaction:
+    __slots__ = ("candidate", "sent")
+
+    def __init__(self, candidate: Candidate, sent: float):
+        self.candidate = candidate
+        self.sent = sent
+
+class ConnectivityChecker:
+    """
+    ICE 式连通性检查：按优先级顺序、每隔 CONNECTIVITY_CHECK_PACING_MS 发出一个检查 (含重传)，
+    对端原样回送事务 ID。首个成功后再等 CONNECTIVITY_CHECK_SETTLE_MS 收集其余结果，选 RTT 最低的地址；
+    全部失败返回 None。状态只在事件循环线程上修改。
+    """
+    def __init__(self, send: Callable[[bytes, Address], bool], event_loop: EventLoopThread, log_callback):
+        self.send = send
+        self.event_loop = event_loop
+        self.log = log_callback
+        self._transactions: Dict[bytes, _CheckTransaction] = {}
+        self._queue: List[Candidate] = []
+        self._rtts: Dict[Address, float] = {}
+        self._answered: set = set()
+        self._candidates: List[Candidate] = []
+        self._on_complete: Optional[Callable[[Optional[Address]], None]] = None
+        self._timer: Optional[LoopTimer] = None
+        self._deadline = 0.0
+        self._started = 0.0
+
+    def check(self, candidates: List[Candidate], on_complete: Callable[[Optional[Address]], None]):
+        self.event_loop.call_soon(self._start, list(candidates), on_complete)
+
+    def cancel(self):
+        self.event_loop.call_soon(self._finish, False)
+
+    def rtt_ms(self, address: Address) -> Optional[float]:
+        """最近一次检查中该地址的最小 RTT。"""
+        return self._rtts.get(address)
+
+    def on_request(self, address: Address, transaction_id: bytes):
+        # 应答不需要任何状态：任何知道本端候选地址的一方都可探测其连通性
+        self.send(SignalType.CHECK_RESPONSE_SIGNAL_PREFIX.value + transaction_id, address)
+
+    def on_response(self, address: Address, transaction_id: bytes):
+        received = time.monotonic()
+        self.event_loop.call_soon(self._on_response, address, bytes(transaction_id), received)
+
+    def _start(self, candidates: List[Candidate], on_complete):
+        self._finish(False)
+        candidates.sort(key=lambda c: c.priority, reverse=True)
+        self._candidates = candidates
+        self._queue = candidates * CONNECTIVITY_CHECK_TRANSMISSIONS
+        self._rtts = {}
+        self._answered = set()
+        self._on_complete = on_complete
+        self._started = time.monotonic()
+        self._deadline = self._started + CONNECTIVITY_CHECK_TIMEOUT_MS / 1000
+        self.log(f"开始连通性检查: {candidates}")
+        self._step()
+
+    def _step(self):
+        self._timer = None
+        if self._on_complete is None:
+            return
+        now = time.monotonic()
+        if now >= self._deadline:
+            self._finish(True)
+            return
+        # 已有结果的候选不再重传
+        while self._queue and self._queue[0].address in self._answered:
+            self._queue.pop(0)
+        if self._queue:
+            candidate = self._queue.pop(0)
+            transaction_id = os.urandom(CHECK_TRANSACTION_ID_SIZE)
+            self._transactions[transaction_id] = _CheckTransaction(candidate, now)
+            self.send(SignalType.CHECK_SIGNAL_PREFIX.value + transaction_id, candidate.address)
+        delay_s = CONNECTIVITY_CHECK_PACING_MS / 1000 if self._queue else self._deadline - now
+        self._timer = self.event_loop.call_later(min(delay_s, self._deadline - now), self._step)
+
+    def _on_response(self, address: Address, transaction_id: bytes, received: float):
+        transaction = self._transactions.pop(transaction_id, None)
+        if transaction is None or self._on_complete is None:
+            return
+        first_success = not self._rtts
+        rtt_ms = (received - transaction.sent) * 1000
+        # 应答来源可能与候选地址不同 (如对端在对称 NAT 后)，后续通信以实际来源为准
+        self._rtts[address] = min(rtt_ms, self._rtts.get(address, rtt_ms))
+        self._answered.add(transaction.candidate.address)
+        if len(self._answered) == len({c.address for c in self._candidates}):
+            self._finish(True)
+        elif first_success:
+            self._deadline = min(self._deadline, received + CONNECTIVITY_CHECK_SETTLE_MS / 1000)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self.event_loop.call_later(min(CONNECTIVITY_CHECK_PACING_MS / 1000, max(0.0, self._deadline - time.monotonic())), self._step)
+
+    def _finish(self, report: bool):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        on_complete, self._on_complete = self._on_complete, None
+        self._transactions.clear()
+        self._queue = []
+        if on_complete is None or not report:
+            return
+        best = min(self._rtts, key=self._rtts.get) if self._rtts else None
+        elapsed_ms = (time.monotonic() - self._started) * 1000
+        if best:
+            self.log(f"连通性检查完成 ({elapsed_ms:.0f} ms): 选用 {best} (RTT {self._rtts[best]:.1f} ms), 全部结果 {self._rtts}")
+        else:
+            self.log(f"连通性检查完成 ({elapsed_ms:.0f} ms): 所有候选均无响应。", is_warning=True)
+        on_complete(best)
@@ -0,0 +1,82 @@
+import time
+from collections import deque
+from typing import Optional
+
+from config import *
+from utils import sequence_delta
+
+class ClockDriftEstimator:
+    """
+    估计发送端采样时钟相对本机的漂移。相对传输时延 = 到达时间 - 序列号 * 帧长；
+    每个窗口取最小值以滤除排队抖动，再对最近若干窗口做最小二乘拟合，斜率即漂移率。
+    ratio > 1 表示对方时钟偏慢：播放节拍应放慢，每帧输出相应拉长。
+    """
+    def __init__(self, frame_duration_s: float):
+        self.frame_duration_s = frame_duration_s
+        self.enabled = CLOCK_DRIFT_COMPENSATION
+        self.reset()
+
+    def reset(self):
+        self._base_seq: Optional[int] = None
+        self._window_start: Optional[float] = None
+        self._window_min: Optional[tuple] = None
+        self._points = deque(maxlen=CLOCK_DRIFT_HISTORY_WINDOWS)
+        self._depth_error = 0.0
+        self.drift = 0.0
+        self.ratio = 1.0
+        self.stats = {"windows": 0, "restarts": 0}
+
+    def on_arrival(self, seq_num: int, arrival_time: Optional[float] = None):
+        if not self.enabled:
+            return
+        if arrival_time is None:
+            arrival_time = time.monotonic()
+        if self._base_seq is None:
+            self._base_seq = seq_num
+            self._window_start = arrival_time
+        transit = arrival_time - sequence_delta(seq_num, self._base_seq, MAX_SEQ_NUM) * self.frame_duration_s
+        if self._window_min is None or transit < self._window_min[1]:
+            self._window_min = (arrival_time, transit)
+        if arrival_time - self._window_start >= CLOCK_DRIFT_WINDOW_S:
+            self._close_window(arrival_time)
+
+    def _close_window(self, now: float):
+        point = self._window_min
+        self._window_start = now
+        self._window_min = None
+        if self._points and abs(point[1] - self._points[-1][1]) > CLOCK_DRIFT_RESET_STEP_S:
+            # 时延阶跃 (对方静音/路由切换等) 不是漂移，丢弃历史重新拟合
+            self._points.clear()
+            self.stats["restarts"] += 1
+        self._points.append(point)
+        self.stats["windows"] += 1
+        if len(self._points) >= CLOCK_DRIFT_MIN_WINDOWS:
+            self.drift = self._fit_slope()
+        self._update_ratio()
+
+    def _fit_slope(self) -> float:
+        n = len(self._points)
+        mean_t = sum(t for t, _ in self._points) / n
+        mean_d = sum(d for _, d in self._points) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in self._points)
+        if var_t <= 0:
+            return self.drift
+        slope = sum((t - mean_t) * (d - mean_d) for t, d in self._points) / var_t
+        limit = CLOCK_DRIFT_MAX_PPM / 1e6
+        return max(-limit, min(limit, slope))
+
+    def observe_depth(self, depth: int, target_depth: int):
+        """播放端每帧调用：缓冲深度偏离目标时附加一个小的比例修正，把累积误差拉回目标延迟。"""
+        if not self.enabled:
+            return
+        self._depth_error += ((depth - target_depth) - self._depth_error) * CLOCK_DRIFT_DEPTH_SMOOTHING
+        self._update_ratio()
+
+    def _update_ratio(self):
+        limit = CLOCK_DRIFT_MAX_PPM / 1e6
+        correction = -self._depth_error * CLOCK_DRIFT_DEPTH_GAIN_PPM / 1e6
+        self.ratio = 1.0 + max(-limit, min(limit, self.drift + correction))
+
+    @property
+    def ppm(self) -> float:
+        return (self.ratio - 1.0) * 1e6
@@ -39,26 +39,195 @@ PACKET_INDICATOR_IDLE = "gray50"
 # --- Network Configuration ---
 DEFAULT_STUN_HOST = 'stun.miwifi.com'
 DEFAULT_STUN_PORT = 3478
+# 启动时并行查询，最先返回有效映射地址者胜出
+STUN_SERVERS = [
+    (DEFAULT_STUN_HOST, DEFAULT_STUN_PORT),
+    ('stun.qq.com', 3478),
+    ('stun.cloudflare.com', 3478),
+    ('stun.l.google.com', 19302),
+]
+# RFC 5389 7.2.1: 首次 RTO，每次重传加倍；总时限到达即放弃
+STUN_INITIAL_RTO_MS = 500
+STUN_MAX_RETRANSMITS = 3
+STUN_DISCOVERY_TIMEOUT_S = 3.0
+STUN_RESOLVE_POLL_S = 0.02
+# RFC 5780 行为发现需要服务器有第二个 IP 并支持 CHANGE-REQUEST；取首个返回 OTHER-ADDRESS 的服务器
+NAT_BEHAVIOR_STUN_SERVERS = [
+    ('stun.stunprotocol.org', 3478),
+    (DEFAULT_STUN_HOST, DEFAULT_STUN_PORT),
+    ('stun.qq.com', 3478),
+]
+# 过滤测试靠"收不到"下结论，探测并发进行，总耗时约为此值
+NAT_PROBE_TIMEOUT_S = 2.0
+# 公网映射地址/NAT 类型/STUN 服务器解析结果的磁盘缓存，按 (本地接口, 默认网关, 本地端口) 区分网络
+DISCOVERY_CACHE_ENABLED = True
+DISCOVERY_CACHE_FILENAME = "discovery_cache.json"
+DISCOVERY_CACHE_TTL_S = 3600
+# 仅用于选路以确定本地出口接口，不会向其发送数据
+DISCOVERY_ROUTE_PROBE_ADDRESS = ("223.5.5.5", 53)
 FEATURE_CODE_KEY = "P2PKey!VoIP"
 MAX_PACKET_SIZE = 4096
 RANDOM_PORT_START = 49152
 RANDOM_PORT_END = 65535
 RANDOM_PORT_MAX_TRIES = 100
+# 接收缓冲环大小：交出的 memoryview 在其后再收到这么多个数据报之前保持有效
+RECEIVE_BUFFER_POOL_SIZE = 8
+RECEIVE_POLL_TIMEOUT_S = 1.0
+# "thread": 轮询式接收线程; "asyncio": DatagramProtocol 运行在共享事件循环线程上，信令定时器也由该循环调度
+NETWORK_TRANSPORT = "thread"
+# 信令定时器 (重传、超时、界面复位) 的调度: "auto" (asyncio 传输时用网络事件循环，否则用独立定时线程)、
+# "asyncio"、"thread" 或 "tk" (旧行为: Tk 主循环，界面卡顿时重传随之推迟)
+SIGNALING_SCHEDULER = "auto"
+
+# --- NAT Traversal ---
+# 打洞：每轮紧密发送 BURST_PACKETS 个打洞包，轮间隔 BURST_INTERVAL_MS，直到收到对方打洞包/应答或 DURATION_S 超时
+HOLE_PUNCH_ENABLED = True
+HOLE_PUNCH_BURST_PACKETS = 4
+HOLE_PUNCH_PACKET_INTERVAL_MS = 20
+HOLE_PUNCH_BURST_INTERVAL_MS = 500
+HOLE_PUNCH_DURATION_S = 15
+# 常见家用 NAT 的 UDP 映射空闲超时为 30 秒起；保活包为空数据报，各版本接收端均直接丢弃
+NAT_KEEPALIVE_INTERVAL_S = 15
+NAT_KEEPALIVE_PAYLOAD = b""
+# 候选收集与连通性检查 (ICE 式)：扩展特征码携带全部候选，呼叫前对各候选检查并选 RTT 最低者
+CANDIDATE_MAX_HOST_ADDRESSES = 3
+CONNECTIVITY_CHECK_PACING_MS = 20
+CONNECTIVITY_CHECK_TRANSMISSIONS = 3
+CONNECTIVITY_CHECK_TIMEOUT_MS = 800
+# 首个检查成功后再等待此时长，让其余 (可能更快的) 候选也有机会应答
+CONNECTIVITY_CHECK_SETTLE_MS = 60
+
+# --- Relay ---
+# 中继服务器 (host, port)，None 为不使用；直连检查全部失败时经中继呼叫。自建: python relay.py --port 3479
+RELAY_SERVER = None
+RELAY_DEFAULT_PORT = 3479
+RELAY_CONNECT_RETRY_MS = 200
+RELAY_CONNECT_MAX_ATTEMPTS = 5
+# 服务端: 配对双方均无数据超过 IDLE_TIMEOUT_S 即解除；空闲清扫每 SWEEP_INTERVAL_S 或每 SWEEP_CHECK_PACKETS 个数据报检查一次
+RELAY_IDLE_TIMEOUT_S = 60
+RELAY_SWEEP_INTERVAL_S = 5
+RELAY_SWEEP_CHECK_PACKETS = 4096
+RELAY_SOCKET_BUFFER_BYTES = 4 * 1024 * 1024
 
 # --- Call Logic Timings ---
-CALL_REQUEST_ACK_TIMEOUT_MS = 500
-HANGUP_ACK_TIMEOUT_MS = 500
+# 可靠信令: 未确认的消息按 RTO 重传，每次退避加倍；RTO 按 RFC 6298 由确认往返时间估计，
+# 首个样本之前为 INITIAL_MS (连通性检查测得的 RTT 会作为首个样本)
+SIGNAL_RTO_INITIAL_MS = 500
+SIGNAL_RTO_MIN_MS = 150
+SIGNAL_RTO_MAX_MS = 2000
+# 含首次发送的总次数；打洞进行中对方 NAT 可能要过几轮才放行
+SIGNAL_MAX_TRANSMISSIONS = 6
+# 接收端为去重记住的最近消息 ID 个数
+SIGNAL_DUPLICATE_HISTORY = 64
 CALL_END_UI_RESET_DELAY_MS = 3000
+# 快速接通: 振铃/等待接听时就在后台打开音频流 (Windows 上打开设备可达数百毫秒)，接通后直接复用；
+# 预热期间的麦克风数据一律丢弃，不会发送
+FAST_CONNECT_PREWARM_AUDIO = True
 
 # --- Audio Configuration ---
-import pyaudio
-PYAUDIO_FORMAT = pyaudio.paInt16
+# 独立运行的中继服务 (relay.py) 同样读取本文件，无界面主机上不一定装有 PyAudio；8 即 PortAudio 的 paInt16
+try:
+    import pyaudio
+    PYAUDIO_FORMAT = pyaudio.paInt16
+except ImportError:
+    PYAUDIO_FORMAT = 8
 PYAUDIO_CHANNELS = 1
 PYAUDIO_RATE = 40000
 PYAUDIO_CHUNK = 256
 MAX_SEQ_NUM = 2**32
-SEQ_NUM_DEQUE_MAXLEN = 200
+REPLAY_WINDOW_SIZE = 1024
+REPLAY_WINDOW_RESYNC_THRESHOLD = 50
 MIC_READ_MAX_ERRORS = 20
+AUDIO_USE_CALLBACK_STREAMS = True
+AUDIO_RING_BUFFER_CHUNKS = 32
+MIC_CALLBACK_READ_TIMEOUT_S = 0.5
+# 设备以其原生采样率 (defaultSampleRate) 运行，与线路采样率之间由 resampler 转换
+AUDIO_USE_DEVICE_NATIVE_RATE = True
+# 线路采样率：呼叫方按此顺序提供，被叫方按自身顺序选择双方都支持的第一个；窄带链路可将 16000 放在首位。
+# 帧长随线路采样率换算为约 PYAUDIO_CHUNK / PYAUDIO_RATE 秒；旧版对端始终使用 PYAUDIO_RATE
+AUDIO_WIRE_RATE_PREFERENCE = [40000, 16000]
+RESAMPLER_TAPS_PER_PHASE = 16
+RESAMPLER_MAX_POLYPHASE_PHASES = 16
+RESAMPLER_CUTOFF = 0.9
+
+# --- Audio Codec ---
+# 通话请求中提供本端可解码的全部编解码器；被叫选双方都支持且每样本比特数最低的一个，相同时按此顺序
+AUDIO_CODEC_PREFERENCE = ["IMA-ADPCM", "PCMU", "PCMA", "L16"]
+AUDIO_EXTERNAL_CODEC_MODULES = []
+
+# --- Voice Activity Detection / DTX ---
+VAD_ENABLED = True
+VAD_INITIAL_NOISE_RMS = 100
+VAD_MIN_SPEECH_RMS = 200
+VAD_ENERGY_THRESHOLD_RATIO = 3.0
+VAD_UNVOICED_ENERGY_RATIO = 1.5
+VAD_ZCR_UNVOICED_MIN = 0.25
+VAD_NOISE_FALL_RATE = 0.2
+VAD_NOISE_RISE_RATE = 0.005
+VAD_HANGOVER_FRAMES = 30
+CN_SID_INTERVAL_FRAMES = 30
+
+# --- Forward Error Correction ---
+# (平滑丢包率下限, 每组数据包数 k, 交织步长); k 为 0 表示不发送冗余
+FEC_LEVELS = [
+    (0.0, 0, 1),
+    (0.005, 8, 1),
+    (0.02, 4, 2),
+    (0.05, 2, 4),
+    (0.12, 1, 4),
+]
+FEC_INITIAL_LEVEL = 2
+FEC_LOSS_SMOOTHING = 0.3
+FEC_DOWNGRADE_HYSTERESIS = 0.5
+FEC_RECEIVE_HISTORY = 256
+FEC_MAX_PENDING_PARITY = 32
+FEC_REPORT_INTERVAL_S = 1.0
+FEC_PARITY_IDLE_RESET_S = 3.0
+RED_DISTANCE_FRAMES = 3
+# 通话请求中按偏好顺序提供的冗余方式 (见 models.RedundancyMode)；旧版对端始终回退到整包重复发送
+REDUNDANCY_MODE_PREFERENCE = ["fec", "red"]
+
+# --- Packetization (ptime) ---
+# 每个数据报聚合的采集帧数; 1 帧 = PYAUDIO_CHUNK / PYAUDIO_RATE = 6.4ms, 可选 1-4 (6.4/12.8/19.2/25.6ms)
+PACKETIZATION_FRAMES = 2
+PACKETIZATION_MAX_FRAMES = 4
+PACKETIZATION_FRAME_MS = PYAUDIO_CHUNK * 1000 / PYAUDIO_RATE
+# 通话请求/接听以 maxptime=<毫秒> 告知对方本端可接收的最大包长 (PACKETIZATION_MAX_FRAMES 帧)，发送端的每包帧数不超过对方的上限
+# 对方回报的平滑丢包率超过 DEGRADE_LOSS 时切换到 DEGRADED_FRAMES 以降低包率，低于 RECOVER_LOSS 时恢复；
+# 设为 False 则始终使用 PACKETIZATION_FRAMES
+PACKETIZATION_ADAPTIVE = True
+PACKETIZATION_DEGRADED_FRAMES = 4
+PACKETIZATION_DEGRADE_LOSS = 0.05
+PACKETIZATION_RECOVER_LOSS = 0.02
+PACKETIZATION_IDLE_RESET_S = 3.0
+
+# --- Jitter Buffer / Playout ---
+JITTER_BUFFER_MIN_FRAMES = 2
+JITTER_BUFFER_MAX_FRAMES = 48
+JITTER_BUFFER_INITIAL_FRAMES = 4
+JITTER_BUFFER_JITTER_MULTIPLIER = 3.0
+JITTER_BUFFER_ACCELERATE_MARGIN_FRAMES = 2
+JITTER_BUFFER_RESYNC_GAP_FRAMES = 500
+PLAYOUT_MAX_LAG_FRAMES = 8
+
+# --- Clock Drift Compensation ---
+CLOCK_DRIFT_COMPENSATION = True
+CLOCK_DRIFT_WINDOW_S = 2.0
+CLOCK_DRIFT_HISTORY_WINDOWS = 30
+CLOCK_DRIFT_MIN_WINDOWS = 5
+CLOCK_DRIFT_MAX_PPM = 1000
+CLOCK_DRIFT_RESET_STEP_S = 0.05
+# 缓冲深度每超出目标 1 帧附加的播放速率修正 (ppm)，及深度误差的平滑系数
+CLOCK_DRIFT_DEPTH_GAIN_PPM = 50
+CLOCK_DRIFT_DEPTH_SMOOTHING = 0.01
+
+# --- Packet Loss Concealment ---
+PLC_MIN_PITCH_HZ = 70
+PLC_MAX_PITCH_HZ = 400
+PLC_PITCH_SEARCH_DECIMATION = 4
+PLC_CROSSFADE_SAMPLES = 64
+PLC_FULL_GAIN_FRAMES = 2
+PLC_MAX_CONCEALED_FRAMES = 10
 
 # --- Status Messages ---
 STATUS_WAITING_FOR_REMOTE_INFO = "未有远端特征/已可接收呼叫"
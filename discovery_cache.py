@@ -0,0 +1,150 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import *
+from utils import user_data_path
+
+def local_interface_ip() -> Optional[str]:
+    # UDP connect 只做路由选择，不发送任何数据
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect(DISCOVERY_ROUTE_PROBE_ADDRESS)
+        return probe.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        probe.close()
+
+def _default_gateway() -> Optional[str]:
+    try:
+        if sys.platform.startswith("win"):
+            output = subprocess.run(["route", "print", "-4", "0.0.0.0"], capture_output=True, text=True, timeout=1.0,
+                                    creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)).stdout
+            for line in output.splitlines():
+                fields = line.split()
+                if len(fields) >= 3 and fields[0] == "0.0.0.0" and fields[1] == "0.0.0.0":
+                    return fields[2]
+        elif os.path.exists("/proc/net/route"):
+            with open("/proc/net/route") as f:
+                for line in f.readlines()[1:]:
+                    fields = line.split()
+                    if len(fields) >= 3 and fields[1] == "00000000":
+                        return socket.inet_ntoa(int(fields[2], 16).to_bytes(4, "little"))
+    except (OSError, ValueError, subprocess.SubprocessError):
+        pass
+    return None
+
+def current_network_identity() -> Tuple[Optional[str], Optional[str]]:
+    """(本地出口接口 IP, 默认网关)；两者共同标识"同一个网络"。"""
+    return local_interface_ip(), _default_gateway()
+
+class DiscoveryCache:
+    """
+    磁盘上的 STUN/NAT 发现结果缓存，以网络指纹 (本地接口, 默认网关, 本地端口) 为键，超过 TTL 即失效。
+    另记录 STUN 服务器域名的解析结果，重新验证时可跳过 DNS。
+    """
+    def __init__(self, log_callback, path: Optional[str] = None, ttl_s: float = DISCOVERY_CACHE_TTL_S):
+        self.log_callback = log_callback
+        self.path = path
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._data: Optional[dict] = None
+
+    @staticmethod
+    def make_key(identity: Tuple[Optional[str], Optional[str]], local_port: int) -> Optional[str]:
+        interface_ip, gateway = identity
+        if not interface_ip:
+            return None
+        return f"{interface_ip}|{gateway or '-'}|{local_port}"
+
+    def _load_locked(self) -> dict:
+        if self._data is None:
+            self._data = {"entries": {}, "stun_ips": {}}
+            try:
+                if self.path is None:
+                    self.path = user_data_path(DISCOVERY_CACHE_FILENAME)
+                with open(self.path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    self._data["entries"] = dict(loaded.get("entries") or {})
+                    self._data["stun_ips"] = dict(loaded.get("stun_ips") or {})
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                self.log_callback(f"读取发现缓存失败，将重新探测: {e}", is_warning=True)
+        return self._data
+
+    def _save_locked(self):
+        if self.path is None:
+            return
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.log_callback(f"写入发现缓存失败: {e}", is_warning=True)
+
+    def _fresh(self, timestamp) -> bool:
+        return isinstance(timestamp, (int, float)) and 0 <= time.time() - timestamp < self.ttl_s
+
+    def preferred_port(self, identity) -> Optional[int]:
+        """同一网络上最近一次使用的本地端口；复用它可使 NAT 映射与特征码在重启后保持不变。"""
+        prefix = self.make_key(identity, 0)
+        if prefix is None:
+            return None
+        prefix = prefix[:prefix.rindex("|") + 1]
+        with self._lock:
+            entries = self._load_locked()["entries"]
+            candidates = [(record.get("timestamp", 0), record.get("local_port")) for key, record in entries.items()
+                          if key.startswith(prefix) and self._fresh(record.get("timestamp"))]
+        candidates = [c for c in candidates if isinstance(c[1], int)]
+        return max(candidates)[1] if candidates else None
+
+    def get(self, key: Optional[str]) -> Optional[dict]:
+        if key is None:
+            return None
+        with self._lock:
+            record = self._load_locked()["entries"].get(key)
+        if not isinstance(record, dict) or not self._fresh(record.get("timestamp")):
+            return None
+        if not record.get("public_ip") or not record.get("public_port"):
+            return None
+        return dict(record)
+
+    def put(self, key: Optional[str], local_port: int, public_ip: str, public_port: int, is_cone_nat: Optional[bool],
+            stun_server: Optional[str] = None, nat_behavior: Optional[dict] = None):
+        if key is None:
+            return
+        with self._lock:
+            data = self._load_locked()
+            entries = data["entries"]
+            entries[key] = {
+                "local_port": local_port, "public_ip": public_ip, "public_port": public_port,
+                "is_cone_nat": is_cone_nat, "stun_server": stun_server, "nat_behavior": nat_behavior, "timestamp": time.time(),
+            }
+            for stale in [k for k, record in entries.items() if not self._fresh(record.get("timestamp"))]:
+                del entries[stale]
+            self._save_locked()
+
+    def resolved_stun_ips(self) -> Dict[str, str]:
+        with self._lock:
+            stun_ips = self._load_locked()["stun_ips"]
+            return {server: value[0] for server, value in stun_ips.items()
+                    if isinstance(value, list) and len(value) == 2 and self._fresh(value[1])}
+
+    def put_resolved_stun_ips(self, resolved: Dict[str, str]):
+        if not resolved:
+            return
+        with self._lock:
+            data = self._load_locked()
+            now = time.time()
+            for server, ip in resolved.items():
+                data["stun_ips"][server] = [ip, now]
+            self._save_locked()
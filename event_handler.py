@@ -1,9 +1,10 @@
 # event_handler.py
 
 from __future__ import annotations
-from typing import TYPE_CHECKING, Callable, Dict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
-from models import SignalType
+from models import PacketType, SignalType
+from signaling import SIGNAL_HEADER, SIGNAL_MARKER, SIGNAL_VERSION_BYTE, legacy_signal_name
 
 if TYPE_CHECKING:
     from state_manager import CallStateManager
@@ -14,7 +15,7 @@ if TYPE_CHECKING:
 class EventHandler:
     """
     负责接收所有外部输入（UI、网络、定时器），并将其转换为对 StateManager 或 AppController 的调用。
-    这是一个纯粹的“翻译官”。
+    这是一个纯粹的“翻译官”。改变通话状态的调用一律经 state_manager.scheduler 投递，与协议定时器在同一线程上串行执行。
     """
     def __init__(
         self,
@@ -29,6 +30,7 @@ class EventHandler:
         self.ui_manager = ui_manager_ref
         self.audio_manager = audio_manager_ref
         self.log = log_callback
+        self._build_signal_dispatch()
 
     def get_ui_callbacks(self) -> Dict[str, Callable]:
         """返回一个包含所有UI回调的完整字典。"""
@@ -47,29 +49,39 @@ class EventHandler:
             "ui_on_peer_info_changed": self.on_peer_info_changed,
         }
 
+    def _post(self, callback: Callable, *args):
+        self.state_manager.scheduler.call_soon(callback, *args)
+
     # --- 核心通话事件 ---
     def on_call_hangup_button_clicked(self):
-        self.state_manager.handle_call_button_press(
-            peer_ip=self.ui_manager.get_peer_ip_entry(),
-            peer_port=self.ui_manager.get_peer_port_entry(),
-            is_peer_info_valid=self.ui_manager.is_peer_info_valid(),
-            is_audio_ready=self.audio_manager.is_initialized(),
-            is_network_ready=self.controller.is_running_main_op
+        # 输入框在 UI 线程读取，状态机只拿到值
+        self._post(
+            self.state_manager.handle_call_button_press,
+            self.ui_manager.get_peer_ip_entry(),
+            self.ui_manager.get_peer_port_entry(),
+            self.ui_manager.is_peer_info_valid(),
+            self.audio_manager.is_initialized(),
+            self.controller.is_running_main_op
         )
 
     def on_accept_call_clicked(self):
-        self.state_manager.handle_accept_button_press()
+        self._post(self.state_manager.handle_accept_button_press)
 
     def on_reject_call_clicked(self):
-        self.state_manager.handle_reject_button_press()
+        self._post(self.state_manager.handle_reject_button_press)
 
     def on_toggle_mic(self):
         mic_muted = self.audio_manager.toggle_mic_mute()
         self.ui_manager.update_mute_switch_text(mic_muted, not self.state_manager.my_speaker_switch_is_on)
 
     def on_toggle_speaker(self):
+        self._post(self._toggle_speaker)
+
+    def _toggle_speaker(self):
         is_on = self.state_manager.toggle_my_speaker_switch()
-        self.ui_manager.update_mute_switch_text(self.audio_manager.mic_muted, not is_on)
+        master = self.ui_manager.master
+        if master.winfo_exists():
+            master.after(0, self.ui_manager.update_mute_switch_text, self.audio_manager.mic_muted, not is_on)
 
     # --- 应用级/工具类事件 (新增方法) ---
     def on_copy_feature_code(self):
@@ -85,19 +97,67 @@ class EventHandler:
         self.controller.on_peer_info_changed()
 
     # --- 网络事件 ---
+    def _build_signal_dispatch(self):
+        # 处理函数统一为 (addr, session_id, message_id, payload)；旧版 ASCII 信令的 session_id 为 None、message_id 为 0
+        state_manager = self.state_manager
+        handlers = {
+            PacketType.CALL_REQUEST: lambda addr, session_id, message_id, payload: state_manager.handle_call_request_signal(addr, payload, session_id),
+            PacketType.ACK_CALL_REQUEST: lambda addr, session_id, message_id, payload: state_manager.handle_ack_call_request_signal(addr),
+            PacketType.CALL_ACCEPTED: lambda addr, session_id, message_id, payload: state_manager.handle_call_accepted_signal(addr, payload),
+            PacketType.HANGUP: lambda addr, session_id, message_id, payload: state_manager.handle_hangup_signal(addr, session_id),
+            PacketType.ACK_HANGUP: lambda addr, session_id, message_id, payload: state_manager.handle_ack_hangup_signal(addr),
+            PacketType.SPEAKER_STATUS: lambda addr, session_id, message_id, payload: state_manager.handle_speaker_status_signal(payload, addr),
+            PacketType.RECEIVER_REPORT: lambda addr, session_id, message_id, payload: state_manager.handle_receiver_report_signal(payload, addr),
+            PacketType.ACK: lambda addr, session_id, message_id, payload: state_manager.handle_signal_ack(addr, message_id),
+        }
+        # 二进制信令按包类型直接索引
+        self._signal_handlers: List[Optional[Callable]] = [None] * 256
+        for packet_type, handler in handlers.items():
+            self._signal_handlers[packet_type] = handler
+
+        legacy_handlers = {
+            SignalType.CALL_REQUEST_SIGNAL_PREFIX: handlers[PacketType.CALL_REQUEST],
+            SignalType.ACK_CALL_REQUEST_SIGNAL: handlers[PacketType.ACK_CALL_REQUEST],
+            SignalType.CALL_ACCEPTED_SIGNAL: lambda addr, session_id, message_id, payload: state_manager.handle_call_accepted_signal(
+                addr, payload[1:] if payload.startswith(b":") else payload),
+            SignalType.HANGUP_SIGNAL: handlers[PacketType.HANGUP],
+            SignalType.ACK_HANGUP_SIGNAL: handlers[PacketType.ACK_HANGUP],
+            SignalType.SPEAKER_STATUS_SIGNAL_PREFIX: handlers[PacketType.SPEAKER_STATUS],
+            SignalType.RECEIVER_REPORT_SIGNAL_PREFIX: handlers[PacketType.RECEIVER_REPORT],
+            SignalType.CHECK_SIGNAL_PREFIX: lambda addr, session_id, message_id, payload: state_manager.handle_check_signal(addr, payload, is_response=False),
+            SignalType.CHECK_RESPONSE_SIGNAL_PREFIX: lambda addr, session_id, message_id, payload: state_manager.handle_check_signal(addr, payload, is_response=True),
+            SignalType.RELAY_CONTROL_PREFIX: lambda addr, session_id, message_id, payload: state_manager.handle_relay_control(
+                addr, SignalType.RELAY_CONTROL_PREFIX.value + payload),
+            SignalType.PUNCH_SIGNAL: lambda addr, session_id, message_id, payload: state_manager.handle_punch_signal(addr, is_ack=False),
+            SignalType.PUNCH_ACK_SIGNAL: lambda addr, session_id, message_id, payload: state_manager.handle_punch_signal(addr, is_ack=True),
+        }
+        # 旧版信令以名称 (b"__NAME__") 查表，值为 (含 ':' 的前缀长度, 处理函数)
+        self._legacy_signal_handlers: Dict[bytes, Tuple[int, Callable]] = {
+            signal.value.rstrip(b":"): (len(signal.value), handler) for signal, handler in legacy_handlers.items()
+        }
+
     def on_network_data_received(self, data, addr):
-        if data.startswith(SignalType.CALL_REQUEST_SIGNAL_PREFIX.value):
-            self.state_manager.handle_call_request_signal(addr)
-        elif data.startswith(SignalType.SPEAKER_STATUS_SIGNAL_PREFIX.value):
-            payload = data[len(SignalType.SPEAKER_STATUS_SIGNAL_PREFIX.value):]
-            self.state_manager.handle_speaker_status_signal(payload, addr)
-        elif data == SignalType.ACK_HANGUP_SIGNAL.value:
-            self.state_manager.handle_ack_hangup_signal(addr)
-        elif data == SignalType.ACK_CALL_REQUEST_SIGNAL.value:
-            self.state_manager.handle_ack_call_request_signal(addr)
-        elif data == SignalType.CALL_ACCEPTED_SIGNAL.value:
-            self.state_manager.handle_call_accepted_signal(addr)
-        elif data == SignalType.HANGUP_SIGNAL.value:
-            self.state_manager.handle_hangup_signal(addr)
-        else:
-            self.state_manager.handle_audio_data(data, addr)
\ No newline at end of file
+        # data 为接收缓冲上的 memoryview。媒体包的首字节是序列号高位，几乎不会等于信令标记，
+        # 比较一个字节即可直接交给状态机 (音频在收包线程处理)；只有信令才转为 bytes 并投递到调度器
+        if data[0] != SIGNAL_MARKER:
+            self.state_manager.handle_audio_data(data, addr)
+            return
+        if len(data) >= SIGNAL_HEADER.size and data[1] == SIGNAL_VERSION_BYTE:
+            _, _, packet_type, session_id, message_id = SIGNAL_HEADER.unpack_from(data)
+            handler = self._signal_handlers[packet_type]
+            if handler is not None:
+                self._post(self._dispatch_signal, handler, addr, packet_type, session_id, message_id, bytes(data[SIGNAL_HEADER.size:]))
+                return
+        elif len(data) > 1 and data[1] == SIGNAL_MARKER:
+            data = bytes(data)
+            entry = self._legacy_signal_handlers.get(legacy_signal_name(data))
+            if entry is not None:
+                prefix_size, handler = entry
+                self._post(handler, addr, None, 0, data[prefix_size:])
+                return
+        self.state_manager.handle_audio_data(data, addr)
+
+    def _dispatch_signal(self, handler: Callable, addr, packet_type: int, session_id: int, message_id: int, payload: bytes):
+        # 呼叫请求本身建立会话；其余信令须属于当前会话，需要确认的在此确认并去重
+        if packet_type == PacketType.CALL_REQUEST or self.state_manager.accept_signal_session(addr, packet_type, session_id, message_id):
+            handler(addr, session_id, message_id, payload)
@@ -0,0 +1,294 @@
+import struct
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config import *
+from media_packet import AUDIO_HEADER, FEC_PAYLOAD_TYPE
+from utils import sequence_delta
+
+# k, stride, 成员位图, 长度异或, payload_type 异或
+FEC_HEADER = struct.Struct("!BBHHB")
+RECEIVER_REPORT_PAYLOAD = struct.Struct("!H")
+
+def _xor_accumulate(acc: int, payload: bytes) -> int:
+    # 小端解释使较短的 payload 自然在尾部补零
+    return acc ^ int.from_bytes(payload, "little")
+
+class _ParityGroup:
+    __slots__ = ("mask", "length_xor", "pt_xor", "acc", "max_len")
+
+    def __init__(self):
+        self.mask = 0
+        self.length_xor = 0
+        self.pt_xor = 0
+        self.acc = 0
+        self.max_len = 0
+
+class FecEncoder:
+    """
+    异或奇偶校验 FEC 编码：每 k 个数据包生成 1 个校验包。stride > 1 时交织分组——
+    连续 k*stride 个序列号组成一个块，第 j 组包含 base+j, base+j+stride, ...，
+    因此长度不超过 stride 的突发丢包在每组中至多丢一个。k 为 0 时不产生冗余。
+    """
+    def __init__(self):
+        self.group_size = 0
+        self.stride = 1
+        self._block_base: Optional[int] = None
+        self._groups: Dict[int, _ParityGroup] = {}
+        self.parity_packets_sent = 0
+
+    def reset(self):
+        self._block_base = None
+        self._groups.clear()
+        self.parity_packets_sent = 0
+
+    def configure(self, group_size: int, stride: int) -> List[bytes]:
+        if group_size == self.group_size and stride == self.stride:
+            return []
+        pending = self.flush()
+        self.group_size = group_size
+        self.stride = max(1, stride)
+        return pending
+
+    def flush(self) -> List[bytes]:
+        packets = []
+        if self._block_base is not None:
+            for j, group in sorted(self._groups.items()):
+                if group.mask:
+                    group_base = (self._block_base + j) % MAX_SEQ_NUM
+                    header = FEC_HEADER.pack(self.group_size, self.stride, group.mask, group.length_xor, group.pt_xor)
+                    parity = group.acc.to_bytes(group.max_len, "little")
+                    packets.append(AUDIO_HEADER.pack(group_base, FEC_PAYLOAD_TYPE) + header + parity)
+        self._block_base = None
+        self._groups.clear()
+        self.parity_packets_sent += len(packets)
+        return packets
+
+    def add(self, seq_num: int, payload_type: int, payload: bytes) -> List[bytes]:
+        if self.group_size <= 0:
+            return []
+        packets = []
+        block_span = self.group_size * self.stride
+        if self._block_base is not None:
+            offset = sequence_delta(seq_num, self._block_base, MAX_SEQ_NUM)
+            if offset < 0 or offset >= block_span:
+                packets.extend(self.flush())
+        if self._block_base is None:
+            self._block_base = seq_num
+        offset = sequence_delta(seq_num, self._block_base, MAX_SEQ_NUM)
+
+        group = self._groups.get(offset % self.stride)
+        if group is None:
+            group = self._groups[offset % self.stride] = _ParityGroup()
+        group.mask |= 1 << (offset // self.stride)
+        group.length_xor ^= len(payload)
+        group.pt_xor ^= payload_type
+        group.acc = _xor_accumulate(group.acc, payload)
+        group.max_len = max(group.max_len, len(payload))
+
+        if offset == block_span - 1:
+            packets.extend(self.flush())
+        return packets
+
+class _PendingParity:
+    __slots__ = ("members", "length_xor", "pt_xor", "acc", "created")
+
+    def __init__(self, members, length_xor, pt_xor, acc):
+        self.members = members
+        self.length_xor = length_xor
+        self.pt_xor = pt_xor
+        self.acc = acc
+        self.created = time.monotonic()
+
+class FecDecoder:
+    """接收端：记录最近收到的数据包，收到校验包时若其组内恰缺一个包即可恢复。"""
+    def __init__(self, history_size: int = FEC_RECEIVE_HISTORY):
+        self._received: Dict[int, Tuple[int, bytes]] = {}
+        self._order = deque()
+        self._history_size = history_size
+        self._pending: List[_PendingParity] = []
+        self.last_parity_time: Optional[float] = None
+        self.last_block_span = 0
+        self.stats = {"parity_received": 0, "recovered": 0, "unrecoverable": 0}
+
+    def reset(self):
+        self._received.clear()
+        self._order.clear()
+        self._pending.clear()
+        self.last_parity_time = None
+        self.last_block_span = 0
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def _remember(self, seq_num, payload_type, payload):
+        if seq_num in self._received:
+            return
+        # 接收路径交来的是接收缓冲上的 memoryview，保存前需复制
+        self._received[seq_num] = (payload_type, bytes(payload))
+        self._order.append(seq_num)
+        if len(self._order) > self._history_size:
+            self._received.pop(self._order.popleft(), None)
+
+    def _try_recover(self, record: _PendingParity):
+        missing = [seq for seq in record.members if seq not in self._received]
+        if len(missing) != 1:
+            return None if missing else False
+        acc, length, payload_type = record.acc, record.length_xor, record.pt_xor
+        for seq in record.members:
+            if seq != missing[0]:
+                pt, payload = self._received[seq]
+                acc = _xor_accumulate(acc, payload)
+                length ^= len(payload)
+                payload_type ^= pt
+        payload = acc.to_bytes(length, "little") if length else b""
+        self._remember(missing[0], payload_type, payload)
+        self.stats["recovered"] += 1
+        return missing[0], payload_type, payload
+
+    def add_data(self, seq_num: int, payload_type: int, payload: bytes) -> List[Tuple[int, int, bytes]]:
+        self._remember(seq_num, payload_type, payload)
+        recovered = []
+        if self._pending:
+            still_pending = []
+            for record in self._pending:
+                if seq_num not in record.members:
+                    still_pending.append(record)
+                    continue
+                result = self._try_recover(record)
+                if result:
+                    recovered.append(result)
+                elif result is None:
+                    still_pending.append(record)
+            self._pending = still_pending
+        return recovered
+
+    def add_parity(self, group_base: int, fec_payload: bytes) -> List[Tuple[int, int, bytes]]:
+        if len(fec_payload) < FEC_HEADER.size:
+            return []
+        group_size, stride, mask, length_xor, pt_xor = FEC_HEADER.unpack_from(fec_payload)
+        self.stats["parity_received"] += 1
+        self.last_parity_time = time.monotonic()
+        self.last_block_span = group_size * max(1, stride)
+        members = [(group_base + i * stride) % MAX_SEQ_NUM for i in range(group_size) if mask & (1 << i)]
+        record = _PendingParity(members, length_xor, pt_xor, int.from_bytes(fec_payload[FEC_HEADER.size:], "little"))
+        result = self._try_recover(record)
+        if result:
+            return [result]
+        if result is None:
+            self._pending.append(record)
+            if len(self._pending) > FEC_MAX_PENDING_PARITY:
+                self._pending.pop(0)
+                self.stats["unrecoverable"] += 1
+        return []
+
+class RedEncoder:
+    """
+    RED 式冗余：每个数据报携带当前帧及第 N-distance 帧的副本，
+    在不增加包数的前提下提供时间分集，抵御短突发丢包。
+    """
+    def __init__(self, distance: int = RED_DISTANCE_FRAMES):
+        self.distance = distance
+        self._history: Dict[int, Tuple[int, bytes]] = {}
+        self._order = deque()
+
+    def reset(self):
+        self._history.clear()
+        self._order.clear()
+
+    def next_redundancy(self, seq_num: int, payload_type: int, payload: bytes) -> Tuple[int, int, bytes]:
+        """记录当前帧并返回应随其携带的冗余帧 (distance, payload_type, payload)；尚无历史时 distance 为 0。"""
+        redundant = self._history.get((seq_num - self.distance) % MAX_SEQ_NUM)
+        self._history[seq_num] = (payload_type, payload)
+        self._order.append(seq_num)
+        while len(self._order) > self.distance:
+            self._history.pop(self._order.popleft(), None)
+        if redundant:
+            return self.distance, redundant[0], redundant[1]
+        return 0, 0, b""
+
+class LossMonitor:
+    """
+    统计接收端丢包率用于回报。DTX 静音期（SID 之后）的序列号空缺不计为丢包。
+    """
+    def __init__(self):
+        self._highest_seq: Optional[int] = None
+        self._last_was_sid = False
+        self._expected = 0
+        self._lost = 0
+
+    def reset(self):
+        self._highest_seq = None
+        self._last_was_sid = False
+        self._expected = 0
+        self._lost = 0
+
+    def on_packet(self, seq_num: int, is_sid: bool):
+        if self._highest_seq is None:
+            self._highest_seq = seq_num
+            self._last_was_sid = is_sid
+            self._expected += 1
+            return
+        delta = sequence_delta(seq_num, self._highest_seq, MAX_SEQ_NUM)
+        if delta > 0:
+            if not self._last_was_sid:
+                self._lost += delta - 1
+                self._expected += delta
+            else:
+                self._expected += 1
+            self._highest_seq = seq_num
+            self._last_was_sid = is_sid
+        elif delta < 0 and self._lost > 0:
+            self._lost -= 1
+
+    def take_loss_fraction(self) -> Optional[float]:
+        expected, lost = self._expected, self._lost
+        self._expected = 0
+        self._lost = 0
+        if expected <= 0:
+            return None
+        return max(0.0, min(1.0, lost / expected))
+
+class FecController:
+    """根据对方回报的丢包率（指数平滑）在 FEC_LEVELS 中选择冗余档位；干净链路回落到零冗余。"""
+    def __init__(self, log_callback):
+        self.log = log_callback
+        self.smoothed_loss = 0.0
+        self.level_index = FEC_INITIAL_LEVEL
+        self._has_report = False
+
+    def reset(self):
+        self.smoothed_loss = 0.0
+        self.level_index = FEC_INITIAL_LEVEL
+        self._has_report = False
+
+    def current_setting(self, frames_per_packet: int = 1) -> Tuple[int, int]:
+        """
+        返回 (k, stride)。多帧聚合时一个数据报丢失即连续丢失 frames_per_packet 帧，
+        因此交织步长至少取该值，并相应减小 k 以保持校验块跨度（即接收端等待时长）不变。
+        """
+        _, group_size, stride = FEC_LEVELS[self.level_index]
+        if group_size and frames_per_packet > stride:
+            group_size = max(1, group_size * stride // frames_per_packet)
+            stride = frames_per_packet
+        return group_size, stride
+
+    def on_loss_report(self, loss_fraction: float) -> Tuple[int, int]:
+        if self._has_report:
+            self.smoothed_loss += (loss_fraction - self.smoothed_loss) * FEC_LOSS_SMOOTHING
+        else:
+            self.smoothed_loss = loss_fraction
+            self._has_report = True
+
+        new_index = 0
+        for index, (threshold, _, _) in enumerate(FEC_LEVELS):
+            if self.smoothed_loss >= threshold:
+                new_index = index
+        if new_index < self.level_index and self.smoothed_loss >= FEC_LEVELS[self.level_index][0] * FEC_DOWNGRADE_HYSTERESIS:
+            new_index = self.level_index
+
+        if new_index != self.level_index:
+            self.level_index = new_index
+            group_size, stride = self.current_setting()
+            self.log(f"FEC 档位调整: 平滑丢包率={self.smoothed_loss:.3f}, k={group_size}, stride={stride}")
+        return self.current_setting()
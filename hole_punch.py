@@ -0,0 +1,155 @@
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config import *
+from models import SignalType
+from async_transport import EventLoopThread, LoopTimer
+
+Address = Tuple[str, int]
+
+class _PunchSession:
+    __slots__ = ("address", "started", "deadline", "packets_sent", "timer")
+
+    def __init__(self, address: Address, now: float):
+        self.address = address
+        self.started = now
+        self.deadline = now + HOLE_PUNCH_DURATION_S
+        self.packets_sent = 0
+        self.timer: Optional[LoopTimer] = None
+
+class HolePuncher:
+    """
+    UDP 打洞：向对方公网映射地址按节奏发送突发打洞包 (每轮 HOLE_PUNCH_BURST_PACKETS 个，包间隔
+    HOLE_PUNCH_PACKET_INTERVAL_MS，轮间隔 HOLE_PUNCH_BURST_INTERVAL_MS)，使本端 NAT 为对方地址建立
+    过滤规则；双方同时打洞时先到的一侧包即被放行。收到对方的打洞包或应答即视为路径已通并停止。
+    on_punch 不检查来源，调用方须先确认来源是当前通话对方或正在打洞的地址。
+    所有状态只在事件循环线程上修改；公开方法可在任意线程调用。
+    """
+    def __init__(self, send: Callable[[bytes, Address], bool], event_loop: EventLoopThread, log_callback,
+                 on_confirmed: Optional[Callable[[Address], None]] = None):
+        self.send = send
+        self.event_loop = event_loop
+        self.log = log_callback
+        self.on_confirmed = on_confirmed
+        self._sessions: Dict[Address, _PunchSession] = {}
+        self._confirmed: Dict[Address, float] = {}
+
+    def punch(self, address: Address):
+        self.event_loop.call_soon(self._start, address)
+
+    def cancel(self, address: Address):
+        self.event_loop.call_soon(self._stop, address)
+
+    def stop(self):
+        self.event_loop.call_soon(self._stop_all)
+
+    def is_confirmed(self, address: Address) -> bool:
+        confirmed_at = self._confirmed.get(address)
+        return confirmed_at is not None and time.monotonic() - confirmed_at < NAT_KEEPALIVE_INTERVAL_S * 2
+
+    def is_punching(self, address: Address) -> bool:
+        return address in self._sessions
+
+    def on_punch(self, address: Address, is_ack: bool):
+        """收到打洞包 (回一个应答) 或打洞应答：对方的包能进来，说明两侧 NAT 均已放行。"""
+        if not is_ack:
+            self.send(SignalType.PUNCH_ACK_SIGNAL.value, address)
+        self.event_loop.call_soon(self._confirm, address)
+
+    def _start(self, address: Address):
+        if address in self._sessions:
+            return
+        if self.is_confirmed(address):
+            return
+        session = self._sessions[address] = _PunchSession(address, time.monotonic())
+        self.log(f"开始向 {address} 打洞 (最长 {HOLE_PUNCH_DURATION_S} 秒)。")
+        self._step(session)
+
+    def _step(self, session: _PunchSession):
+        if self._sessions.get(session.address) is not session:
+            return
+        now = time.monotonic()
+        if now >= session.deadline:
+            del self._sessions[session.address]
+            self.log(f"向 {session.address} 打洞超时，共发送 {session.packets_sent} 个打洞包，未收到对方响应。", is_warning=True)
+            return
+        self.send(SignalType.PUNCH_SIGNAL.value, session.address)
+        session.packets_sent += 1
+        # 一轮之内紧密发送以覆盖双方启动时差，轮与轮之间拉开间隔以免持续占用上行
+        if session.packets_sent % HOLE_PUNCH_BURST_PACKETS:
+            delay_ms = HOLE_PUNCH_PACKET_INTERVAL_MS
+        else:
+            delay_ms = HOLE_PUNCH_BURST_INTERVAL_MS
+        session.timer = self.event_loop.call_later(delay_ms / 1000, self._step, session)
+
+    def _confirm(self, address: Address):
+        first = not self.is_confirmed(address)
+        now = time.monotonic()
+        # 过期的确认记录不再影响 is_confirmed，顺带清掉
+        for confirmed_address in [a for a, confirmed_at in self._confirmed.items() if now - confirmed_at >= NAT_KEEPALIVE_INTERVAL_S * 2]:
+            del self._confirmed[confirmed_address]
+        self._confirmed[address] = now
+        session = self._sessions.pop(address, None)
+        if session:
+            if session.timer:
+                session.timer.cancel()
+            self.log(f"与 {address} 的打洞成功 (耗时 {(time.monotonic() - session.started) * 1000:.0f} ms, 发送 {session.packets_sent} 个打洞包)。")
+        if first and self.on_confirmed:
+            self.on_confirmed(address)
+
+    def _stop(self, address: Address):
+        session = self._sessions.pop(address, None)
+        if session and session.timer:
+            session.timer.cancel()
+
+    def _stop_all(self):
+        for address in list(self._sessions):
+            self._stop(address)
+        self._confirmed.clear()
+
+class KeepaliveScheduler:
+    """
+    每隔 NAT_KEEPALIVE_INTERVAL_S 向登记的目标发送保活数据报，刷新 NAT 映射与过滤规则，
+    使特征码中的公网地址在空闲时保持有效、通话中静音时对方仍能到达本端。
+    目标按用途登记 (如 "stun"、"peer")，同一用途只保留最新地址。
+    """
+    def __init__(self, send: Callable[[bytes, Address], bool], event_loop: EventLoopThread, log_callback,
+                 interval_s: float = NAT_KEEPALIVE_INTERVAL_S):
+        self.send = send
+        self.event_loop = event_loop
+        self.log = log_callback
+        self.interval_s = interval_s
+        self._targets: Dict[str, Tuple[Address, bytes]] = {}
+        self._timer: Optional[LoopTimer] = None
+        self.keepalives_sent = 0
+
+    def set_target(self, role: str, address: Optional[Address], payload: bytes = NAT_KEEPALIVE_PAYLOAD):
+        self.event_loop.call_soon(self._set_target, role, address, payload)
+
+    def start(self):
+        self.event_loop.call_soon(self._start)
+
+    def stop(self):
+        self.event_loop.call_soon(self._stop)
+
+    def _set_target(self, role: str, address: Optional[Address], payload: bytes):
+        if address is None:
+            self._targets.pop(role, None)
+        else:
+            self._targets[role] = (address, payload)
+
+    def _start(self):
+        if self._timer is None:
+            self._timer = self.event_loop.call_later(self.interval_s, self._tick)
+
+    def _stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._targets.clear()
+
+    def _tick(self):
+        for address, payload in self._targets.values():
+            self.send(payload, address)
+            self.keepalives_sent += 1
+        self._timer = self.event_loop.call_later(self.interval_s, self._tick)
@@ -0,0 +1,243 @@
+import threading
+import time
+import math
+import traceback
+from array import array
+from typing import Callable, Dict, Optional, Tuple
+
+from config import *
+from utils import sequence_delta
+
+def crossfade_merge(frame_a, frame_b):
+    """把两帧合并为一帧（A 淡出、B 淡入），用于加速播放时丢弃一帧的时长。"""
+    samples_a = array('h', frame_a)
+    samples_b = array('h', frame_b)
+    n = min(len(samples_a), len(samples_b))
+    if n == 0:
+        return bytes(frame_b)
+    merged = array('h', [(samples_a[i] * (n - i) + samples_b[i] * i) // n for i in range(n)])
+    return merged.tobytes()
+
+class AdaptiveJitterBuffer:
+    """
+    按序列号排序的自适应抖动缓冲。
+    目标深度跟随到达间隔抖动 (RFC 3550 风格的估计, 快升慢降)；深度超出目标时提示播放端加速。
+    """
+    def __init__(self, frame_duration_s: float):
+        self.frame_duration_s = frame_duration_s
+        self._cond = threading.Condition()
+        self._frames: Dict[int, bytes] = {}
+        self._next_seq: Optional[int] = None
+        self._highest_seq: Optional[int] = None
+        self._prebuffering = True
+        self._last_arrival_time: Optional[float] = None
+        self._last_arrival_seq: Optional[int] = None
+        self.jitter_s = 0.0
+        self.target_depth = JITTER_BUFFER_INITIAL_FRAMES
+        self.minimum_depth = JITTER_BUFFER_MIN_FRAMES
+        self.stats = {"late": 0, "lost": 0, "underrun": 0, "accelerated": 0, "resync": 0}
+
+    def reset(self):
+        with self._cond:
+            self._frames.clear()
+            self._next_seq = None
+            self._highest_seq = None
+            self._prebuffering = True
+            self._last_arrival_time = None
+            self._last_arrival_seq = None
+            self.jitter_s = 0.0
+            self.target_depth = JITTER_BUFFER_INITIAL_FRAMES
+            self.minimum_depth = JITTER_BUFFER_MIN_FRAMES
+            for key in self.stats:
+                self.stats[key] = 0
+            self._cond.notify_all()
+
+    def _update_jitter(self, seq_num, arrival_time):
+        if self._last_arrival_time is not None:
+            expected = sequence_delta(seq_num, self._last_arrival_seq, MAX_SEQ_NUM) * self.frame_duration_s
+            deviation = abs((arrival_time - self._last_arrival_time) - expected)
+            gain = 0.25 if deviation > self.jitter_s else 1.0 / 64
+            self.jitter_s += (deviation - self.jitter_s) * gain
+        self._last_arrival_time = arrival_time
+        self._last_arrival_seq = seq_num
+
+        wanted = math.ceil(JITTER_BUFFER_JITTER_MULTIPLIER * self.jitter_s / self.frame_duration_s) + 1
+        self.target_depth = max(self.minimum_depth, min(JITTER_BUFFER_MAX_FRAMES, wanted))
+
+    def set_minimum_depth(self, frames: int):
+        """FEC 恢复需要等到校验包到达，因此缓冲深度至少要覆盖一个校验块。"""
+        with self._cond:
+            self.minimum_depth = max(JITTER_BUFFER_MIN_FRAMES, min(JITTER_BUFFER_MAX_FRAMES, frames))
+            self.target_depth = max(self.target_depth, self.minimum_depth)
+
+    def _depth_locked(self):
+        if self._next_seq is None or self._highest_seq is None:
+            return 0
+        return sequence_delta(self._highest_seq, self._next_seq, MAX_SEQ_NUM) + 1
+
+    def depth(self):
+        with self._cond:
+            return self._depth_locked()
+
+    def put(self, seq_num: int, payload: bytes, arrival_time: Optional[float] = None) -> bool:
+        if arrival_time is None:
+            arrival_time = time.monotonic()
+        with self._cond:
+            self._update_jitter(seq_num, arrival_time)
+
+            if self._next_seq is None or (self._prebuffering and not self._frames):
+                self._next_seq = seq_num
+                self._highest_seq = seq_num
+            else:
+                offset = sequence_delta(seq_num, self._next_seq, MAX_SEQ_NUM)
+                if offset < 0:
+                    self.stats["late"] += 1
+                    return False
+                if offset >= JITTER_BUFFER_RESYNC_GAP_FRAMES:
+                    self.stats["resync"] += 1
+                    self._frames.clear()
+                    self._next_seq = seq_num
+                    self._highest_seq = seq_num
+                    self._prebuffering = True
+                elif sequence_delta(seq_num, self._highest_seq, MAX_SEQ_NUM) > 0:
+                    self._highest_seq = seq_num
+
+            self._frames[seq_num] = payload
+            self._cond.notify()
+            return True
+
+    def pop(self) -> Optional[Tuple[int, Optional[bytes], bool]]:
+        """
+        取出下一帧。返回 None 表示当前无可播放内容（预缓冲中或欠载）；
+        否则返回 (seq, payload, should_accelerate)，payload 为 None 表示该帧已丢失。
+        """
+        with self._cond:
+            if self._next_seq is None:
+                return None
+            depth = self._depth_locked()
+            if self._prebuffering:
+                if depth < self.target_depth:
+                    return None
+                self._prebuffering = False
+
+            if not self._frames:
+                self.stats["underrun"] += 1
+                self._prebuffering = True
+                return None
+
+            seq_num = self._next_seq
+            payload = self._frames.pop(seq_num, None)
+            if payload is None:
+                self.stats["lost"] += 1
+            self._next_seq = (seq_num + 1) % MAX_SEQ_NUM
+
+            should_accelerate = (depth - 1) > self.target_depth + JITTER_BUFFER_ACCELERATE_MARGIN_FRAMES
+            return seq_num, payload, should_accelerate
+
+    def pop_following_frame(self) -> Optional[bytes]:
+        """加速时额外取出紧随其后的一帧（若已到达）。"""
+        with self._cond:
+            if self._next_seq is None or self._next_seq not in self._frames:
+                return None
+            payload = self._frames.pop(self._next_seq)
+            self._next_seq = (self._next_seq + 1) % MAX_SEQ_NUM
+            self.stats["accelerated"] += 1
+            return payload
+
+class AudioPlayout:
+    """
+    独立播放线程：以帧长为节拍 (按对方时钟漂移微调) 从抖动缓冲取帧并写入扬声器，
+    使 socket 接收与设备写入解耦。
+    """
+    def __init__(self, jitter_buffer: AdaptiveJitterBuffer, write_callback: Callable[[bytes], bool], log_callback, concealer=None, comfort_noise=None, drift_estimator=None, name="PlayoutAudioThread"):
+        self.jitter_buffer = jitter_buffer
+        self.drift_estimator = drift_estimator
+        self.concealer = concealer
+        self.comfort_noise = comfort_noise
+        self._comfort_noise_seq: Optional[int] = None
+        self._last_played_seq: Optional[int] = None
+        self.write_callback = write_callback
+        self.log_callback = log_callback
+        self._name = name
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive() and threading.current_thread() != self._thread:
+            self._thread.join(timeout=0.5)
+        self._thread = None
+
+    def start_comfort_noise(self, seq_num: int, level_rms: int):
+        """对方进入静音期 (DTX)：从 seq_num 起，缓冲为空时以舒适噪声代替丢包补偿。"""
+        if self.comfort_noise is None:
+            return
+        self.comfort_noise.set_level(level_rms)
+        self._comfort_noise_seq = seq_num
+
+    def reset_comfort_noise(self):
+        self._comfort_noise_seq = None
+        self._last_played_seq = None
+
+    def _comfort_noise_active(self):
+        if self._comfort_noise_seq is None:
+            return False
+        if self._last_played_seq is None:
+            return True
+        return sequence_delta((self._last_played_seq + 1) % MAX_SEQ_NUM, self._comfort_noise_seq, MAX_SEQ_NUM) >= 0
+
+    def _fill_missing_frame(self):
+        if self._comfort_noise_active():
+            return self.comfort_noise.generate()
+        return self.concealer.conceal() if self.concealer else None
+
+    def _next_frame(self):
+        item = self.jitter_buffer.pop()
+        if item is None:
+            return self._fill_missing_frame()
+        seq_num, payload, should_accelerate = item
+        if self.drift_estimator:
+            self.drift_estimator.observe_depth(self.jitter_buffer.depth(), self.jitter_buffer.target_depth)
+        if payload is None:
+            return self._fill_missing_frame()
+        self._last_played_seq = seq_num
+        if self._comfort_noise_seq is not None and sequence_delta(seq_num, self._comfort_noise_seq, MAX_SEQ_NUM) >= 0:
+            self._comfort_noise_seq = None
+        if should_accelerate:
+            following = self.jitter_buffer.pop_following_frame()
+            if following is not None:
+                payload = crossfade_merge(payload, following)
+                self._last_played_seq = (seq_num + 1) % MAX_SEQ_NUM
+        return self.concealer.process_good_frame(payload) if self.concealer else payload
+
+    def _run(self):
+        self.log_callback("播放线程已启动。")
+        period = self.jitter_buffer.frame_duration_s
+        next_deadline = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                payload = self._next_frame()
+                if payload is not None:
+                    self.write_callback(payload)
+            except Exception as e:
+                self.log_callback(f"播放线程发生错误: {e}", is_warning=True)
+                traceback.print_exc()
+
+            # 按对方时钟节拍取帧：漂移补偿时播放周期与每帧输出长度同比例伸缩
+            next_deadline += period * self.drift_estimator.ratio if self.drift_estimator else period
+            now = time.monotonic()
+            if now - next_deadline > period * PLAYOUT_MAX_LAG_FRAMES:
+                next_deadline = now
+            elif next_deadline > now:
+                self._stop_event.wait(next_deadline - now)
+        self.log_callback("播放线程已停止。")
@@ -0,0 +1,62 @@
+import struct
+
+AUDIO_HEADER = struct.Struct("!IB")
+LEGACY_AUDIO_HEADER = struct.Struct("!I")
+# 冗余帧距离, 冗余帧 payload_type, 冗余帧长度, 主帧 payload_type
+RED_HEADER = struct.Struct("!BBHB")
+# 聚合包: 发送端每包帧数; 其后为若干 (长度, 完整媒体包)
+BUNDLE_HEADER = struct.Struct("!B")
+BUNDLE_ENTRY_HEADER = struct.Struct("!H")
+
+BUNDLE_PAYLOAD_TYPE = 12
+COMFORT_NOISE_PAYLOAD_TYPE = 13
+FEC_PAYLOAD_TYPE = 14
+RED_PAYLOAD_TYPE = 15
+RESERVED_PAYLOAD_TYPES = {BUNDLE_PAYLOAD_TYPE, COMFORT_NOISE_PAYLOAD_TYPE, FEC_PAYLOAD_TYPE, RED_PAYLOAD_TYPE}
+
+def build_audio_packet(seq_num: int, payload_type: int, payload: bytes) -> bytes:
+    return AUDIO_HEADER.pack(seq_num, payload_type) + payload
+
+def parse_audio_packet(data: bytes):
+    if len(data) <= AUDIO_HEADER.size:
+        return None
+    seq_num, payload_type = AUDIO_HEADER.unpack_from(data)
+    return seq_num, payload_type, data[AUDIO_HEADER.size:]
+
+def build_legacy_audio_packet(seq_num: int, pcm: bytes) -> bytes:
+    return LEGACY_AUDIO_HEADER.pack(seq_num) + pcm
+
+def parse_legacy_audio_packet(data: bytes):
+    if len(data) <= LEGACY_AUDIO_HEADER.size:
+        return None
+    seq_num, = LEGACY_AUDIO_HEADER.unpack_from(data)
+    return seq_num, data[LEGACY_AUDIO_HEADER.size:]
+
+def parse_red_payload(seq_num: int, red_payload: bytes, modulus: int = 2**32):
+    """返回 (distance, [(seq, payload_type, payload), ...])，主帧在前。"""
+    if len(red_payload) < RED_HEADER.size:
+        return 0, []
+    distance, redundant_type, redundant_len, primary_type = RED_HEADER.unpack_from(red_payload)
+    offset = RED_HEADER.size
+    if offset + redundant_len > len(red_payload):
+        return 0, []
+    frames = [(seq_num, primary_type, red_payload[offset + redundant_len:])]
+    if distance and redundant_len:
+        frames.append(((seq_num - distance) % modulus, redundant_type, red_payload[offset:offset + redundant_len]))
+    return distance, frames
+
+def parse_bundle_payload(bundle_payload: bytes):
+    """返回 (frames_per_packet, [packet, ...])；长度字段越界时丢弃其后的内容。"""
+    if len(bundle_payload) < BUNDLE_HEADER.size:
+        return 0, []
+    frames_per_packet, = BUNDLE_HEADER.unpack_from(bundle_payload)
+    packets = []
+    offset = BUNDLE_HEADER.size
+    while offset + BUNDLE_ENTRY_HEADER.size <= len(bundle_payload):
+        length, = BUNDLE_ENTRY_HEADER.unpack_from(bundle_payload, offset)
+        offset += BUNDLE_ENTRY_HEADER.size
+        if offset + length > len(bundle_payload):
+            break
+        packets.append(bundle_payload[offset:offset + length])
+        offset += length
+    return frames_per_packet, packets
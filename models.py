@@ -1,4 +1,4 @@
-from enum import Enum, auto
+from enum import Enum, IntEnum, auto
 
 class AppState(Enum):
     STARTING = auto()
@@ -24,4 +24,56 @@ class SignalType(Enum):
     CALL_ACCEPTED_SIGNAL = b"__CALL_ACCEPTED__"
     ACK_CALL_REQUEST_SIGNAL = b"__ACK_CALL_REQUEST__"
     ACK_HANGUP_SIGNAL = b"__ACK_HANGUP__"
-    SPEAKER_STATUS_SIGNAL_PREFIX = b"__SPEAKER_STATUS__:"
\ No newline at end of file
+    SPEAKER_STATUS_SIGNAL_PREFIX = b"__SPEAKER_STATUS__:"
+    RECEIVER_REPORT_SIGNAL_PREFIX = b"__RECEIVER_REPORT__:"
+    PUNCH_SIGNAL = b"__PUNCH__"
+    PUNCH_ACK_SIGNAL = b"__PUNCH_ACK__"
+    CHECK_SIGNAL_PREFIX = b"__CHECK__:"
+    CHECK_RESPONSE_SIGNAL_PREFIX = b"__CHECK_OK__:"
+    RELAY_CONTROL_PREFIX = b"__RELAY__"
+
+class PacketType(IntEnum):
+    CALL_REQUEST = 0x01
+    ACK_CALL_REQUEST = 0x02
+    CALL_ACCEPTED = 0x03
+    HANGUP = 0x04
+    ACK_HANGUP = 0x05
+    SPEAKER_STATUS = 0x06
+    RECEIVER_REPORT = 0x07
+    # 可靠信令的确认：帧头的消息 ID 即被确认消息的 ID
+    ACK = 0x08
+
+class RedundancyMode(Enum):
+    LEGACY = "legacy"
+    FEC = "fec"
+    RED = "red"
+
+
+class PacketSequenceStatus(Enum):
+    NEW = auto()
+    LATE = auto()
+    DUPLICATE = auto()
+    TOO_OLD = auto()
+
+class NatMappingBehavior(Enum):
+    NO_NAT = "no-nat"
+    ENDPOINT_INDEPENDENT = "endpoint-independent"
+    ADDRESS_DEPENDENT = "address-dependent"
+    ADDRESS_AND_PORT_DEPENDENT = "address-and-port-dependent"
+    UNKNOWN = "unknown"
+
+class NatFilteringBehavior(Enum):
+    ENDPOINT_INDEPENDENT = "endpoint-independent"
+    ADDRESS_DEPENDENT = "address-dependent"
+    ADDRESS_AND_PORT_DEPENDENT = "address-and-port-dependent"
+    UNKNOWN = "unknown"
+
+class CandidateType(Enum):
+    HOST = "host"
+    SERVER_REFLEXIVE = "srflx"
+    RELAY = "relay"
+
+class ConnectivityStrategy(Enum):
+    DIRECT = "direct"
+    HOLE_PUNCH = "hole-punch"
+    RELAY = "relay"
@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Tuple
+
+from models import ConnectivityStrategy, NatFilteringBehavior, NatMappingBehavior
+
+Address = Tuple[str, int]
+
+class NatBehavior:
+    """
+    RFC 5780 NAT 行为发现的结果。映射行为决定同一本地端口对不同目的地是否复用同一公网映射，
+    过滤行为决定谁能向该映射发送数据；两者共同决定最省事的连接方式。
+    """
+    def __init__(self, local_address: Optional[Address] = None):
+        self.local_address = local_address
+        self.server: Optional[str] = None
+        self.mapped_address: Optional[Address] = None
+        self.other_address: Optional[Address] = None
+        self.mapping = NatMappingBehavior.UNKNOWN
+        self.filtering = NatFilteringBehavior.UNKNOWN
+
+    def classify_mapping(self, test1: Optional[Address], test2: Optional[Address], test3: Optional[Address]):
+        """test1: 主地址; test2: 备用 IP + 主端口; test3: 备用 IP + 备用端口 (RFC 5780 4.3)。"""
+        if test1 is None:
+            return
+        if self.local_address and test1 == self.local_address:
+            self.mapping = NatMappingBehavior.NO_NAT
+        elif test2 is None:
+            self.mapping = NatMappingBehavior.UNKNOWN
+        elif test2 == test1:
+            self.mapping = NatMappingBehavior.ENDPOINT_INDEPENDENT
+        elif test3 is None:
+            self.mapping = NatMappingBehavior.UNKNOWN
+        elif test3 == test2:
+            self.mapping = NatMappingBehavior.ADDRESS_DEPENDENT
+        else:
+            self.mapping = NatMappingBehavior.ADDRESS_AND_PORT_DEPENDENT
+
+    def classify_mapping_across_servers(self, mapped_addresses: List[Address]):
+        """服务器不支持 RFC 5780 时的退路：比较不同服务器看到的映射；无法区分地址相关与地址端口相关，取保守值。"""
+        if len(mapped_addresses) < 2:
+            return
+        if self.local_address and mapped_addresses[0] == self.local_address:
+            self.mapping = NatMappingBehavior.NO_NAT
+        elif len(set(mapped_addresses)) == 1:
+            self.mapping = NatMappingBehavior.ENDPOINT_INDEPENDENT
+        else:
+            self.mapping = NatMappingBehavior.ADDRESS_AND_PORT_DEPENDENT
+
+    def classify_filtering(self, baseline_ok: bool, change_ip_and_port_ok: bool, change_port_ok: bool):
+        """RFC 5780 4.4；baseline_ok 为同一探测套接字上普通绑定请求是否成功，失败时无法判断。"""
+        if not baseline_ok:
+            self.filtering = NatFilteringBehavior.UNKNOWN
+        elif change_ip_and_port_ok:
+            self.filtering = NatFilteringBehavior.ENDPOINT_INDEPENDENT
+        elif change_port_ok:
+            self.filtering = NatFilteringBehavior.ADDRESS_DEPENDENT
+        else:
+            self.filtering = NatFilteringBehavior.ADDRESS_AND_PORT_DEPENDENT
+
+    @property
+    def strategy(self) -> ConnectivityStrategy:
+        if self.mapped_address is None:
+            # 连 STUN 都不通：UDP 出站受限，只能中继
+            return ConnectivityStrategy.RELAY
+        if self.filtering is NatFilteringBehavior.ENDPOINT_INDEPENDENT:
+            # 任何来源都能到达公网映射：对方可直接呼入
+            return ConnectivityStrategy.DIRECT
+        if self.mapping in (NatMappingBehavior.ADDRESS_DEPENDENT, NatMappingBehavior.ADDRESS_AND_PORT_DEPENDENT):
+            # 对方看到的映射与 STUN 服务器看到的不同，打洞的目标端口不可预知
+            return ConnectivityStrategy.RELAY
+        return ConnectivityStrategy.HOLE_PUNCH
+
+    def as_dict(self) -> Dict[str, Optional[str]]:
+        return {"mapping": self.mapping.value, "filtering": self.filtering.value, "strategy": self.strategy.value}
+
+    def describe(self) -> str:
+        return f"映射={self.mapping.value}, 过滤={self.filtering.value}, 连接策略={self.strategy.value}"
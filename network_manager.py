@@ -2,23 +2,132 @@ import socket
 import threading
 import random
 import os
+import queue
+import itertools
 import struct
+import time
 import traceback
 from config import *
-from typing import Callable, Optional, Tuple
+from media_packet import LEGACY_AUDIO_HEADER
+from async_transport import AsyncioDatagramTransport, EventLoopThread, shared_event_loop
+from discovery_cache import DiscoveryCache, current_network_identity, local_interface_ip
+from models import ConnectivityStrategy
+from nat_behavior import NatBehavior
+from hole_punch import HolePuncher, KeepaliveScheduler
+from candidates import Candidate, ConnectivityChecker, gather_candidates
+from relay import RELAY_OP_ALLOCATE, RELAY_TOKEN_SIZE, RelayClient, build_relay_control
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+STUN_MAGIC_COOKIE_BYTES = struct.pack("!L", 0x2112A442)
+
+class _StunTransaction:
+    __slots__ = ("server", "address", "transaction_id", "request", "rto", "transmissions", "last_sent", "next_send")
+
+    def __init__(self, server: str, address: Tuple[str, int], transaction_id: bytes, request: bytes):
+        self.server = server
+        self.address = address
+        self.transaction_id = transaction_id
+        self.request = request
+        self.rto = STUN_INITIAL_RTO_MS / 1000
+        self.transmissions = 0
+        self.last_sent = 0.0
+        self.next_send = 0.0
+
+class MediaSender:
+    """
+    通话期间绑定单一对端的媒体发送快速路径：缓存 sendto 绑定方法与目标地址，
+    不再逐包检查 fileno()/地址；旧版格式的包头用 pack_into 写入预分配缓冲。
+    发送失败只计数，首次失败记录日志，避免在发送线程里刷屏。
+    """
+    def __init__(self, udp_socket: socket.socket, address: Tuple[str, int], log_callback):
+        self.address = address
+        self.log_callback = log_callback
+        self._sendto = udp_socket.sendto
+        self._legacy_buffer = bytearray(MAX_PACKET_SIZE)
+        self._legacy_view = memoryview(self._legacy_buffer)
+        self._pack_legacy_header = LEGACY_AUDIO_HEADER.pack_into
+        self.packets_sent = 0
+        self.send_errors = 0
+
+    def send(self, data) -> bool:
+        try:
+            self._sendto(data, self.address)
+        except OSError as e:
+            self._on_send_error(e)
+            return False
+        self.packets_sent += 1
+        return True
+
+    def send_legacy_audio(self, seq_num: int, pcm, copies: int = 1) -> bool:
+        end = LEGACY_AUDIO_HEADER.size + len(pcm)
+        self._pack_legacy_header(self._legacy_buffer, 0, seq_num)
+        self._legacy_view[LEGACY_AUDIO_HEADER.size:end] = pcm
+        datagram = self._legacy_view[:end]
+        sendto, address = self._sendto, self.address
+        try:
+            for _ in range(copies):
+                sendto(datagram, address)
+        except OSError as e:
+            self._on_send_error(e)
+            return False
+        self.packets_sent += copies
+        return True
+
+    def _on_send_error(self, error: OSError):
+        self.send_errors += 1
+        if self.send_errors == 1:
+            self.log_callback(f"媒体发送至 {self.address} 失败: {error}", is_warning=True)
+
+class ReceiveBufferPool:
+    """
+    预分配的接收缓冲环：recvfrom_into 直接写入轮换的 bytearray，交出 memoryview 而非新的 bytes。
+    视图在其后再收到 size-1 个数据报之前有效；需要长期保存数据的使用者须自行复制。
+    """
+    def __init__(self, size: int = RECEIVE_BUFFER_POOL_SIZE, buffer_size: int = MAX_PACKET_SIZE):
+        self._views = [memoryview(bytearray(buffer_size)) for _ in range(max(1, size))]
+        self._next_view = itertools.cycle(self._views).__next__
+
+    def receive_from(self, udp_socket: socket.socket) -> Tuple[memoryview, Tuple[str, int]]:
+        view = self._next_view()
+        nbytes, addr = udp_socket.recvfrom_into(view)
+        return view[:nbytes], addr
 
 class NetworkManager:
-    def __init__(self, log_callback, data_received_callback: Optional[Callable[[bytes, Tuple[str, int]], None]] = None):
+    def __init__(self, log_callback, data_received_callback: Optional[Callable[[memoryview, Tuple[str, int]], None]] = None):
         self.log_callback = log_callback
-        self.data_received_callback: Optional[Callable[[bytes, Tuple[str, int]], None]] = data_received_callback
+        self.data_received_callback: Optional[Callable[[memoryview, Tuple[str, int]], None]] = data_received_callback
         self.udp_socket = None
         self.is_listening = False
         self.receive_thread = None
+        self.transport_mode = NETWORK_TRANSPORT
+        self.event_loop: Optional[EventLoopThread] = None
+        self._async_transport: Optional[AsyncioDatagramTransport] = None
 
         self.local_port = 0
         self.public_ip = None
         self.public_port = None
         self.is_cone_nat: Optional[bool] = None
+        self.stun_server: Optional[str] = None
+        self.stun_server_address: Optional[Tuple[str, int]] = None
+        self.stun_server_stats: Dict[str, dict] = {}
+        self.nat_behavior: Optional[NatBehavior] = None
+        self.connectivity_strategy: Optional[ConnectivityStrategy] = None
+        # 监听期间 STUN 响应由接收路径按事务 ID 转交到此队列
+        self._stun_waiting: set = set()
+        self._stun_responses: "queue.Queue[Tuple[bytes, Tuple[str, int]]]" = queue.Queue()
+        self.discovery_cache: Optional[DiscoveryCache] = DiscoveryCache(log_callback) if DISCOVERY_CACHE_ENABLED else None
+        self.discovery_key: Optional[str] = None
+        self.discovery_from_cache = False
+        self.hole_puncher: Optional[HolePuncher] = None
+        # 打洞成功时回调 (在事件循环线程上)，由状态机决定是否登记为保活目标
+        self.punch_confirmed_callback: Optional[Callable[[Tuple[str, int]], None]] = None
+        self.keepalive: Optional[KeepaliveScheduler] = None
+        self.connectivity_checker: Optional[ConnectivityChecker] = None
+        self.relay_client: Optional[RelayClient] = None
+        # 本端在中继上的等待分配；有中继时作为 relay 候选 (含令牌) 写入特征码
+        self.relay_address: Optional[Tuple[str, int]] = None
+        self.relay_token = os.urandom(RELAY_TOKEN_SIZE)
 
     def _find_available_random_port(self, host="0.0.0.0", start_range=49152, end_range=65535, max_tries=RANDOM_PORT_MAX_TRIES):
         for _ in range(max_tries):
@@ -36,7 +145,7 @@ class NetworkManager:
     def _stun_generate_transaction_id(self):
         return os.urandom(12)
 
-    def _stun_create_request(self, transaction_id, include_change_request=False):
+    def _stun_create_request(self, transaction_id, include_change_request=False, change_ip=True, change_port=True):
         msg_type = 0x0001
         msg_length = 0
         
@@ -45,55 +154,63 @@ class NetworkManager:
         if include_change_request:
             change_request_type = 0x0003
             change_request_length = 4
-            change_request_value = 0x00000006
+            change_request_value = (0x04 if change_ip else 0) | (0x02 if change_port else 0)
             attributes_payload += struct.pack("!HH L", change_request_type, change_request_length, change_request_value)
             msg_length += (4 + change_request_length)
 
         header = struct.pack("!HHL12s", msg_type, msg_length, 0x2112A442, transaction_id)
         return header + attributes_payload
     
-    def check_nat_openness_for_unsolicited_responses(self, stun_host=DEFAULT_STUN_HOST, stun_port=DEFAULT_STUN_PORT):
-        self.log_callback(f"STUN_TEST_OPENNESS: Testing NAT openness with CHANGE-REQUEST to {stun_host}:{stun_port}...")
-        if self.udp_socket is None or self.udp_socket.fileno() == -1:
-            self.log_callback(f"STUN_TEST_OPENNESS: Main socket not initialized or closed. Test failed.", is_warning=True)
-            return False
-
-        original_timeout = None
+    def _stun_receive(self, timeout: float, udp_socket: Optional[socket.socket] = None):
+        """
+        等待一个 STUN 数据报；超时返回 None。指定 udp_socket (探测专用套接字) 或主套接字未监听时直接读取，
+        主套接字监听中则取接收路径转交的响应。
+        """
+        if udp_socket is None:
+            if self.is_listening:
+                try:
+                    return self._stun_responses.get(timeout=timeout)
+                except queue.Empty:
+                    return None
+            udp_socket = self.udp_socket
+        udp_socket.settimeout(timeout)
         try:
-            original_timeout = self.udp_socket.gettimeout()
-            self.udp_socket.settimeout(2.0)
-
-            transaction_id = self._stun_generate_transaction_id()
-            request_message = self._stun_create_request(transaction_id, include_change_request=True)
-
-            self.udp_socket.sendto(request_message, (stun_host, stun_port))
-            data, addr = self.udp_socket.recvfrom(1024)
-
-            self.log_callback(f"STUN_TEST_OPENNESS: Received a response from {addr}. NAT appears to be a Cone type. Test PASSED.")
-            return True
-
+            return udp_socket.recvfrom(1024)
         except socket.timeout:
-            self.log_callback("STUN_TEST_OPENNESS: Request timed out. NAT is likely Symmetric. Test FAILED.", is_warning=True)
-            return False
-        except socket.gaierror as e:
-            self.log_callback(f"STUN_TEST_OPENNESS: Failed to resolve STUN server {stun_host} ({e}). Test FAILED.", is_error=True)
-            return False
-        except OSError as e:
-             self.log_callback(f"STUN_TEST_OPENNESS: Socket error (OSError): {e}. Test FAILED.", is_error=True)
-             return False
-        except Exception as e:
-            self.log_callback(f"STUN_TEST_OPENNESS: Unknown exception: {e}. Test FAILED.", is_error=True)
-            return False
-        finally:
-            if original_timeout is not None and self.udp_socket and self.udp_socket.fileno() != -1:
-                try: self.udp_socket.settimeout(original_timeout)
-                except: pass
+            return None
+        except ConnectionResetError:
+            # Windows 上先前请求触发的 ICMP 端口不可达会以 WSAECONNRESET 报告给后续 recvfrom
+            return None
 
     def _stun_parse_response(self, data, sent_transaction_id):
+        attributes = self._stun_parse_attributes(data, sent_transaction_id)
+        if attributes is None:
+            return None, None
+        if attributes.get("mapped"):
+            return attributes["mapped"]
+        self.log_callback("STUN: 未从属性中解析出公网地址。")
+        return None, None
+
+    @staticmethod
+    def _stun_parse_address(attr_value, xor=False):
+        STUN_MAGIC_COOKIE = 0x2112A442
+        if len(attr_value) < 8 or attr_value[0] != 0x00 or attr_value[1] != 0x01:
+            return None
+        port, ip_int = struct.unpack("!HL", attr_value[2:8])
+        if xor:
+            port ^= STUN_MAGIC_COOKIE >> 16
+            ip_int ^= STUN_MAGIC_COOKIE
+        return socket.inet_ntoa(struct.pack("!L", ip_int)), port
+
+    def _stun_parse_attributes(self, data, sent_transaction_id):
+        """
+        解析成功响应中的地址属性，返回 {"mapped", "other_address", "response_origin"} (缺失为 None)；
+        非成功响应返回 None。OTHER-ADDRESS/RESPONSE-ORIGIN (RFC 5780) 缺失时退用 RFC 3489 的 CHANGED-ADDRESS/SOURCE-ADDRESS。
+        """
         STUN_MAGIC_COOKIE = 0x2112A442
         if len(data) < 20:
             self.log_callback("STUN: 响应过短.")
-            return None, None
+            return None
 
         msg_type, msg_length, magic_cookie, transaction_id_resp = struct.unpack("!HHL12s", data[:20])
 
@@ -107,13 +224,15 @@ class NetworkManager:
             pass
         elif msg_type == 0x0111: # Error response
             self.log_callback("STUN: 服务器返回错误响应.")
-            return None, None
+            return None
         else:
             self.log_callback(f"STUN: 响应类型异常: 0x{msg_type:04X}")
-            return None, None
+            return None
 
         offset = 20
-        parsed_public_ip, parsed_public_port = None, None
+        mapped, xor_mapped = None, None
+        other_address, changed_address = None, None
+        response_origin, source_address = None, None
 
         while offset < len(data):
             if offset + 4 > len(data): break
@@ -130,135 +249,436 @@ class NetworkManager:
             offset += padding
 
             if attr_type == 0x0001: # MAPPED-ADDRESS
-                if len(attr_value) >= 8 and attr_value[0] == 0x00 and attr_value[1] == 0x01:
-                    port_val = struct.unpack("!H", attr_value[2:4])[0]
-                    ip_val = socket.inet_ntoa(attr_value[4:8])
-                    parsed_public_ip, parsed_public_port = ip_val, port_val
+                mapped = self._stun_parse_address(attr_value) or mapped
             elif attr_type == 0x0020: # XOR-MAPPED-ADDRESS
-                if len(attr_value) >= 8 and attr_value[0] == 0x00 and attr_value[1] == 0x01:
-                    xport_pack, xip_pack = attr_value[2:4], attr_value[4:8]
-                    
-                    pport = struct.unpack("!H", xport_pack)[0] ^ (STUN_MAGIC_COOKIE >> 16)
-                    
-                    pip_pack_int = struct.unpack("!L", xip_pack)[0] ^ STUN_MAGIC_COOKIE
-                    pip_pack_bytes = struct.pack("!L", pip_pack_int)
-                    pip = socket.inet_ntoa(pip_pack_bytes)
-                    
-                    parsed_public_ip, parsed_public_port = pip, pport
-
-        if parsed_public_ip and parsed_public_port:
-            return parsed_public_ip, parsed_public_port
-        else:
-            self.log_callback("STUN: 未从属性中解析出公网地址。")
+                xor_mapped = self._stun_parse_address(attr_value, xor=True) or xor_mapped
+            elif attr_type == 0x802C: # OTHER-ADDRESS
+                other_address = self._stun_parse_address(attr_value) or other_address
+            elif attr_type == 0x0005: # CHANGED-ADDRESS (RFC 3489)
+                changed_address = self._stun_parse_address(attr_value) or changed_address
+            elif attr_type == 0x802B: # RESPONSE-ORIGIN
+                response_origin = self._stun_parse_address(attr_value) or response_origin
+            elif attr_type == 0x0004: # SOURCE-ADDRESS (RFC 3489)
+                source_address = self._stun_parse_address(attr_value) or source_address
+
+        return {
+            "mapped": xor_mapped or mapped,
+            "other_address": other_address or changed_address,
+            "response_origin": response_origin or source_address,
+        }
+
+    def get_public_address_with_stun(self, stun_servers=None):
+        """
+        向 STUN_SERVERS 并行发送绑定请求 (主套接字, 按事务 ID 区分响应)，最先返回有效映射地址者胜出。
+        各服务器按 RFC 5389 的指数退避重传，直至 STUN_DISCOVERY_TIMEOUT_S。
+        """
+        servers = list(stun_servers or STUN_SERVERS)
+        if not servers:
+            self.log_callback("STUN: 未配置 STUN 服务器 (STUN_SERVERS 为空)。无法执行STUN。", is_warning=True)
             return None, None
-
-    def get_public_address_with_stun(self, stun_host=DEFAULT_STUN_HOST, stun_port=DEFAULT_STUN_PORT):
-        self.log_callback(f"尝试通过 STUN 服务器 {stun_host}:{stun_port} 获取公网地址...")
+        self.log_callback(f"并行查询 {len(servers)} 个 STUN 服务器获取公网地址...")
         if self.udp_socket is None or self.udp_socket.fileno() == -1:
             self.log_callback(f"STUN: 主套接字未初始化或已关闭。无法执行STUN。")
             return None, None
 
+        known_ips = self.discovery_cache.resolved_stun_ips() if self.discovery_cache else {}
+        resolved_ips: Dict[str, str] = {}
+        resolver = ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="StunResolve")
+        resolving = {}
+        for host, port in servers:
+            future = Future()
+            if f"{host}:{port}" in known_ips:
+                future.set_result(known_ips[f"{host}:{port}"])
+            else:
+                future = resolver.submit(socket.gethostbyname, host)
+            resolving[future] = (host, port)
+        transactions: Dict[bytes, _StunTransaction] = {}
+        self.stun_server_stats = {}
         original_timeout = None
         try:
             original_timeout = self.udp_socket.gettimeout()
-            self.udp_socket.settimeout(2.0)
-
-            transaction_id = self._stun_generate_transaction_id()
-            request_message = self._stun_create_request(transaction_id, include_change_request=False) 
-
-            self.udp_socket.sendto(request_message, (stun_host, stun_port))
-            data, addr = self.udp_socket.recvfrom(1024)
-            
-            public_ip, public_port = self._stun_parse_response(data, transaction_id)
-
-            if public_ip and public_port:
-                self.log_callback(f"STUN 结果: 公网 IP={public_ip}, 公网 Port={public_port}")
-                return public_ip, public_port
-            else:
-                self.log_callback("STUN: 未能解析出公网地址")
-                return None, None
-
-        except socket.timeout:
-            self.log_callback("STUN 查询超时，无响应。")
-        except socket.gaierror as e:
-            self.log_callback(f"STUN 查询失败: 无法解析STUN服务器地址 {stun_host} ({e})")
+            deadline = time.monotonic() + STUN_DISCOVERY_TIMEOUT_S
+            while True:
+                now = time.monotonic()
+                if now >= deadline or not (resolving or transactions):
+                    break
+                for future in [f for f in resolving if f.done()]:
+                    host, port = resolving.pop(future)
+                    server = f"{host}:{port}"
+                    transaction_id = self._stun_generate_transaction_id()
+                    try:
+                        transaction = _StunTransaction(server, (future.result(), port), transaction_id, self._stun_create_request(transaction_id))
+                    except OSError as e:
+                        self.log_callback(f"STUN: 无法解析服务器地址 {host} ({e})")
+                        self.stun_server_stats[server] = {"rtt_ms": None, "transmissions": 0, "error": str(e)}
+                        continue
+                    if server not in known_ips:
+                        resolved_ips[server] = transaction.address[0]
+                    transactions[transaction_id] = transaction
+                    self._stun_waiting.add(transaction_id)
+                    self._stun_transmit(transaction, now)
+
+                next_event = deadline
+                for transaction in list(transactions.values()):
+                    if now >= transaction.next_send:
+                        self._stun_transmit(transaction, now)
+                    next_event = min(next_event, transaction.next_send)
+                if resolving:
+                    next_event = min(next_event, now + STUN_RESOLVE_POLL_S)
+
+                received = self._stun_receive(max(0.001, next_event - now))
+                if received is None:
+                    continue
+                data, addr = received
+                transaction = transactions.get(data[8:20]) if len(data) >= 20 else None
+                if transaction is None:
+                    continue
+                rtt_ms = (time.monotonic() - transaction.last_sent) * 1000
+                public_ip, public_port = self._stun_parse_response(data, transaction.transaction_id)
+                del transactions[transaction.transaction_id]
+                self._stun_waiting.discard(transaction.transaction_id)
+                self.stun_server_stats[transaction.server] = {"rtt_ms": rtt_ms, "transmissions": transaction.transmissions, "error": None if public_ip else "无效响应"}
+                if public_ip and public_port:
+                    self.stun_server = transaction.server
+                    self.stun_server_address = transaction.address
+                    self.refresh_stun_keepalive()
+                    self.log_callback(f"STUN 结果: 公网 IP={public_ip}, 公网 Port={public_port} (来自 {transaction.server}, RTT {rtt_ms:.0f} ms, 发送 {transaction.transmissions} 次)")
+                    return public_ip, public_port
+
+            self.log_callback("STUN 查询超时，所有服务器均无有效响应。")
         except OSError as e:
              self.log_callback(f"STUN 查询socket错误 (OSError): {e}")
         except Exception as e:
             self.log_callback(f"STUN 查询发生未知异常: {e}")
         finally:
+            resolver.shutdown(wait=False)
+            self._stun_waiting.difference_update(transactions)
+            if self.discovery_cache:
+                self.discovery_cache.put_resolved_stun_ips(resolved_ips)
+            for transaction in transactions.values():
+                self.stun_server_stats.setdefault(transaction.server, {"rtt_ms": None, "transmissions": transaction.transmissions, "error": "未应答"})
             if original_timeout is not None and self.udp_socket and self.udp_socket.fileno() != -1:
                 try: self.udp_socket.settimeout(original_timeout)
                 except: pass
         return None, None
 
-    def start_listening_and_stun(self):
-        self.local_port = self._find_available_random_port()
-        if self.local_port is None:
-            self.log_callback("自动启动失败: 无法找到可用的随机本地端口。", is_error=True)
-            return False, "启动失败: 无可用端口"
+    def _stun_transmit(self, transaction: "_StunTransaction", now: float, udp_socket: Optional[socket.socket] = None):
+        if transaction.transmissions > STUN_MAX_RETRANSMITS:
+            # 重传次数用尽：不再发送，仍等待迟到的响应直到总时限
+            transaction.next_send = float("inf")
+            return
+        try:
+            (udp_socket or self.udp_socket).sendto(transaction.request, transaction.address)
+        except OSError as e:
+            self.log_callback(f"STUN: 发送至 {transaction.server} 失败: {e}")
+        transaction.transmissions += 1
+        transaction.last_sent = now
+        transaction.next_send = now + transaction.rto
+        transaction.rto *= 2
+
+    def discover_nat_behavior(self, stun_servers=None) -> NatBehavior:
+        """
+        RFC 5780 NAT 行为发现。第一阶段并发：主套接字向各服务器发普通绑定请求 (映射测试 I)，
+        同时一个全新的探测套接字向各服务器发普通请求与两种 CHANGE-REQUEST (过滤测试)——过滤测试
+        必须在从未联系过服务器备用地址的套接字上进行，否则映射测试打开的过滤规则会使结果偏宽。
+        第二阶段对首个返回 OTHER-ADDRESS 的服务器并发执行映射测试 II/III。
+        """
+        servers = list(stun_servers or NAT_BEHAVIOR_STUN_SERVERS)
+        behavior = NatBehavior((local_interface_ip(), self.local_port))
+        if not servers:
+            self.log_callback("NAT行为探测: 未配置 STUN 服务器 (NAT_BEHAVIOR_STUN_SERVERS 为空)。", is_warning=True)
+            return behavior
+        if self.udp_socket is None or self.udp_socket.fileno() == -1:
+            self.log_callback("NAT行为探测: 主套接字未初始化或已关闭。", is_warning=True)
+            return behavior
+
+        known_ips = self.discovery_cache.resolved_stun_ips() if self.discovery_cache else {}
+        addresses: Dict[str, Tuple[str, int]] = {}
+        with ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="StunResolve") as resolver:
+            resolving = {f"{host}:{port}": resolver.submit(socket.gethostbyname, host)
+                         for host, port in servers if f"{host}:{port}" not in known_ips}
+            for host, port in servers:
+                server = f"{host}:{port}"
+                try:
+                    addresses[server] = (known_ips[server] if server in known_ips else resolving[server].result(), port)
+                except OSError as e:
+                    self.log_callback(f"NAT行为探测: 无法解析服务器地址 {host} ({e})")
+        if not addresses:
+            return behavior
+
+        probe_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        original_timeout = self.udp_socket.gettimeout()
+        try:
+            probe_socket.bind(('0.0.0.0', 0))
+            filtering_probes = {}
+            for server, address in addresses.items():
+                filtering_probes[(server, "baseline")] = (address, False, False)
+                filtering_probes[(server, "change_ip_and_port")] = (address, True, True)
+                filtering_probes[(server, "change_port")] = (address, False, True)
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="NatFilteringProbe") as pool:
+                filtering_future = pool.submit(self._stun_exchange, filtering_probes, NAT_PROBE_TIMEOUT_S, probe_socket)
+
+                test1 = self._stun_exchange({server: (address, False, False) for server, address in addresses.items()}, NAT_PROBE_TIMEOUT_S)
+                for server in addresses:
+                    attributes = test1.get(server)
+                    if attributes and attributes["mapped"] and attributes["other_address"] and attributes["other_address"][0] != addresses[server][0]:
+                        behavior.server = server
+                        break
+                if behavior.server:
+                    primary = test1[behavior.server]
+                    behavior.mapped_address = primary["mapped"]
+                    behavior.other_address = primary["other_address"]
+                    other_ip, other_port = behavior.other_address
+                    later = self._stun_exchange({
+                        "test2": ((other_ip, addresses[behavior.server][1]), False, False),
+                        "test3": ((other_ip, other_port), False, False),
+                    }, NAT_PROBE_TIMEOUT_S)
+                    behavior.classify_mapping(behavior.mapped_address,
+                                              later.get("test2", {}).get("mapped"), later.get("test3", {}).get("mapped"))
+                else:
+                    mapped_addresses = [test1[server]["mapped"] for server in addresses if test1.get(server) and test1[server]["mapped"]]
+                    if mapped_addresses:
+                        behavior.mapped_address = mapped_addresses[0]
+                        behavior.classify_mapping_across_servers(mapped_addresses)
+
+                filtering = filtering_future.result()
+            if behavior.server:
+                primary_ip, primary_port = addresses[behavior.server]
+                changed_both = filtering.get((behavior.server, "change_ip_and_port"))
+                changed_port = filtering.get((behavior.server, "change_port"))
+                # 以实际来源确认服务器确实换了地址/端口应答；忽略 CHANGE-REQUEST 的服务器不能据此判为宽松过滤
+                behavior.classify_filtering(
+                    (behavior.server, "baseline") in filtering,
+                    changed_both is not None and changed_both["source"][0] != primary_ip,
+                    changed_port is not None and changed_port["source"] != (primary_ip, primary_port))
+        except OSError as e:
+            self.log_callback(f"NAT行为探测socket错误 (OSError): {e}", is_warning=True)
+        finally:
+            probe_socket.close()
+            if self.udp_socket and self.udp_socket.fileno() != -1:
+                try: self.udp_socket.settimeout(original_timeout)
+                except: pass
+
+        self.nat_behavior = behavior
+        self.connectivity_strategy = behavior.strategy
+        self.log_callback(f"NAT行为探测结果 ({behavior.server or '无支持 RFC 5780 的服务器'}): {behavior.describe()}")
+        return behavior
+
+    def _stun_exchange(self, probes: dict, timeout_s: float, udp_socket: Optional[socket.socket] = None) -> dict:
+        """
+        并发执行一组 STUN 事务并按 RFC 5389 重传，直到全部应答或超时。
+        probes: {键: (目标地址, change_ip, change_port)}；返回 {键: 解析出的属性 (另含 "source")}，未应答者缺席。
+        """
+        transactions: Dict[bytes, _StunTransaction] = {}
+        keys = {}
+        for key, (address, change_ip, change_port) in probes.items():
+            transaction_id = self._stun_generate_transaction_id()
+            request = self._stun_create_request(transaction_id, change_ip or change_port, change_ip, change_port)
+            transactions[transaction_id] = _StunTransaction(str(key), address, transaction_id, request)
+            keys[transaction_id] = key
+        if udp_socket is None:
+            self._stun_waiting.update(transactions)
+        results = {}
+        deadline = time.monotonic() + timeout_s
+        try:
+            while transactions:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                next_event = deadline
+                for transaction in transactions.values():
+                    if now >= transaction.next_send:
+                        self._stun_transmit(transaction, now, udp_socket)
+                    next_event = min(next_event, transaction.next_send)
+                received = self._stun_receive(max(0.001, next_event - now), udp_socket)
+                if received is None:
+                    continue
+                data, addr = received
+                transaction = transactions.pop(bytes(data[8:20]), None) if len(data) >= 20 else None
+                if transaction is None:
+                    continue
+                self._stun_waiting.discard(transaction.transaction_id)
+                attributes = self._stun_parse_attributes(data, transaction.transaction_id)
+                if attributes is not None:
+                    attributes["source"] = addr
+                    results[keys[transaction.transaction_id]] = attributes
+        finally:
+            self._stun_waiting.difference_update(transactions)
+        return results
 
-        self.log_callback(f"已自动选择本地监听端口: {self.local_port}")
+    def start_listening_and_stun(self):
+        """
+        绑定主套接字并确定公网地址后开始监听。同一网络上优先复用上次的本地端口；
+        若发现缓存命中则直接采用缓存结果 (随后由 revalidate_discovery 在后台重新验证)，否则执行 STUN。
+        NAT 类型测试不在此处进行，由调用方在后台完成。
+        """
+        identity = current_network_identity() if self.discovery_cache else (None, None)
+        preferred_port = self.discovery_cache.preferred_port(identity) if self.discovery_cache else None
 
         if self.udp_socket and self.udp_socket.fileno() != -1:
             try: self.udp_socket.close()
             except Exception as e_close: self.log_callback(f"关闭旧套接字时出错: {e_close}")
         self.udp_socket = None
 
-        try:
-            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.udp_socket.bind(('0.0.0.0', self.local_port))
-        except OSError as e:
-            self.log_callback(f"主套接字绑定本地端口 {self.local_port} 失败: {e}", is_error=True)
-            self._cleanup_socket()
-            return False, f"启动失败: 端口 {self.local_port} 绑定失败"
+        if preferred_port:
+            try:
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.bind(('0.0.0.0', preferred_port))
+                self.local_port = preferred_port
+                self.log_callback(f"复用此网络上次使用的本地监听端口: {self.local_port}")
+            except OSError as e:
+                self.log_callback(f"上次使用的端口 {preferred_port} 不可用 ({e})，改用随机端口。")
+                self._cleanup_socket()
+
+        if self.udp_socket is None:
+            self.local_port = self._find_available_random_port()
+            if self.local_port is None:
+                self.log_callback("自动启动失败: 无法找到可用的随机本地端口。", is_error=True)
+                return False, "启动失败: 无可用端口"
 
-        self.log_callback("正在获取公网地址 (STUN)...")
+            self.log_callback(f"已自动选择本地监听端口: {self.local_port}")
 
-        stun_result = self.get_public_address_with_stun()
-        if stun_result and len(stun_result) == 2:
-            self.public_ip, self.public_port = stun_result
+            try:
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.bind(('0.0.0.0', self.local_port))
+            except OSError as e:
+                self.log_callback(f"主套接字绑定本地端口 {self.local_port} 失败: {e}", is_error=True)
+                self._cleanup_socket()
+                return False, f"启动失败: 端口 {self.local_port} 绑定失败"
+
+        self.discovery_key = DiscoveryCache.make_key(identity, self.local_port)
+        cached = self.discovery_cache.get(self.discovery_key) if self.discovery_cache else None
+        self.discovery_from_cache = cached is not None
+        if cached:
+            self.public_ip, self.public_port = cached["public_ip"], cached["public_port"]
+            self.is_cone_nat = cached.get("is_cone_nat")
+            self.stun_server = cached.get("stun_server")
+            strategy = (cached.get("nat_behavior") or {}).get("strategy")
+            self.connectivity_strategy = ConnectivityStrategy(strategy) if strategy in ConnectivityStrategy._value2member_map_ else None
+            self.log_callback(f"使用此网络的缓存发现结果: 公网 IP={self.public_ip}, 公网 Port={self.public_port} (将在后台重新验证)")
         else:
-            self.public_ip, self.public_port = None, None
+            self.log_callback("正在获取公网地址 (STUN)...")
 
-        if self.public_ip and self.public_port:
-            self.log_callback("获取到公网地址，现在测试NAT类型...")
-            self.is_cone_nat = self.check_nat_openness_for_unsolicited_responses()
-            if self.is_cone_nat:
-                self.log_callback("NAT类型测试结果：Cone NAT (良好)，应可接收来电。")
+            stun_result = self.get_public_address_with_stun()
+            if stun_result and len(stun_result) == 2:
+                self.public_ip, self.public_port = stun_result
             else:
-                self.log_callback("NAT类型测试结果：Symmetric NAT 或 防火墙限制 (较差)，可能无法接收来电。", is_warning=True)
-        else:
-            self.log_callback("未能自动获取公网地址。可能仅限局域网通信。", is_warning=True)
-            self.is_cone_nat = False
+                self.public_ip, self.public_port = None, None
+
+            if not (self.public_ip and self.public_port):
+                self.log_callback("未能自动获取公网地址。可能仅限局域网通信。", is_warning=True)
+                self.is_cone_nat = False
 
         self.is_listening = True
-        self.receive_thread = threading.Thread(target=self._receive_loop_target, daemon=True, name="ReceiveAudioThread")
-        self.receive_thread.start()
-        
+        if not (self.transport_mode == "asyncio" and self._start_asyncio_transport()):
+            self.receive_thread = threading.Thread(target=self._receive_loop_target, daemon=True, name="ReceiveAudioThread")
+            self.receive_thread.start()
+        self._start_nat_maintenance()
+
         if self.public_ip and self.public_port:
             return True, None
         else:
             return True, "公网地址获取失败"
 
+    def revalidate_discovery(self) -> Optional[bool]:
+        """
+        监听期间重新执行 STUN；映射地址变化时更新并返回 True，未变返回 False。
+        查询失败返回 None 并保留原结果，此时该结果不再写回缓存。
+        """
+        public_ip, public_port = self.get_public_address_with_stun()
+        if not (public_ip and public_port):
+            self.log_callback("重新验证公网地址失败，继续使用缓存结果。", is_warning=True)
+            self.discovery_key = None
+            return None
+        changed = (public_ip, public_port) != (self.public_ip, self.public_port)
+        self.public_ip, self.public_port = public_ip, public_port
+        return changed
+
+    def save_discovery(self):
+        if self.discovery_cache and self.public_ip and self.public_port:
+            self.discovery_cache.put(self.discovery_key, self.local_port, self.public_ip, self.public_port, self.is_cone_nat, self.stun_server,
+                                      self.nat_behavior.as_dict() if self.nat_behavior else
+                                      {"strategy": self.connectivity_strategy.value} if self.connectivity_strategy else None)
+
+    def _start_nat_maintenance(self):
+        """打洞与保活定时器运行在共享事件循环上，与接收方式 (线程/asyncio) 无关。"""
+        maintenance_loop = shared_event_loop(self.log_callback)
+        self.keepalive = KeepaliveScheduler(self.send_packet, maintenance_loop, self.log_callback)
+        self.hole_puncher = HolePuncher(self.send_packet, maintenance_loop, self.log_callback, on_confirmed=self._on_punch_confirmed)
+        self.connectivity_checker = ConnectivityChecker(self.send_packet, maintenance_loop, self.log_callback)
+        self.relay_client = RelayClient(self.send_packet, maintenance_loop, self.log_callback)
+        self.keepalive.start()
+        self.refresh_stun_keepalive()
+        if RELAY_SERVER:
+            self._allocate_relay(RELAY_SERVER)
+
+    def _on_punch_confirmed(self, address: Tuple[str, int]):
+        if self.punch_confirmed_callback:
+            self.punch_confirmed_callback(address)
+
+    def _allocate_relay(self, server: Tuple[str, int]):
+        host, port = server
+        try:
+            relay_address = (socket.gethostbyname(host), port)
+        except OSError as e:
+            self.log_callback(f"无法解析中继服务器地址 {host} ({e})，不使用中继。", is_warning=True)
+            return
+        self.relay_address = relay_address
+        self.relay_client.allocate(relay_address, self.relay_token)
+        # 保活即重复登记：刷新中继上的等待分配，同时维持到中继的 NAT 映射
+        self.keepalive.set_target("relay", relay_address, build_relay_control(RELAY_OP_ALLOCATE, self.relay_token))
+
+    def gather_candidates(self) -> List[Candidate]:
+        public_address = (self.public_ip, self.public_port) if self.public_ip and self.public_port else None
+        return gather_candidates(self.local_port, public_address, self.relay_address, self.relay_token)
+
+    def refresh_stun_keepalive(self):
+        # 向 STUN 服务器发送绑定请求 (不等待响应) 保活：特征码中的公网映射正是由它观察到的
+        if self.keepalive and self.stun_server_address:
+            request = self._stun_create_request(self._stun_generate_transaction_id())
+            self.keepalive.set_target("stun", self.stun_server_address, request)
+
+    def _start_asyncio_transport(self) -> bool:
+        self.event_loop = shared_event_loop(self.log_callback)
+        self._async_transport = AsyncioDatagramTransport(self.event_loop, self.udp_socket, self._dispatch_datagram, self.log_callback)
+        if self._async_transport.start():
+            self.log_callback("已使用 asyncio 数据报传输接收数据。")
+            return True
+        self.log_callback("asyncio 传输不可用，回退到接收线程。", is_warning=True)
+        self._async_transport = None
+        self.event_loop = None
+        return False
+
+    def _dispatch_datagram(self, data, addr):
+        if self._stun_waiting and len(data) >= 20 and data[4:8] == STUN_MAGIC_COOKIE_BYTES:
+            transaction_id = bytes(data[8:20])
+            if transaction_id in self._stun_waiting:
+                self._stun_responses.put((bytes(data), addr))
+                return
+        if self.data_received_callback:
+            try:
+                self.data_received_callback(data, addr)
+            except Exception as e_cb:
+                self.log_callback(f"处理接收数据的回调函数中发生错误: {e_cb}", is_error=True)
+                traceback.print_exc()
+
     def _receive_loop_target(self):
         self.log_callback("接收线程已启动。")
+        buffer_pool = ReceiveBufferPool()
+        timeout_socket = None
         while self.is_listening:
-            if self.udp_socket is None or self.udp_socket.fileno() == -1:
+            udp_socket = self.udp_socket
+            if udp_socket is None or udp_socket.fileno() == -1:
                 if self.is_listening:
                     self.log_callback("接收线程：UDP套接字已关闭或未初始化，线程终止。", is_warning=True)
                 break
             try:
-                self.udp_socket.settimeout(1.0)
-                data, addr = self.udp_socket.recvfrom(MAX_PACKET_SIZE)
+                if udp_socket is not timeout_socket:
+                    udp_socket.settimeout(RECEIVE_POLL_TIMEOUT_S)
+                    timeout_socket = udp_socket
+                data, addr = buffer_pool.receive_from(udp_socket)
                 if not data: continue
-
-                if self.data_received_callback:
-                    try:
-                        self.data_received_callback(data, addr)
-                    except Exception as e_cb:
-                        self.log_callback(f"处理接收数据的回调函数中发生错误: {e_cb}", is_error=True)
-                        traceback.print_exc()
+                self._dispatch_datagram(data, addr)
 
             except socket.timeout:
                 continue
@@ -286,6 +706,11 @@ class NetworkManager:
             self.log_callback(f"尝试发送数据包但目标地址为空。", is_warning=True)
         return False
         
+    def create_media_sender(self, address) -> Optional[MediaSender]:
+        if not address or not self.udp_socket or self.udp_socket.fileno() == -1:
+            return None
+        return MediaSender(self.udp_socket, address, self.log_callback)
+
     def _cleanup_socket(self):
         if self.udp_socket:
             current_socket = self.udp_socket
@@ -299,6 +724,20 @@ class NetworkManager:
     def stop_listening(self):
         prev_is_listening = self.is_listening
         self.is_listening = False
+        if self.hole_puncher:
+            self.hole_puncher.stop()
+            self.hole_puncher = None
+        if self.keepalive:
+            self.keepalive.stop()
+            self.keepalive = None
+        if self.connectivity_checker:
+            self.connectivity_checker.cancel()
+            self.connectivity_checker = None
+        self.relay_client = None
+        self.relay_address = None
+        if self._async_transport:
+            self._async_transport.close()
+            self._async_transport = None
         self._cleanup_socket()
 
         if self.receive_thread and self.receive_thread.is_alive():
@@ -311,6 +750,10 @@ class NetworkManager:
             if self.receive_thread and self.receive_thread.is_alive():
                 self.log_callback("接收线程join超时。", is_warning=True)
         self.receive_thread = None
+        self.event_loop = None
         self.public_ip = None
         self.public_port = None
-        self.is_cone_nat = None
\ No newline at end of file
+        self.is_cone_nat = None
+        self.nat_behavior = None
+        self.connectivity_strategy = None
+        self.discovery_from_cache = False
\ No newline at end of file
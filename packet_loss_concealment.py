@@ -0,0 +1,125 @@
+import warnings
+from array import array
+from typing import Optional
+
+from config import *
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+class PacketLossConcealer:
+    """
+    基于基音周期重复的丢包补偿：丢帧时从历史波形中找出最近的基音周期并循环延续，
+    逐帧衰减；下一帧真实音频到达时与补偿波形交叉淡入。
+    """
+    def __init__(self, frame_samples: int, sample_rate: int):
+        self.frame_samples = frame_samples
+        self.min_pitch = max(1, int(sample_rate / PLC_MAX_PITCH_HZ))
+        self.max_pitch = int(sample_rate / PLC_MIN_PITCH_HZ)
+        self.match_samples = frame_samples
+        self.history_samples = self.max_pitch + self.match_samples
+        self.crossfade_samples = min(PLC_CROSSFADE_SAMPLES, frame_samples)
+        self._history = array('h', bytes(self.history_samples * 2))
+        self._has_history = False
+        self._pitch = 0
+        self._position = 0
+        self._concealed_run = 0
+        self.stats = {"concealed_frames": 0, "concealment_events": 0, "crossfades": 0, "faded_to_silence": 0}
+
+    def reset(self):
+        self._history = array('h', bytes(self.history_samples * 2))
+        self._has_history = False
+        self._pitch = 0
+        self._position = 0
+        self._concealed_run = 0
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def _remember(self, samples):
+        combined = self._history + samples
+        self._history = combined[-self.history_samples:]
+        self._has_history = True
+
+    @staticmethod
+    def _best_lag(signal: bytes, template: bytes, template_end: int, lags, width=2):
+        """在给定滞后集合中找出与模板归一化互相关最大（且为正相关）的滞后。"""
+        template_len = len(template)
+        template_rms = audioop.rms(template, width)
+        best_lag, best_score = None, 0.0
+        for lag in lags:
+            start = (template_end - lag) * width
+            segment = signal[start - template_len:start]
+            segment_rms = audioop.rms(segment, width)
+            if segment_rms == 0:
+                continue
+            score = audioop.findfactor(segment, template) * template_rms / segment_rms
+            if score > best_score:
+                best_lag, best_score = lag, score
+        return best_lag
+
+    def _estimate_pitch(self):
+        if audioop is None or not audioop.rms(self._history.tobytes(), 2):
+            return self.frame_samples
+        step = PLC_PITCH_SEARCH_DECIMATION
+        end = len(self._history)
+        coarse = self._history[end % step::step].tobytes()
+        coarse_end = len(coarse) // 2
+        coarse_match = self.match_samples // step
+        coarse_lag = self._best_lag(coarse, coarse[-coarse_match * 2:], coarse_end,
+                                    range(self.min_pitch // step, self.max_pitch // step + 1))
+        if coarse_lag is None:
+            return self.frame_samples
+        full = self._history.tobytes()
+        refine = range(max(self.min_pitch, coarse_lag * step - step), min(self.max_pitch, coarse_lag * step + step) + 1)
+        return self._best_lag(full, full[-self.match_samples * 2:], end, refine) or coarse_lag * step
+
+    def _extend_waveform(self, count):
+        history, pitch = self._history, self._pitch
+        base = len(history) - pitch
+        start = self._position
+        self._position = (start + count) % pitch
+        return [history[base + (start + i) % pitch] for i in range(count)]
+
+    def conceal(self) -> Optional[bytes]:
+        """生成一帧补偿音频；若无历史或已衰减至静音则返回 None。"""
+        if not self._has_history:
+            return None
+        if self._concealed_run == 0:
+            self._pitch = self._estimate_pitch()
+            self._position = 0
+            self.stats["concealment_events"] += 1
+        if self._concealed_run >= PLC_MAX_CONCEALED_FRAMES:
+            if self._concealed_run == PLC_MAX_CONCEALED_FRAMES:
+                self.stats["faded_to_silence"] += 1
+                self._concealed_run += 1
+            return None
+
+        n = self.frame_samples
+        fade_frames = PLC_MAX_CONCEALED_FRAMES - PLC_FULL_GAIN_FRAMES
+        start_gain = 1.0 - max(0, self._concealed_run - PLC_FULL_GAIN_FRAMES) / fade_frames
+        end_gain = 1.0 - max(0, self._concealed_run + 1 - PLC_FULL_GAIN_FRAMES) / fade_frames
+        step = (end_gain - start_gain) / n
+        waveform = self._extend_waveform(n)
+        concealed = array('h', [int(s * (start_gain + step * i)) for i, s in enumerate(waveform)])
+
+        self._concealed_run += 1
+        self.stats["concealed_frames"] += 1
+        return concealed.tobytes()
+
+    def process_good_frame(self, pcm: bytes) -> bytes:
+        samples = array('h', pcm)
+        if self._concealed_run and self._concealed_run <= PLC_MAX_CONCEALED_FRAMES and len(samples) >= self.crossfade_samples:
+            n = self.crossfade_samples
+            gain = max(0.0, 1.0 - max(0, self._concealed_run - PLC_FULL_GAIN_FRAMES) / (PLC_MAX_CONCEALED_FRAMES - PLC_FULL_GAIN_FRAMES))
+            tail = self._extend_waveform(n)
+            for i in range(n):
+                samples[i] = int((tail[i] * gain * (n - i) + samples[i] * i) / n)
+            self.stats["crossfades"] += 1
+            pcm = samples.tobytes()
+        self._concealed_run = 0
+        self._remember(samples)
+        return pcm
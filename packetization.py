@@ -0,0 +1,139 @@
+from typing import Optional
+
+from config import *
+from media_packet import AUDIO_HEADER, BUNDLE_ENTRY_HEADER, BUNDLE_HEADER, BUNDLE_PAYLOAD_TYPE, RED_HEADER, RED_PAYLOAD_TYPE
+
+class MediaBundler:
+    """
+    发送端多帧聚合：把若干采集帧产生的媒体包合并为一个数据报，以少量延迟换取更少的 sendto 调用与包头开销。
+    每采集一帧调用一次 tick()，满 frames_per_packet 帧即输出；只有一个包时原样发送，不加聚合头。
+    包头与负载用 pack_into 直接写入预分配的缓冲 (双缓冲轮换)，返回的 memoryview 在下一次输出前有效。
+    """
+    _ENTRIES_OFFSET = AUDIO_HEADER.size + BUNDLE_HEADER.size
+
+    def __init__(self, frames_per_packet: int = PACKETIZATION_FRAMES):
+        self.frames_per_packet = frames_per_packet
+        self._buffers = [bytearray(MAX_PACKET_SIZE), bytearray(MAX_PACKET_SIZE)]
+        self._views = [memoryview(buf) for buf in self._buffers]
+        self._active = 0
+        self._first_seq: Optional[int] = None
+        self._last_entry = self._ENTRIES_OFFSET
+        self._offset = self._ENTRIES_OFFSET
+        self._count = 0
+        self._frames = 0
+        self.datagrams_sent = 0
+        self.packets_bundled = 0
+
+    def reset(self):
+        self._first_seq = None
+        self._offset = self._ENTRIES_OFFSET
+        self._count = 0
+        self._frames = 0
+        self.datagrams_sent = 0
+        self.packets_bundled = 0
+
+    def set_frames_per_packet(self, frames: int) -> Optional[memoryview]:
+        frames = max(1, min(PACKETIZATION_MAX_FRAMES, frames))
+        if frames == self.frames_per_packet:
+            return None
+        self.frames_per_packet = frames
+        return self.flush()
+
+    def _begin_entry(self, packet_size: int) -> Optional[memoryview]:
+        entry_size = BUNDLE_ENTRY_HEADER.size + packet_size
+        forced = self.flush() if self._count and self._offset + entry_size > MAX_PACKET_SIZE else None
+        BUNDLE_ENTRY_HEADER.pack_into(self._buffers[self._active], self._offset, packet_size)
+        self._last_entry = self._offset
+        self._offset += BUNDLE_ENTRY_HEADER.size
+        return forced
+
+    def _write(self, data):
+        end = self._offset + len(data)
+        self._views[self._active][self._offset:end] = data
+        self._offset = end
+
+    def add_frame(self, seq_num: int, payload_type: int, payload) -> Optional[memoryview]:
+        """加入一个普通媒体包；若会超出 MAX_PACKET_SIZE 则先返回已积累的数据报。"""
+        forced = self._begin_entry(AUDIO_HEADER.size + len(payload))
+        AUDIO_HEADER.pack_into(self._buffers[self._active], self._offset, seq_num, payload_type)
+        self._offset += AUDIO_HEADER.size
+        self._write(payload)
+        self._finish_entry(seq_num)
+        return forced
+
+    def add_red_frame(self, seq_num: int, primary_type: int, primary, distance: int = 0, redundant_type: int = 0, redundant=b"") -> Optional[memoryview]:
+        """加入一个 RED 包: 音频头 (payload_type 为 RED) + RED_HEADER + 冗余帧 + 主帧。"""
+        forced = self._begin_entry(AUDIO_HEADER.size + RED_HEADER.size + len(redundant) + len(primary))
+        buf = self._buffers[self._active]
+        AUDIO_HEADER.pack_into(buf, self._offset, seq_num, RED_PAYLOAD_TYPE)
+        RED_HEADER.pack_into(buf, self._offset + AUDIO_HEADER.size, distance, redundant_type, len(redundant), primary_type)
+        self._offset += AUDIO_HEADER.size + RED_HEADER.size
+        self._write(redundant)
+        self._write(primary)
+        self._finish_entry(seq_num)
+        return forced
+
+    def _finish_entry(self, seq_num: int):
+        if self._first_seq is None:
+            self._first_seq = seq_num
+        self._count += 1
+
+    def tick(self) -> Optional[memoryview]:
+        self._frames += 1
+        if self._frames >= self.frames_per_packet:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[memoryview]:
+        self._frames = 0
+        if not self._count:
+            return None
+        view = self._views[self._active]
+        if self._count == 1:
+            datagram = view[self._last_entry + BUNDLE_ENTRY_HEADER.size:self._offset]
+        else:
+            buf = self._buffers[self._active]
+            AUDIO_HEADER.pack_into(buf, 0, self._first_seq, BUNDLE_PAYLOAD_TYPE)
+            BUNDLE_HEADER.pack_into(buf, AUDIO_HEADER.size, self.frames_per_packet)
+            datagram = view[:self._offset]
+        self.datagrams_sent += 1
+        self.packets_bundled += self._count
+        self._active ^= 1
+        self._first_seq = None
+        self._offset = self._ENTRIES_OFFSET
+        self._count = 0
+        return datagram
+
+class PacketizationController:
+    """
+    按对方回报的平滑丢包率在正常与劣化两档每包帧数之间切换（带滞回）；PACKETIZATION_ADAPTIVE 为 False 时
+    固定为 PACKETIZATION_FRAMES。两档都不超过通话协商得到的对方上限 peer_max_frames。
+    """
+    def __init__(self, log_callback):
+        self.log = log_callback
+        self.base_frames = PACKETIZATION_FRAMES
+        self.frames_per_packet = PACKETIZATION_FRAMES
+        self.peer_max_frames = PACKETIZATION_MAX_FRAMES
+        self.adaptive = PACKETIZATION_ADAPTIVE
+
+    def reset(self):
+        self.peer_max_frames = PACKETIZATION_MAX_FRAMES
+        self.frames_per_packet = self.base_frames
+
+    def limit_frames(self, max_frames: int) -> int:
+        self.peer_max_frames = max(1, min(PACKETIZATION_MAX_FRAMES, max_frames))
+        self.frames_per_packet = min(self.frames_per_packet, self.peer_max_frames)
+        return self.frames_per_packet
+
+    def on_smoothed_loss(self, smoothed_loss: float) -> int:
+        if not self.adaptive:
+            return self.frames_per_packet
+        normal = min(self.base_frames, self.peer_max_frames)
+        degraded = min(max(self.base_frames, PACKETIZATION_DEGRADED_FRAMES), self.peer_max_frames)
+        if self.frames_per_packet != degraded and smoothed_loss >= PACKETIZATION_DEGRADE_LOSS:
+            self.frames_per_packet = degraded
+            self.log(f"链路劣化 (平滑丢包率={smoothed_loss:.3f})，每包帧数调整为 {degraded}")
+        elif self.frames_per_packet != normal and smoothed_loss < PACKETIZATION_RECOVER_LOSS:
+            self.frames_per_packet = normal
+            self.log(f"链路恢复 (平滑丢包率={smoothed_loss:.3f})，每包帧数恢复为 {normal}")
+        return self.frames_per_packet
@@ -0,0 +1,283 @@
+"""
+轻量 UDP 中继：双方都无法直连时转发音频与信令。
+
+一个 UDP 端口服务所有客户端。被叫以令牌登记等待分配 (ALLOCATE，由保活定期刷新)，主叫凭对方特征码中的
+令牌连接 (CONNECT)，中继随即把两者的地址互相配对；此后来自任一方的数据报原样转发给另一方，双方都把
+中继地址当作对方地址。控制消息为定长 RELAY_CONTROL，其余数据报不做任何解析。
+
+    python relay.py [--host 0.0.0.0] [--port 3479]
+    python app_controller.py --relay [--port 3479]
+"""
+import argparse
+import socket
+import struct
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config import (MAX_PACKET_SIZE, RELAY_CONNECT_MAX_ATTEMPTS, RELAY_CONNECT_RETRY_MS, RELAY_DEFAULT_PORT, RELAY_IDLE_TIMEOUT_S,
+                    RELAY_SOCKET_BUFFER_BYTES, RELAY_SWEEP_CHECK_PACKETS, RELAY_SWEEP_INTERVAL_S)
+from models import SignalType
+
+Address = Tuple[str, int]
+
+RELAY_MAGIC = SignalType.RELAY_CONTROL_PREFIX.value
+# 魔数, 操作码, 令牌
+RELAY_CONTROL = struct.Struct(f"!{len(RELAY_MAGIC)}sB8s")
+RELAY_TOKEN_SIZE = 8
+
+RELAY_OP_ALLOCATE = 0x01
+RELAY_OP_CONNECT = 0x02
+RELAY_OP_RELEASE = 0x03
+RELAY_OP_ALLOCATED = 0x81
+RELAY_OP_CONNECTED = 0x82
+RELAY_OP_ERROR = 0xFF
+
+def build_relay_control(op: int, token: bytes = bytes(RELAY_TOKEN_SIZE)) -> bytes:
+    return RELAY_CONTROL.pack(RELAY_MAGIC, op, token)
+
+class _Allocation:
+    """配对表中的一项：本端地址发来的数据报转发给 peer；计数只统计本端发出的流量。"""
+    __slots__ = ("peer", "packets", "bytes", "packets_at_sweep", "idle_sweeps")
+
+    def __init__(self, peer: Address):
+        self.peer = peer
+        self.packets = 0
+        self.bytes = 0
+        self.packets_at_sweep = 0
+        self.idle_sweeps = 0
+
+class _Waiting:
+    __slots__ = ("address", "idle_sweeps")
+
+    def __init__(self, address: Address):
+        self.address = address
+        self.idle_sweeps = 0
+
+class RelayServer:
+    def __init__(self, log_callback, host: str = "0.0.0.0", port: int = RELAY_DEFAULT_PORT):
+        self.log = log_callback
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                self.udp_socket.setsockopt(socket.SOL_SOCKET, option, RELAY_SOCKET_BUFFER_BYTES)
+            except OSError:
+                pass
+        if hasattr(socket, "SIO_UDP_CONNRESET"):
+            # Windows: 转发目标端口不可达时不要让后续 recvfrom 报 WSAECONNRESET
+            self.udp_socket.ioctl(socket.SIO_UDP_CONNRESET, False)
+        self.udp_socket.bind((host, port))
+        self.udp_socket.settimeout(RELAY_SWEEP_INTERVAL_S)
+        self.address = self.udp_socket.getsockname()
+        self.allocations: Dict[Address, _Allocation] = {}
+        self.waiting: Dict[bytes, _Waiting] = {}
+        self.totals = {"packets": 0, "bytes": 0, "pairs": 0, "control": 0, "dropped": 0}
+        self._running = False
+
+    def serve_forever(self):
+        self._running = True
+        self.log(f"中继服务已启动: {self.address[0]}:{self.address[1]}")
+        buffer = bytearray(MAX_PACKET_SIZE)
+        view = memoryview(buffer)
+        receive_into = self.udp_socket.recvfrom_into
+        sendto = self.udp_socket.sendto
+        lookup = self.allocations.get
+        control_size = RELAY_CONTROL.size
+        magic, magic_size = RELAY_MAGIC, len(RELAY_MAGIC)
+        countdown = RELAY_SWEEP_CHECK_PACKETS
+        next_sweep = time.monotonic() + RELAY_SWEEP_INTERVAL_S
+        while self._running:
+            try:
+                nbytes, addr = receive_into(buffer)
+            except socket.timeout:
+                nbytes, addr = -1, None
+            except ConnectionResetError:
+                continue
+            except OSError as e:
+                if self._running:
+                    self.log(f"中继接收错误: {e}", is_warning=True)
+                    continue
+                break
+            if addr is not None:
+                allocation = lookup(addr)
+                # 热路径: 一次字典查找 + 一次 sendto；只有恰为控制消息长度的数据报才需要比较魔数
+                if allocation is not None and (nbytes != control_size or view[:magic_size] != magic):
+                    try:
+                        sendto(view[:nbytes], allocation.peer)
+                    except OSError:
+                        self.totals["dropped"] += 1
+                    allocation.packets += 1
+                    allocation.bytes += nbytes
+                    countdown -= 1
+                    if countdown:
+                        continue
+                elif nbytes == control_size and view[:magic_size] == magic:
+                    self._handle_control(view, addr)
+                else:
+                    self.totals["dropped"] += 1
+            countdown = RELAY_SWEEP_CHECK_PACKETS
+            now = time.monotonic()
+            if now >= next_sweep:
+                next_sweep = now + RELAY_SWEEP_INTERVAL_S
+                self._sweep()
+        self.log(f"中继服务已停止。统计: {self.stats()}")
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        self._running = False
+        self.udp_socket.close()
+
+    def _reply(self, op: int, token: bytes, addr: Address):
+        try:
+            self.udp_socket.sendto(build_relay_control(op, token), addr)
+        except OSError:
+            pass
+
+    def _handle_control(self, view: memoryview, addr: Address):
+        _, op, token = RELAY_CONTROL.unpack_from(view)
+        self.totals["control"] += 1
+        if op == RELAY_OP_ALLOCATE:
+            waiting = self.waiting.get(token)
+            if waiting is None or waiting.address != addr:
+                self.waiting[token] = _Waiting(addr)
+                if waiting is None:
+                    self.log(f"登记分配 {token.hex()} <- {addr}")
+            else:
+                waiting.idle_sweeps = 0
+            self._reply(RELAY_OP_ALLOCATED, token, addr)
+        elif op == RELAY_OP_CONNECT:
+            waiting = self.waiting.get(token)
+            if waiting is None or waiting.address == addr:
+                self._reply(RELAY_OP_ERROR, token, addr)
+                return
+            owner = self.allocations.get(waiting.address)
+            if owner is not None and owner.peer != addr:
+                # 被叫正经由中继与他人通话
+                self._reply(RELAY_OP_ERROR, token, addr)
+                return
+            if owner is None:
+                self._unpair(addr)
+                self.allocations[addr] = _Allocation(waiting.address)
+                self.allocations[waiting.address] = _Allocation(addr)
+                self.totals["pairs"] += 1
+                self.log(f"配对 {addr} <-> {waiting.address} (令牌 {token.hex()})")
+            self._reply(RELAY_OP_CONNECTED, token, addr)
+        elif op == RELAY_OP_RELEASE:
+            self._unpair(addr)
+
+    def _unpair(self, addr: Address):
+        allocation = self.allocations.pop(addr, None)
+        if allocation is None:
+            return
+        peer = self.allocations.pop(allocation.peer, None)
+        for entry in (allocation, peer):
+            if entry:
+                self.totals["packets"] += entry.packets
+                self.totals["bytes"] += entry.bytes
+        self.log(f"解除配对 {addr} <-> {allocation.peer} (转发 {allocation.packets + (peer.packets if peer else 0)} 个数据报)")
+
+    def _sweep(self):
+        # 按计数而不是逐包记时间判断空闲：配对双方连续 RELAY_IDLE_TIMEOUT_S 无数据即解除，等待分配同样需定期刷新
+        idle_limit = max(1, round(RELAY_IDLE_TIMEOUT_S / RELAY_SWEEP_INTERVAL_S))
+        for allocation in self.allocations.values():
+            if allocation.packets != allocation.packets_at_sweep:
+                allocation.packets_at_sweep = allocation.packets
+                allocation.idle_sweeps = 0
+            else:
+                allocation.idle_sweeps += 1
+        for addr, allocation in list(self.allocations.items()):
+            peer = self.allocations.get(allocation.peer)
+            if allocation.idle_sweeps >= idle_limit and (peer is None or peer.idle_sweeps >= idle_limit):
+                self._unpair(addr)
+        for token, waiting in list(self.waiting.items()):
+            waiting.idle_sweeps += 1
+            if waiting.idle_sweeps > idle_limit:
+                del self.waiting[token]
+
+    def stats(self) -> dict:
+        stats = dict(self.totals)
+        stats["active_pairs"] = len(self.allocations) // 2
+        stats["waiting"] = len(self.waiting)
+        stats["packets"] += sum(a.packets for a in self.allocations.values())
+        stats["bytes"] += sum(a.bytes for a in self.allocations.values())
+        return stats
+
+class RelayClient:
+    """客户端一侧：登记等待分配 (被叫) 与按令牌连接 (主叫)；CONNECT 按 RELAY_CONNECT_RETRY_MS 重传。"""
+    def __init__(self, send: Callable[[bytes, Address], bool], event_loop, log_callback):
+        self.send = send
+        self.event_loop = event_loop
+        self.log = log_callback
+        self._pending: Dict[Tuple[Address, bytes], Tuple[Callable[[Optional[Address]], None], int]] = {}
+        self.allocated = False
+
+    def allocate(self, relay_address: Address, token: bytes):
+        self.send(build_relay_control(RELAY_OP_ALLOCATE, token), relay_address)
+
+    def connect(self, relay_address: Address, token: bytes, on_connected: Callable[[Optional[Address]], None]):
+        self.event_loop.call_soon(self._connect, relay_address, token, on_connected)
+
+    def release(self, relay_address: Address):
+        self.send(build_relay_control(RELAY_OP_RELEASE), relay_address)
+
+    def on_control(self, addr: Address, data: bytes):
+        if len(data) != RELAY_CONTROL.size:
+            return
+        _, op, token = RELAY_CONTROL.unpack(data)
+        if op == RELAY_OP_ALLOCATED:
+            if not self.allocated:
+                self.allocated = True
+                self.log(f"已在中继 {addr} 登记分配。")
+        elif op in (RELAY_OP_CONNECTED, RELAY_OP_ERROR):
+            self.event_loop.call_soon(self._complete, (addr, token), addr if op == RELAY_OP_CONNECTED else None)
+
+    def _connect(self, relay_address: Address, token: bytes, on_connected):
+        key = (relay_address, token)
+        self._pending[key] = (on_connected, 0)
+        self._retry(key)
+
+    def _retry(self, key):
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+        on_connected, attempts = pending
+        if attempts >= RELAY_CONNECT_MAX_ATTEMPTS:
+            self._complete(key, None)
+            return
+        self._pending[key] = (on_connected, attempts + 1)
+        self.send(build_relay_control(RELAY_OP_CONNECT, key[1]), key[0])
+        self.event_loop.call_later(RELAY_CONNECT_RETRY_MS / 1000, self._retry, key)
+
+    def _complete(self, key, relay_address: Optional[Address]):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if relay_address:
+            self.log(f"已经中继 {relay_address} 与对方配对。")
+        else:
+            self.log(f"经中继 {key[0]} 连接对方失败 (未登记、忙或无响应)。", is_warning=True)
+        pending[0](relay_address)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="OtterVoice UDP 中继服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=RELAY_DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    def log(message, is_error=False, is_warning=False):
+        level = "ERROR" if is_error else "WARN" if is_warning else "INFO"
+        print(f"{time.strftime('%H:%M:%S')} [Relay] [{level}] - {message}", flush=True)
+
+    server = RelayServer(log, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        log(f"统计: {server.stats()}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from config import *
+
+Address = Tuple[str, int]
+
+class RttEstimator:
+    """RFC 6298 的 SRTT/RTTVAR 估计；RTO 夹在 [SIGNAL_RTO_MIN_MS, SIGNAL_RTO_MAX_MS] 内。"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.srtt_ms: Optional[float] = None
+        self.rttvar_ms = 0.0
+        self.rto_ms = float(SIGNAL_RTO_INITIAL_MS)
+
+    def observe(self, rtt_ms: float):
+        if self.srtt_ms is None:
+            self.srtt_ms = rtt_ms
+            self.rttvar_ms = rtt_ms / 2
+        else:
+            self.rttvar_ms = 0.75 * self.rttvar_ms + 0.25 * abs(self.srtt_ms - rtt_ms)
+            self.srtt_ms = 0.875 * self.srtt_ms + 0.125 * rtt_ms
+        self.rto_ms = min(SIGNAL_RTO_MAX_MS, max(SIGNAL_RTO_MIN_MS, self.srtt_ms + 4 * self.rttvar_ms))
+
+class _PendingMessage:
+    __slots__ = ("key", "data", "address", "message_id", "transmissions", "first_sent", "timer", "on_acked", "on_failed")
+
+    def __init__(self, key, data: bytes, address: Address, message_id: int, on_acked, on_failed):
+        self.key = key
+        self.data = data
+        self.address = address
+        self.message_id = message_id
+        self.transmissions = 0
+        self.first_sent = 0.0
+        self.timer = None
+        self.on_acked = on_acked
+        self.on_failed = on_failed
+
+class ReliableSignaling:
+    """
+    可靠信令层：消息在确认前按 RTO 重传，每次退避加倍，最多发送 SIGNAL_MAX_TRANSMISSIONS 次后回调 on_failed。
+    每个键 (如包类型) 同时只有一条待确认消息，新消息取代旧消息。确认可按键 (旧版信令各自的 ACK)
+    或按二进制帧的消息 ID 给出；只有未重传过的消息提供 RTT 样本 (Karn 算法)。
+    定时器经由调用方提供的 schedule/cancel，回调与状态机运行在同一线程；acknowledge 可在任意线程调用。
+    """
+    def __init__(self, send: Callable[[bytes, Address], bool], schedule: Callable, cancel: Callable, log_callback,
+                 clock: Callable[[], float] = time.monotonic):
+        self.send_packet = send
+        self.schedule = schedule
+        self.cancel_timer = cancel
+        self.log = log_callback
+        self.clock = clock
+        self.rtt = RttEstimator()
+        self._pending: Dict[Hashable, _PendingMessage] = {}
+        self._keys_by_message_id: Dict[int, Hashable] = {}
+        self._next_message_id = 0
+        self._received_session = None
+        self._received_ids: deque = deque(maxlen=SIGNAL_DUPLICATE_HISTORY)
+        self.retransmissions = 0
+
+    def next_message_id(self) -> int:
+        # 0 表示不需要确认，循环时跳过
+        self._next_message_id = self._next_message_id % 0xFFFF + 1
+        return self._next_message_id
+
+    def reset(self):
+        """新会话开始：RTT 估计与去重记录都只对同一对端有意义。"""
+        self.rtt.reset()
+        self._received_session = None
+        self._received_ids.clear()
+
+    def observe_rtt(self, rtt_ms: float):
+        self.rtt.observe(rtt_ms)
+
+    def send(self, key: Hashable, data: bytes, address: Address, message_id: int = 0,
+             on_acked: Optional[Callable[[], None]] = None, on_failed: Optional[Callable[[], None]] = None) -> bool:
+        self.cancel(key)
+        message = _PendingMessage(key, data, address, message_id, on_acked, on_failed)
+        # 先登记再发送：确认可能在 sendto 返回之前就已到达
+        message.transmissions = 1
+        message.first_sent = self.clock()
+        self._pending[key] = message
+        if message_id:
+            self._keys_by_message_id[message_id] = key
+        message.timer = self.schedule(int(self.rtt.rto_ms), self._retransmit, message)
+        if not self.send_packet(data, address):
+            self.cancel(key)
+            return False
+        return True
+
+    def cancel(self, key: Hashable):
+        message = self._pending.pop(key, None)
+        if message is not None:
+            self._discard(message)
+
+    def cancel_all(self):
+        for key in list(self._pending):
+            self.cancel(key)
+
+    def acknowledge(self, key: Hashable):
+        self.schedule(0, self._acknowledge, key, self.clock())
+
+    def acknowledge_message(self, message_id: int):
+        self.schedule(0, self._acknowledge_message, message_id, self.clock())
+
+    def is_duplicate(self, session_id: int, message_id: int) -> bool:
+        """接收端：同一会话内已见过的消息 ID 为重复 (对方没收到确认而重传)。"""
+        if session_id != self._received_session:
+            self._received_session = session_id
+            self._received_ids.clear()
+        if message_id in self._received_ids:
+            return True
+        self._received_ids.append(message_id)
+        return False
+
+    def _discard(self, message: _PendingMessage):
+        if message.timer is not None:
+            self.cancel_timer(message.timer)
+            message.timer = None
+        if message.message_id:
+            self._keys_by_message_id.pop(message.message_id, None)
+
+    def _acknowledge_message(self, message_id: int, received: float):
+        key = self._keys_by_message_id.get(message_id)
+        if key is not None:
+            self._acknowledge(key, received)
+
+    def _acknowledge(self, key: Hashable, received: float):
+        message = self._pending.pop(key, None)
+        if message is None:
+            return
+        self._discard(message)
+        if message.transmissions == 1:
+            self.rtt.observe((received - message.first_sent) * 1000)
+        if message.on_acked:
+            message.on_acked()
+
+    def _retransmit(self, message: _PendingMessage):
+        message.timer = None
+        if self._pending.get(message.key) is not message:
+            return
+        if message.transmissions >= SIGNAL_MAX_TRANSMISSIONS:
+            del self._pending[message.key]
+            self._discard(message)
+            self.log(f"{self._describe(message.key)} 发送 {message.transmissions} 次仍未获确认，放弃。", is_warning=True)
+            if message.on_failed:
+                message.on_failed()
+            return
+        message.transmissions += 1
+        self.retransmissions += 1
+        self.log(f"{self._describe(message.key)} 未获确认，第 {message.transmissions} 次发送至 {message.address}。")
+        self.send_packet(message.data, message.address)
+        delay_ms = min(SIGNAL_RTO_MAX_MS, self.rtt.rto_ms * 2 ** (message.transmissions - 1))
+        message.timer = self.schedule(int(delay_ms), self._retransmit, message)
+
+    @staticmethod
+    def _describe(key) -> str:
+        return getattr(key, "name", str(key))
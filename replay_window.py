@@ -0,0 +1,57 @@
+from config import *
+from models import PacketSequenceStatus
+from utils import sequence_delta
+
+class SequenceReplayWindow:
+    """
+    IPsec 反重放式滑动窗口：以最高已见序列号为锚点，用定长位图记录其后 window_size 个序列号
+    是否已收到，常数时间内把每个包归类为 新/迟到/重复/过旧，支持 MAX_SEQ_NUM 回绕。
+    """
+    def __init__(self, window_size: int = REPLAY_WINDOW_SIZE):
+        self.window_size = window_size
+        self._mask = (1 << window_size) - 1
+        self._bitmap = 0
+        self._highest_seq = None
+        self._too_old_streak = 0
+        self.counters = {status.name.lower(): 0 for status in PacketSequenceStatus}
+
+    def reset(self):
+        self._bitmap = 0
+        self._highest_seq = None
+        self._too_old_streak = 0
+        for key in self.counters:
+            self.counters[key] = 0
+
+    def _count(self, status):
+        self.counters[status.name.lower()] += 1
+        return status
+
+    def check_and_update(self, seq_num: int) -> PacketSequenceStatus:
+        if self._highest_seq is None:
+            self._highest_seq = seq_num
+            self._bitmap = 1
+            return self._count(PacketSequenceStatus.NEW)
+
+        delta = sequence_delta(seq_num, self._highest_seq, MAX_SEQ_NUM)
+        if delta > 0:
+            self._bitmap = 1 if delta >= self.window_size else ((self._bitmap << delta) | 1) & self._mask
+            self._highest_seq = seq_num
+            self._too_old_streak = 0
+            return self._count(PacketSequenceStatus.NEW)
+
+        offset = -delta
+        if offset >= self.window_size:
+            self._too_old_streak += 1
+            if self._too_old_streak >= REPLAY_WINDOW_RESYNC_THRESHOLD:
+                self._highest_seq = seq_num
+                self._bitmap = 1
+                self._too_old_streak = 0
+                return self._count(PacketSequenceStatus.NEW)
+            return self._count(PacketSequenceStatus.TOO_OLD)
+
+        self._too_old_streak = 0
+        bit = 1 << offset
+        if self._bitmap & bit:
+            return self._count(PacketSequenceStatus.DUPLICATE)
+        self._bitmap |= bit
+        return self._count(PacketSequenceStatus.LATE)
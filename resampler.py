@@ -0,0 +1,193 @@
+import math
+import warnings
+from array import array
+from typing import List
+
+from config import *
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+def _design_lowpass(length: int, cutoff: float, gain: float) -> List[float]:
+    """Blackman 窗 sinc 低通；cutoff 以采样率归一化 (0 ~ 0.5)。"""
+    center = (length - 1) / 2
+    taps = []
+    for k in range(length):
+        x = k - center
+        sinc = 2 * cutoff if x == 0 else math.sin(2 * math.pi * cutoff * x) / (math.pi * x)
+        window = 0.42 - 0.5 * math.cos(2 * math.pi * k / (length - 1)) + 0.08 * math.cos(4 * math.pi * k / (length - 1)) if length > 1 else 1.0
+        taps.append(sinc * window)
+    total = sum(taps)
+    return [t * gain / total for t in taps]
+
+class PassthroughResampler:
+    def process(self, pcm: bytes) -> bytes:
+        return pcm
+
+    def reset(self):
+        pass
+
+class PolyphaseResampler:
+    """
+    有理数比 L/M 的流式多相 FIR 重采样。同一相位的输出在输入上等间隔 (步长 M)，
+    因此每个 (相位, 抽头) 只需一次跨步切片加一次 audioop 乘加，循环次数与帧长无关。
+    """
+    def __init__(self, in_rate: int, out_rate: int, taps_per_phase: int = RESAMPLER_TAPS_PER_PHASE, cutoff_rate: int = None):
+        g = math.gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        band_edge = min(in_rate, out_rate, cutoff_rate or in_rate) / 2
+        # 通带相对输入率越窄，滤波器在输入率上需要越长，相位抽头数按比例放大
+        self.taps_per_phase = taps_per_phase * max(1, math.ceil(in_rate / (2 * band_edge)))
+        taps_per_phase = self.taps_per_phase
+        cutoff = band_edge * RESAMPLER_CUTOFF / (in_rate * self.up)
+        prototype = _design_lowpass(self.up * taps_per_phase, cutoff, self.up)
+        # 第 r 个输出 (一个周期内) 对应输入偏移 (r*M)//L 与相位 (r*M)%L
+        self._phases = []
+        for r in range(self.up):
+            phase = (r * self.down) % self.up
+            coefs = [prototype[phase + j * self.up] for j in range(taps_per_phase)]
+            self._phases.append(((r * self.down) // self.up, coefs))
+        self.reset()
+
+    def reset(self):
+        self._history = array('h', bytes(2 * (self.taps_per_phase - 1)))
+
+    def process(self, pcm: bytes) -> bytes:
+        buf = self._history + array('h', pcm)
+        start = self.taps_per_phase - 1
+        cycles = (len(buf) - start) // self.down
+        if cycles <= 0:
+            self._history = buf
+            return b""
+        span = cycles * self.down
+        if audioop:
+            out = self._filter_audioop(buf, start, cycles, span)
+        else:
+            out = self._filter_python(buf, start, cycles)
+        self._history = buf[start + span - (self.taps_per_phase - 1):]
+        return out.tobytes()
+
+    def _filter_audioop(self, buf, start, cycles, span):
+        # 在 32 位宽度下累加 (输入预先减半防止中间和溢出)，最后还原为 16 位
+        wide = array('i')
+        wide.frombytes(audioop.lin2lin(buf.tobytes(), 2, 4))
+        out = array('h', bytes(2 * cycles * self.up))
+        for r, (offset, coefs) in enumerate(self._phases):
+            acc = None
+            for j, coef in enumerate(coefs):
+                first = start + offset - j
+                term = audioop.mul(wide[first:first + span:self.down].tobytes(), 4, coef * 0.5)
+                acc = term if acc is None else audioop.add(acc, term, 4)
+            out[r::self.up] = array('h', audioop.mul(audioop.lin2lin(acc, 4, 2), 2, 2.0))
+        return out
+
+    def _filter_python(self, buf, start, cycles):
+        out = array('h', bytes(2 * cycles * self.up))
+        for r, (offset, coefs) in enumerate(self._phases):
+            values = []
+            for k in range(cycles):
+                n = start + offset + k * self.down
+                value = int(sum(c * buf[n - j] for j, c in enumerate(coefs)))
+                values.append(max(-32768, min(32767, value)))
+            out[r::self.up] = array('h', values)
+        return out
+
+class RatecvResampler:
+    """
+    相位数过多 (如 44.1k <-> 40k) 时无法按相位向量化：降采样先经 FIR 抗混叠，
+    再由 audioop.ratecv 做任意比例插值；无 audioop 时退化为线性插值。
+    """
+    def __init__(self, in_rate: int, out_rate: int):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self._anti_alias = PolyphaseResampler(in_rate, in_rate, cutoff_rate=out_rate) if out_rate < in_rate else None
+        self.reset()
+
+    def reset(self):
+        self._state = None
+        self._position = 0.0
+        self._last_sample = 0
+        if self._anti_alias:
+            self._anti_alias.reset()
+
+    def process(self, pcm: bytes) -> bytes:
+        if self._anti_alias:
+            pcm = self._anti_alias.process(pcm)
+        if not pcm:
+            return b""
+        if audioop:
+            out, self._state = audioop.ratecv(pcm, 2, 1, self.in_rate, self.out_rate, self._state)
+            return out
+        samples = array('h', pcm)
+        step = self.in_rate / self.out_rate
+        out = array('h')
+        position = self._position
+        previous = self._last_sample
+        while position < len(samples):
+            index = int(position)
+            frac = position - index
+            left = samples[index - 1] if index > 0 else previous
+            out.append(int(left + (samples[index] - left) * frac))
+            position += step
+        self._position = position - len(samples)
+        self._last_sample = samples[-1]
+        return out.tobytes()
+
+def create_resampler(in_rate: int, out_rate: int):
+    if in_rate == out_rate:
+        return PassthroughResampler()
+    if out_rate // math.gcd(in_rate, out_rate) <= RESAMPLER_MAX_POLYPHASE_PHASES:
+        return PolyphaseResampler(in_rate, out_rate)
+    return RatecvResampler(in_rate, out_rate)
+
+class FractionalResampler:
+    """
+    比例接近 1 且随时变化的流式重采样，用于时钟漂移补偿。按 FRACTIONAL_BLOCK_SAMPLES 分块，
+    块内分数延迟视为常数，以 audioop 两次乘加完成线性插值；输出样本数按比例累积取整。
+    """
+    FRACTIONAL_BLOCK_SAMPLES = 32
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._pending = array('h')
+        self._position = 0.0
+        self._carry = 0.0
+
+    def process(self, pcm: bytes, ratio: float) -> bytes:
+        if ratio == 1.0 and not self._pending and self._position == 0.0:
+            return pcm
+        buf = self._pending + array('h', pcm)
+        wanted = len(pcm) // 2 * ratio + self._carry
+        # 保证最后一个输出样本的右邻点仍在 buf 内
+        count = min(int(wanted), int((len(buf) - 1 - self._position) * ratio))
+        if count <= 0:
+            self._pending = buf
+            return b""
+        self._carry = wanted - count
+        step = 1.0 / ratio
+        position = self._position
+        parts = []
+        remaining = count
+        while remaining > 0:
+            size = min(self.FRACTIONAL_BLOCK_SAMPLES, remaining)
+            index = int(position)
+            frac = position - index
+            head = buf[index:index + size]
+            tail = buf[index + 1:index + size + 1]
+            if audioop:
+                parts.append(audioop.add(audioop.mul(head.tobytes(), 2, 1.0 - frac), audioop.mul(tail.tobytes(), 2, frac), 2))
+            else:
+                parts.append(array('h', [int(a + (b - a) * frac) for a, b in zip(head, tail)]).tobytes())
+            position += size * step
+            remaining -= size
+        consumed = int(position)
+        self._pending = buf[consumed:]
+        self._position = position - consumed
+        return b"".join(parts)
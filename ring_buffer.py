@@ -0,0 +1,94 @@
+import threading
+
+class AudioRingBuffer:
+    """
+    单生产者/单消费者字节环形缓冲。存储区预先分配；写索引只由生产者修改、读索引只由消费者修改，
+    因此 PortAudio 回调线程与发送/播放线程之间无需加锁。
+    """
+    def __init__(self, capacity_bytes: int):
+        capacity = 1
+        while capacity < capacity_bytes:
+            capacity <<= 1
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._storage = bytearray(capacity)
+        self._view = memoryview(self._storage)
+        self._write_pos = 0
+        self._read_pos = 0
+        self._data_available = threading.Event()
+        self._woken = False
+        self.overflow_bytes = 0
+        self.underflow_bytes = 0
+
+    def available(self) -> int:
+        return self._write_pos - self._read_pos
+
+    def free_space(self) -> int:
+        return self.capacity - (self._write_pos - self._read_pos)
+
+    def write(self, data) -> int:
+        size = len(data)
+        free = self.capacity - (self._write_pos - self._read_pos)
+        if size > free:
+            self.overflow_bytes += size - free
+            size = free
+        if size <= 0:
+            return 0
+        start = self._write_pos & self._mask
+        first = min(size, self.capacity - start)
+        src = memoryview(data)
+        self._view[start:start + first] = src[:first]
+        if first < size:
+            self._view[:size - first] = src[first:size]
+        self._write_pos += size
+        self._data_available.set()
+        return size
+
+    def read_into(self, out_view) -> int:
+        size = min(len(out_view), self._write_pos - self._read_pos)
+        if size <= 0:
+            return 0
+        start = self._read_pos & self._mask
+        first = min(size, self.capacity - start)
+        out_view[:first] = self._view[start:start + first]
+        if first < size:
+            out_view[first:size] = self._view[:size - first]
+        self._read_pos += size
+        return size
+
+    def wait_available(self, size: int, timeout: float = None) -> bool:
+        """阻塞直到至少有 size 字节可读；超时或被 wake() 唤醒时返回 False。"""
+        while self._write_pos - self._read_pos < size:
+            self._data_available.clear()
+            if self._write_pos - self._read_pos >= size:
+                break
+            if not self._data_available.wait(timeout) or self._woken:
+                self._woken = False
+                return False
+        return True
+
+    def read_exact(self, size: int, timeout: float = None):
+        """阻塞直到可读出 size 字节并返回新分配的 bytearray；超时返回 None。热路径应复用缓冲：wait_available + read_into。"""
+        if not self.wait_available(size, timeout):
+            return None
+        out = bytearray(size)
+        self.read_into(out)
+        return out
+
+    def fill_or_silence(self, out_view) -> None:
+        """供输出回调使用：数据不足时余下部分以静音补齐。"""
+        got = self.read_into(out_view)
+        if got < len(out_view):
+            self.underflow_bytes += len(out_view) - got
+            out_view[got:] = bytes(len(out_view) - got)
+
+    def discard_all(self) -> int:
+        dropped = self._write_pos - self._read_pos
+        self._read_pos += dropped
+        self._woken = False
+        return dropped
+
+    def wake(self):
+        """唤醒正在 wait_available/read_exact 中等待的消费者，使其立即返回。"""
+        self._woken = True
+        self._data_available.set()
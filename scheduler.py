@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable
+
+from config import *
+from async_transport import EventLoopThread, shared_event_loop
+
+class Scheduler:
+    """
+    协议核心使用的时钟与定时器。call_later 返回带 cancel() 的句柄，可在任意线程调用；
+    同一调度器的回调在同一线程上串行执行。now() 为单调时钟 (秒)。
+    """
+    def now(self) -> float:
+        return time.monotonic()
+
+    def call_later(self, delay_s: float, callback: Callable, *args):
+        raise NotImplementedError
+
+    def call_soon(self, callback: Callable, *args):
+        return self.call_later(0, callback, *args)
+
+    def stop(self):
+        pass
+
+class _TkTimer:
+    __slots__ = ("_master", "_after_id")
+
+    def __init__(self, master, after_id: str):
+        self._master = master
+        self._after_id = after_id
+
+    def cancel(self):
+        self._master.after_cancel(self._after_id)
+
+class TkScheduler(Scheduler):
+    """Tk 主循环的 after：回调在 UI 线程执行，主循环繁忙时随之推迟。"""
+    def __init__(self, master):
+        self.master = master
+
+    def call_later(self, delay_s: float, callback: Callable, *args) -> _TkTimer:
+        return _TkTimer(self.master, self.master.after(int(delay_s * 1000), callback, *args))
+
+class EventLoopScheduler(Scheduler):
+    """网络事件循环 (asyncio) 上的定时器；与 asyncio 传输的收包回调在同一线程。"""
+    def __init__(self, event_loop: EventLoopThread):
+        self.event_loop = event_loop
+
+    def now(self) -> float:
+        return self.event_loop.loop.time()
+
+    def call_later(self, delay_s: float, callback: Callable, *args):
+        return self.event_loop.call_later(delay_s, callback, *args)
+
+class _ThreadTimer:
+    __slots__ = ("callback", "args", "cancelled")
+
+    def __init__(self, callback: Callable, args: tuple):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class TimerThreadScheduler(Scheduler):
+    """独立守护线程上的定时器堆。已取消的定时器留在堆中，到期时直接丢弃。"""
+    def __init__(self, log_callback=None, name: str = "SignalTimerThread"):
+        self.log = log_callback
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def call_later(self, delay_s: float, callback: Callable, *args) -> _ThreadTimer:
+        timer = _ThreadTimer(callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + max(0.0, delay_s), next(self._counter), timer))
+            if self._heap[0][2] is timer:
+                self._condition.notify()
+        return timer
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._condition.notify()
+        if self._thread.is_alive() and threading.current_thread() is not self._thread:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay_s = self._heap[0][0] - time.monotonic()
+                    if delay_s <= 0:
+                        timer = heapq.heappop(self._heap)[2]
+                        break
+                    self._condition.wait(delay_s)
+            if timer.cancelled:
+                continue
+            timer.cancelled = True
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                # 一个回调出错不能让定时线程退出，否则之后所有重传都不会再发生
+                if self.log:
+                    self.log(f"定时器回调 {getattr(timer.callback, '__name__', timer.callback)} 出错: {e}", is_error=True)
+
+def create_scheduler(kind: str, log_callback, master=None) -> Scheduler:
+    """按 SIGNALING_SCHEDULER 创建调度器；"auto" 在 asyncio 传输下用网络事件循环，否则用独立定时线程。"""
+    if kind == "tk":
+        if master is None:
+            raise ValueError("Tk 调度器需要主窗口")
+        return TkScheduler(master)
+    if kind == "asyncio" or (kind == "auto" and NETWORK_TRANSPORT == "asyncio"):
+        return EventLoopScheduler(shared_event_loop(log_callback))
+    if kind in ("auto", "thread"):
+        return TimerThreadScheduler(log_callback)
+    raise ValueError(f"未知的调度器类型: {kind}")
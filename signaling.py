@@ -0,0 +1,41 @@
+import struct
+
+from models import PacketType, SignalType
+
+# 二进制信令帧: 标记字节 '_' (与旧版 ASCII 信令首字节相同，接收端对媒体包只需比较一个字节)，
+# 版本字节 (最高位为 1，不会与旧版信令的第二个 '_' 混淆)，包类型，会话 ID，消息 ID (0 表示不需要确认)；其后为载荷
+SIGNAL_MARKER = 0x5F
+SIGNAL_PROTOCOL_VERSION = 2
+SIGNAL_VERSION_BYTE = 0x80 | SIGNAL_PROTOCOL_VERSION
+SIGNAL_HEADER = struct.Struct("!BBBIH")
+
+# 与二进制对端之间需要确认、会重传的信令；其余 (对请求的应答、周期性报告) 丢失了也无需重传
+RELIABLE_PACKET_TYPES = frozenset({PacketType.CALL_ACCEPTED, PacketType.HANGUP, PacketType.SPEAKER_STATUS})
+# 旧版对端只对这两种信令回应 ACK，可靠层以收到对应 ACK 为确认
+LEGACY_ACKNOWLEDGED_PACKET_TYPES = frozenset({PacketType.CALL_REQUEST, PacketType.HANGUP})
+
+# 与旧版对端通信时各包类型对应的 ASCII 信令
+_LEGACY_SIGNALS = {
+    PacketType.CALL_REQUEST: SignalType.CALL_REQUEST_SIGNAL_PREFIX,
+    PacketType.ACK_CALL_REQUEST: SignalType.ACK_CALL_REQUEST_SIGNAL,
+    PacketType.CALL_ACCEPTED: SignalType.CALL_ACCEPTED_SIGNAL,
+    PacketType.HANGUP: SignalType.HANGUP_SIGNAL,
+    PacketType.ACK_HANGUP: SignalType.ACK_HANGUP_SIGNAL,
+    PacketType.SPEAKER_STATUS: SignalType.SPEAKER_STATUS_SIGNAL_PREFIX,
+    PacketType.RECEIVER_REPORT: SignalType.RECEIVER_REPORT_SIGNAL_PREFIX,
+}
+
+def build_signal(packet_type: PacketType, session_id: int, payload: bytes = b"", message_id: int = 0) -> bytes:
+    return SIGNAL_HEADER.pack(SIGNAL_MARKER, SIGNAL_VERSION_BYTE, packet_type, session_id, message_id) + payload
+
+def build_legacy_signal(packet_type: PacketType, payload: bytes = b"") -> bytes:
+    prefix = _LEGACY_SIGNALS[packet_type].value
+    if payload and not prefix.endswith(b":"):
+        # 旧版接听信令的应答以 ':' 与信令名分隔
+        return prefix + b":" + payload
+    return prefix + payload
+
+def legacy_signal_name(data: bytes) -> bytes:
+    """旧版信令的名称部分 (b"__NAME__")，用作分发表的键；前缀信令的 ':' 与载荷不在其中。"""
+    end = data.find(b"__", 2)
+    return data[:end + 2] if end > 0 else data
@@ -1,29 +1,56 @@
 from __future__ import annotations
+import os
 import threading
 import time
-import struct
-from typing import TYPE_CHECKING, Callable, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
-from models import AppState, SignalType
+from models import AppState, CandidateType, ConnectivityStrategy, PacketType, RedundancyMode
 from config import *
-from utils import resource_path
-import winsound
+from utils import resource_path, sequence_delta
+from audio_codec import (AudioCodec, choose_cheapest_codec, create_codec, create_codec_by_payload_type, create_preferred_codec,
+                         offered_codec_names)
+from media_packet import (AUDIO_HEADER, BUNDLE_PAYLOAD_TYPE, COMFORT_NOISE_PAYLOAD_TYPE, FEC_PAYLOAD_TYPE,
+                          LEGACY_AUDIO_HEADER, RED_PAYLOAD_TYPE, parse_audio_packet, parse_bundle_payload,
+                          parse_legacy_audio_packet, parse_red_payload)
+from fec import RECEIVER_REPORT_PAYLOAD, FecController, FecDecoder, FecEncoder, LossMonitor, RedEncoder
+from packetization import MediaBundler, PacketizationController
+from candidates import CHECK_TRANSACTION_ID_SIZE, Candidate
+from signaling import (LEGACY_ACKNOWLEDGED_PACKET_TYPES, RELIABLE_PACKET_TYPES, SIGNAL_PROTOCOL_VERSION, build_legacy_signal,
+                       build_signal)
+from reliable_signaling import ReliableSignaling
+from scheduler import Scheduler, create_scheduler
+from voice_activity import SID_PAYLOAD, VoiceActivityDetector
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
 
 if TYPE_CHECKING:
     import customtkinter as ctk
     from audio_manager import AudioManager
-    from network_manager import NetworkManager
+    from network_manager import MediaSender, NetworkManager
+
+# 快速接通：在这些状态下提前打开音频流
+PREWARM_MEDIA_STATES = (AppState.CALL_INCOMING_RINGING, AppState.CALL_OUTGOING_WAITING_ACCEPTANCE)
 
 class CallStateManager:
+    """
+    通话状态机。协议定时器 (重传、界面复位) 全部经由 scheduler，不依赖 Tk 主循环；界面操作与收到的信令
+    也由 EventHandler 经 scheduler 投递，通话状态只在调度器线程上改变。
+    master_ref 只用于把状态变化投递到 UI 线程，为 None 时直接回调 (无界面运行)。
+    """
     def __init__(
         self,
-        master_ref: ctk.CTk,
+        master_ref: Optional[ctk.CTk],
         audio_manager_ref: AudioManager,
         network_manager_ref: NetworkManager,
         state_change_callback: Callable,
         log_callback: Callable,
+        scheduler: Optional[Scheduler] = None,
     ):
         self.master = master_ref
+        self.scheduler = scheduler or create_scheduler(SIGNALING_SCHEDULER, log_callback, master_ref)
         self.audio_manager = audio_manager_ref
         self.network_manager = network_manager_ref
         self.on_state_changed = state_change_callback
@@ -34,17 +61,57 @@ class CallStateManager:
         self.peer_address_for_call_attempt: Optional[Tuple[str, int]] = None
         self.current_hangup_target_address: Optional[Tuple[str, int]] = None
         self.pending_call_rejection_ack_address: Optional[Tuple[str, int]] = None
-        self.hangup_retry_count: int = 0
+        self.peer_candidates: List[Candidate] = []
+        # 经中继通话时的中继地址，回到空闲时通知中继解除配对
+        self.relayed_peer_address: Optional[Tuple[str, int]] = None
+        self._relay_fallback_tried = False
+        # 信令会话：会话 ID 由主叫在呼叫请求中给出；对方支持二进制信令时，发往 signal_peer_address 的信令使用二进制帧
+        self.session_id: int = 0
+        self.peer_signal_version: int = 0
+        self.signal_peer_address: Optional[Tuple[str, int]] = None
         
         self.send_thread: Optional[threading.Thread] = None
+        # 串行化音频流的打开/关闭：预热线程与通话建立可能同时操作设备
+        self._media_lock = threading.Lock()
+        # 接听 (本端点击或收到对方接听) 的时刻，首个音频数据报发出时据此记录接通耗时
+        self._accepted_at: Optional[float] = None
         self.send_sequence_number: int = 0
+        self.tx_codec: Optional[AudioCodec] = None
+        self.rx_codecs: Dict[int, AudioCodec] = {}
+        self.vad = VoiceActivityDetector()
+        self.fec_encoder = FecEncoder()
+        self.fec_decoder = FecDecoder()
+        self.fec_controller = FecController(log_callback)
+        self.loss_monitor = LossMonitor()
+        self.red_encoder = RedEncoder()
+        self._last_receiver_report_time: float = 0.0
+        self._redundancy_playout_span: int = 0
+        self.bundler = MediaBundler()
+        self.media_sender: Optional[MediaSender] = None
+        self.packetization = PacketizationController(log_callback)
+        self._peer_packetization_frames: int = 1
+        self._last_bundle_time: Optional[float] = None
+        self._pending_parity_packets: list = []
+        self.media_mode: RedundancyMode = RedundancyMode.LEGACY
+        self.peer_offered_redundancy_modes: Optional[list] = None
+        self.peer_offered_wire_rates: list = []
+        self.peer_offered_codecs: list = []
+        self.peer_max_packet_frames: Optional[int] = None
         
         self.peer_wants_to_receive_audio: bool = True
         self.my_speaker_switch_is_on: bool = True
 
-        self.call_request_ack_timer_id: Optional[str] = None
-        self.hangup_ack_timer_id: Optional[str] = None
-        self.final_idle_status_timer_id: Optional[str] = None
+        self.final_idle_status_timer_id = None
+        # 呼叫请求、挂断等控制消息的重传与确认
+        self.reliable_signaling = ReliableSignaling(self.network_manager.send_packet, self._schedule_timer, self._cancel_timer, log_callback,
+                                                    clock=self.scheduler.now)
+
+    def _schedule_timer(self, delay_ms: int, callback, *args):
+        return self.scheduler.call_later(delay_ms / 1000, callback, *args)
+
+    def _cancel_timer(self, timer):
+        if timer is not None:
+            timer.cancel()
 
     def set_app_state(self, new_state: AppState, reason="", peer_address_tuple=None, associated_data=None):
         old_state = self.app_state
@@ -55,12 +122,21 @@ class CallStateManager:
         self.log(f"状态从 {old_state.name} 变为 {new_state.name}. 原因: '{reason}' "
                  f"对方: {peer_address_tuple if peer_address_tuple else 'N/A'}")
 
+        if new_state == AppState.IDLE:
+            self._release_relay()
+
         if new_state == AppState.IN_CALL and old_state != AppState.IN_CALL:
             self._start_in_call_media()
         elif old_state == AppState.IN_CALL and new_state != AppState.IN_CALL:
             self._stop_in_call_media()
+        elif new_state in PREWARM_MEDIA_STATES and old_state not in PREWARM_MEDIA_STATES:
+            self._prewarm_media()
+        elif old_state in PREWARM_MEDIA_STATES and new_state not in PREWARM_MEDIA_STATES:
+            self._release_prewarmed_media()
 
-        if self.master.winfo_exists():
+        if self.master is None:
+            self.on_state_changed(new_state, reason, peer_address_tuple, associated_data)
+        elif self.master.winfo_exists():
             self.master.after(0, self.on_state_changed, new_state, reason, peer_address_tuple, associated_data)
         elif self.app_state != AppState.CALL_ENDED_APP_CLOSING:
              self.log(f"Master window does not exist, UI not updated for state {new_state.name}", is_warning=True)
@@ -78,14 +154,9 @@ class CallStateManager:
         ]:
             if self.current_hangup_target_address is not None:
                 self.log(f"用户尝试新呼叫，取消对 {self.current_hangup_target_address} 的先前挂断/拒绝后台静默重试。")
-                if self.hangup_ack_timer_id is not None:
-                    self.master.after_cancel(self.hangup_ack_timer_id)
-                    self.hangup_ack_timer_id = None
-                self.current_hangup_target_address = None
-                self.pending_call_rejection_ack_address = None
-                self.hangup_retry_count = 0
+                self._cancel_hangup_wait()
             
-            self.master.after(50, self._initiate_call_sequence, peer_ip, peer_port, is_peer_info_valid, is_audio_ready, is_network_ready)
+            self._initiate_call_sequence(peer_ip, peer_port, is_peer_info_valid, is_audio_ready, is_network_ready)
         else:
             self.log(f"呼叫/挂断按钮按下，但应用状态 ({self.app_state.name}) 不支持操作。")
 
@@ -113,37 +184,6 @@ class CallStateManager:
         else:
             self.log(f"拒绝按钮按下，但应用状态 ({self.app_state.name}) 不正确。忽略。", is_warning=True)
 
-    def handle_call_request_ack_timeout(self):
-        self.call_request_ack_timer_id = None 
-        if self.app_state == AppState.CALL_INITIATING_REQUEST:
-            peer_addr_attempted = self.peer_address_for_call_attempt if self.peer_address_for_call_attempt else ("未知对方", 0)
-            reason = f"呼叫请求失败 ({peer_addr_attempted[0]}) - 无应答"
-            self._handle_call_error(reason, peer_addr_attempted)
-        else:
-            self.log(f"呼叫请求ACK超时，但状态为 {self.app_state.name}。忽略。")
-
-    def handle_hangup_ack_timeout(self):
-        self.hangup_ack_timer_id = None 
-
-        if not self.current_hangup_target_address or self.app_state == AppState.CALL_ENDED_APP_CLOSING:
-            if self.current_hangup_target_address:
-                self.current_hangup_target_address = None
-                self.pending_call_rejection_ack_address = None
-            return
-
-        target_address_for_retry = self.current_hangup_target_address
-        is_reject_retry = (self.pending_call_rejection_ack_address == target_address_for_retry)
-        
-        self.hangup_retry_count += 1 
-        self.log(f"等待来自 {target_address_for_retry} 的{'拒绝' if is_reject_retry else '挂断'}ACK超时。静默后台重试次数: {self.hangup_retry_count}")
-
-        if self.network_manager.send_packet(SignalType.HANGUP_SIGNAL.value, target_address_for_retry):
-            self.hangup_ack_timer_id = self.master.after(HANGUP_ACK_TIMEOUT_MS, self.handle_hangup_ack_timeout)
-        else:
-            self.log(f"后台静默重试发送信号失败 (NetworkManager). 将停止此轮对此目标的重试。", is_error=True)
-            self.current_hangup_target_address = None
-            self.pending_call_rejection_ack_address = None
-
     def handle_app_closing(self):
         target_address = self._determine_hangup_target_address()
         is_call_active = self.app_state in [
@@ -154,61 +194,84 @@ class CallStateManager:
         if target_address and is_call_active:
             self.log("App closing during active call. Attempting one-time HANGUP signal.")
             self._cleanup_active_call_resources()
-            self.network_manager.send_packet(SignalType.HANGUP_SIGNAL.value, target_address)
+            self._send_signal(PacketType.HANGUP, target_address)
 
     def cleanup_for_closing(self):
         self.set_app_state(AppState.CALL_ENDED_APP_CLOSING, reason="应用程序关闭")
-        timers_to_cancel = [self.call_request_ack_timer_id, self.hangup_ack_timer_id, self.final_idle_status_timer_id]
-        for timer_id in timers_to_cancel:
-            if timer_id:
-                try:
-                    self.master.after_cancel(timer_id)
-                except Exception:
-                    pass
+        try:
+            self.reliable_signaling.cancel_all()
+            if self.final_idle_status_timer_id:
+                self._cancel_timer(self.final_idle_status_timer_id)
+        except Exception:
+            pass
         
         if self.send_thread and self.send_thread.is_alive():
             self.log("关闭：等待发送线程停止...")
             self.send_thread.join(timeout=0.5)
+        self.scheduler.stop()
 
     def handle_ack_hangup_signal(self, addr):
         if self.current_hangup_target_address and addr == self.current_hangup_target_address:
-            self.log(f"收到来自 {addr} 的挂断/拒绝ACK。停止后台静默重试。")
-            if self.hangup_ack_timer_id is not None:
-                self.master.after_cancel(self.hangup_ack_timer_id)
-                self.hangup_ack_timer_id = None
-
-            acked_peer_addr = self.current_hangup_target_address
-            self.current_hangup_target_address = None
-            self.pending_call_rejection_ack_address = None
-            self.hangup_retry_count = 0
-
-            if self.app_state.name.startswith("CALL_ENDED_") and self.final_idle_status_timer_id is None:
-                self._simple_reset_call_vars_and_set_state("", AppState.IDLE, acked_peer_addr)
+            self.reliable_signaling.acknowledge(PacketType.HANGUP)
         else:
             self.log(f"收到来自 {addr} 的意外挂断ACK。", is_warning=True)
 
+    def handle_signal_ack(self, addr, message_id: int):
+        self.reliable_signaling.acknowledge_message(message_id)
+
+    def _on_hangup_wait_finished(self, target_address, acknowledged: bool):
+        if self.current_hangup_target_address != target_address:
+            return
+        if acknowledged:
+            self.log(f"收到来自 {target_address} 的挂断/拒绝ACK。停止后台静默重试。")
+        self.current_hangup_target_address = None
+        self.pending_call_rejection_ack_address = None
+        if self.app_state.name.startswith("CALL_ENDED_") and self.final_idle_status_timer_id is None:
+            self._simple_reset_call_vars_and_set_state("", AppState.IDLE, target_address)
+
+    def _cancel_hangup_wait(self):
+        self.reliable_signaling.cancel(PacketType.HANGUP)
+        self.current_hangup_target_address = None
+        self.pending_call_rejection_ack_address = None
+
     def handle_ack_call_request_signal(self, addr):
         if self.app_state == AppState.CALL_INITIATING_REQUEST and self.peer_address_for_call_attempt and addr == self.peer_address_for_call_attempt:
             self.log(f"收到来自 {addr} 的呼叫请求ACK。")
-            if self.call_request_ack_timer_id is not None:
-                self.master.after_cancel(self.call_request_ack_timer_id)
-                self.call_request_ack_timer_id = None
+            self.reliable_signaling.acknowledge(PacketType.CALL_REQUEST)
             self._proceed_with_call_setup(is_accepting_call=False)
         else:
             self.log(f"收到来自 {addr} 的意外呼叫请求ACK。", is_warning=True)
 
-    def handle_call_accepted_signal(self, addr):
+    def handle_call_accepted_signal(self, addr, payload=b""):
+        if self.app_state == AppState.CALL_INITIATING_REQUEST and addr == self.peer_address_for_call_attempt:
+            # 呼叫请求的 ACK 丢失而接听先到：接听本身即表明对方已收到请求
+            self.handle_ack_call_request_signal(addr)
         if self.app_state == AppState.CALL_OUTGOING_WAITING_ACCEPTANCE and self.peer_full_address and addr == self.peer_full_address:
             self.log(f"收到来自 {addr} 的呼叫接听确认。")
+            self._accepted_at = time.monotonic()
+            self.media_mode = self._parse_redundancy_answer(payload)
+            answered_rates = self._parse_wire_rates(payload)
+            self._configure_wire_rate(answered_rates[0] if answered_rates else PYAUDIO_RATE)
+            # 被叫从本端提供的列表中选定编解码器，双方都用它发送；不带 codec 项的应答沿用本端偏好
+            answered_codecs = self._parse_codec_offer(payload)
+            codec = create_codec(answered_codecs[0]) if answered_codecs else None
+            if codec is not None:
+                self.tx_codec = codec
+            max_frames = self._parse_max_packet_frames(payload)
+            if max_frames:
+                self.packetization.limit_frames(max_frames)
+            self._log_negotiated_media()
             self._play_notification_sound(SOUND_CALL_CONNECTED)
             self._send_my_speaker_status()
             self.set_app_state(AppState.IN_CALL, reason=f"对方 {addr[0]} 已接听", peer_address_tuple=self.peer_full_address)
         else:
             self.log(f"收到来自 {addr} 的意外接听确认。", is_warning=True)
 
-    def handle_hangup_signal(self, addr):
+    def handle_hangup_signal(self, addr, session_id: Optional[int] = None):
         self.log(f"收到来自 {addr} 的 HANGUP_SIGNAL。")
-        self.network_manager.send_packet(SignalType.ACK_HANGUP_SIGNAL.value, addr)
+        if session_id is None:
+            # 二进制挂断已在收包时由可靠层确认；旧版挂断 (包括本端尚未得知对方版本时主叫发出的) 回旧版 ACK
+            self.network_manager.send_packet(build_legacy_signal(PacketType.ACK_HANGUP), addr)
 
         current_call_peer_addr = self._determine_hangup_target_address()
         is_relevant = (current_call_peer_addr and addr == current_call_peer_addr) or \
@@ -224,7 +287,7 @@ class CallStateManager:
         else:
             self.log(f"收到的挂断信号与当前通话无关，忽略。", is_warning=True)
 
-    def handle_call_request_signal(self, addr):
+    def handle_call_request_signal(self, addr, payload=b"", session_id: Optional[int] = None):
         eligible_states = [
             AppState.IDLE, AppState.GETTING_PUBLIC_IP_FAILED,
             AppState.CALL_ENDED_LOCALLY_HUNG_UP, AppState.CALL_ENDED_PEER_HUNG_UP,
@@ -232,16 +295,30 @@ class CallStateManager:
             AppState.CALL_ENDED_REQUEST_FAILED
         ]
         if self.app_state not in eligible_states:
+            if self.app_state == AppState.CALL_INCOMING_RINGING and addr == self.peer_full_address:
+                # 主叫重传的呼叫请求 (本端的 ACK 丢失)：再次确认即可
+                self._send_signal(PacketType.ACK_CALL_REQUEST, addr)
+                return
             self.log(f"当前状态 ({self.app_state.name}) 忙，忽略来自 {addr} 的呼叫请求。", is_warning=True)
-            self.network_manager.send_packet(SignalType.ACK_CALL_REQUEST_SIGNAL.value, addr)
+            self.network_manager.send_packet(build_legacy_signal(PacketType.ACK_CALL_REQUEST), addr)
             return
 
         if self.current_hangup_target_address:
-            if self.hangup_ack_timer_id: self.master.after_cancel(self.hangup_ack_timer_id)
-            self.current_hangup_target_address = None
+            self._cancel_hangup_wait()
 
-        if self.network_manager.send_packet(SignalType.ACK_CALL_REQUEST_SIGNAL.value, addr):
+        if session_id is None:
+            peer_signal_version, session_id = self._parse_signal_offer(payload)
+        else:
+            peer_signal_version = SIGNAL_PROTOCOL_VERSION
+        self._begin_signal_session(session_id or self._new_session_id(), peer_signal_version, addr)
+        if self._send_signal(PacketType.ACK_CALL_REQUEST, addr):
             self.peer_full_address = addr
+            if addr == self.network_manager.relay_address:
+                self.relayed_peer_address = addr
+            self.peer_offered_redundancy_modes = self._parse_redundancy_offer(payload)
+            self.peer_offered_wire_rates = self._parse_wire_rates(payload)
+            self.peer_offered_codecs = self._parse_codec_offer(payload)
+            self.peer_max_packet_frames = self._parse_max_packet_frames(payload)
             self._play_notification_sound(SOUND_CALL_CONNECTED) 
             self.set_app_state(AppState.CALL_INCOMING_RINGING, reason=f"收到来自 {addr[0]} 的呼叫", peer_address_tuple=addr)
         else:
@@ -250,14 +327,258 @@ class CallStateManager:
     def handle_audio_data(self, data, addr):
         if self.app_state == AppState.IN_CALL and self.peer_full_address and addr == self.peer_full_address:
             try:
-                if len(data) > 4:
-                    seq_num_bytes, audio_payload = data[:4], data[4:]
-                    received_seq_num, = struct.unpack("!I", seq_num_bytes)
-                    if audio_payload:
-                        self.audio_manager.write_chunk_to_speaker(audio_payload, received_seq_num)
+                if self.media_mode is RedundancyMode.LEGACY:
+                    parsed = parse_legacy_audio_packet(data)
+                    if parsed:
+                        received_seq_num, pcm = parsed
+                        self.audio_manager.enqueue_received_chunk(pcm, received_seq_num)
+                    return
+                self._handle_media_packet(data, time.monotonic())
             except Exception as e:
                 self.log(f"处理接收音频时发生错误: {e}", is_warning=True)
 
+    def _handle_media_packet(self, data: bytes, arrival_time: float):
+        parsed = parse_audio_packet(data)
+        if not parsed:
+            return
+        received_seq_num, payload_type, encoded_payload = parsed
+        if payload_type == BUNDLE_PAYLOAD_TYPE:
+            self._handle_media_bundle(encoded_payload, arrival_time)
+            return
+        recovered = []
+        if payload_type == FEC_PAYLOAD_TYPE:
+            recovered = self.fec_decoder.add_parity(received_seq_num, encoded_payload)
+            self._update_redundancy_playout_depth(self.fec_decoder.last_block_span)
+        elif payload_type == RED_PAYLOAD_TYPE:
+            distance, frames = parse_red_payload(received_seq_num, encoded_payload, MAX_SEQ_NUM)
+            self._update_redundancy_playout_depth(distance)
+            if frames:
+                primary_seq_num, primary_type, primary_payload = frames[0]
+                self.loss_monitor.on_packet(primary_seq_num, primary_type == COMFORT_NOISE_PAYLOAD_TYPE)
+                self._deliver_media_payload(primary_seq_num, primary_type, primary_payload, arrival_time)
+                recovered = frames[1:]
+        else:
+            self.loss_monitor.on_packet(received_seq_num, payload_type == COMFORT_NOISE_PAYLOAD_TYPE)
+            self._deliver_media_payload(received_seq_num, payload_type, encoded_payload, arrival_time)
+            recovered = self.fec_decoder.add_data(received_seq_num, payload_type, encoded_payload)
+        for recovered_seq_num, recovered_payload_type, recovered_payload in recovered:
+            self._deliver_media_payload(recovered_seq_num, recovered_payload_type, recovered_payload)
+
+    def _handle_media_bundle(self, bundle_payload: bytes, arrival_time: float):
+        frames_per_packet, packets = parse_bundle_payload(bundle_payload)
+        if not packets:
+            return
+        self._last_bundle_time = arrival_time
+        self._update_peer_packetization(frames_per_packet)
+        packets = [packet for packet in packets if len(packet) > AUDIO_HEADER.size]
+        if not packets:
+            return
+        last_seq_num, = LEGACY_AUDIO_HEADER.unpack_from(packets[-1])
+        for packet in packets:
+            # 同一数据报中较早采集的帧按采集间隔回推到达时间，使抖动估计只反映网络抖动
+            seq_num, = LEGACY_AUDIO_HEADER.unpack_from(packet)
+            frame_offset = max(0, sequence_delta(last_seq_num, seq_num, MAX_SEQ_NUM))
+            self._handle_media_packet(packet, arrival_time - frame_offset * self.audio_manager.frame_duration_s)
+
+    def _deliver_media_payload(self, seq_num: int, payload_type: int, encoded_payload: bytes, arrival_time: Optional[float] = None):
+        if payload_type == COMFORT_NOISE_PAYLOAD_TYPE:
+            if len(encoded_payload) >= SID_PAYLOAD.size:
+                level_rms, = SID_PAYLOAD.unpack_from(encoded_payload)
+                self.audio_manager.enqueue_comfort_noise(level_rms, seq_num)
+            return
+        codec = self._get_rx_codec(payload_type)
+        if codec:
+            self.audio_manager.enqueue_received_chunk(codec.decode(encoded_payload), seq_num, arrival_time)
+
+    def _update_redundancy_playout_depth(self, span: int):
+        if span != self._redundancy_playout_span:
+            self._redundancy_playout_span = span
+            self._apply_playout_minimum_depth()
+            self.log(f"对方冗余跨度为 {span} 帧，抖动缓冲最小深度随之调整。")
+
+    def _update_peer_packetization(self, frames_per_packet: int):
+        frames_per_packet = max(1, frames_per_packet)
+        if frames_per_packet != self._peer_packetization_frames:
+            self._peer_packetization_frames = frames_per_packet
+            self._apply_playout_minimum_depth()
+            self.log(f"对方每包帧数为 {frames_per_packet}，抖动缓冲最小深度随之调整。")
+
+    def _apply_playout_minimum_depth(self):
+        # 聚合发送时一个数据报间隔内要播放 frames_per_packet 帧，缓冲至少需容纳这么多帧
+        self.audio_manager.jitter_buffer.set_minimum_depth(max(self._redundancy_playout_span, self._peer_packetization_frames) + 1)
+
+    @staticmethod
+    def _offer_tokens(payload: bytes) -> list:
+        return [token.strip() for token in payload.decode('ascii', errors='ignore').split(',') if token.strip()]
+
+    @classmethod
+    def _parse_redundancy_offer(cls, payload: bytes) -> Optional[list]:
+        if not payload:
+            return None
+        offered = []
+        for token in cls._offer_tokens(payload):
+            try:
+                offered.append(RedundancyMode(token))
+            except ValueError:
+                continue
+        return offered
+
+    @classmethod
+    def _parse_redundancy_answer(cls, payload: bytes) -> RedundancyMode:
+        offered = cls._parse_redundancy_offer(payload)
+        return offered[0] if offered else RedundancyMode.LEGACY
+
+    @classmethod
+    def _parse_wire_rates(cls, payload: bytes) -> list:
+        rates = []
+        for token in cls._offer_tokens(payload):
+            key, _, value = token.partition('=')
+            if key == "rate" and value.isdigit() and 8000 <= int(value) <= 96000:
+                rates.append(int(value))
+        return rates
+
+    @classmethod
+    def _parse_codec_offer(cls, payload: bytes) -> list:
+        codecs = []
+        for token in cls._offer_tokens(payload):
+            key, _, value = token.partition('=')
+            if key == "codec" and value:
+                codecs.append(value)
+        return codecs
+
+    @classmethod
+    def _parse_max_packet_frames(cls, payload: bytes) -> Optional[int]:
+        for token in cls._offer_tokens(payload):
+            key, _, value = token.partition('=')
+            if key == "maxptime":
+                try:
+                    return max(1, int(float(value) / PACKETIZATION_FRAME_MS + 1e-6))
+                except ValueError:
+                    return None
+        return None
+
+    def _choose_codec(self) -> AudioCodec:
+        # 未提供编解码器列表的对端 (早于能力协商的版本) 沿用本端偏好，接收端按 payload_type 选择解码器
+        if self.peer_offered_codecs:
+            codec = choose_cheapest_codec(self.peer_offered_codecs, AUDIO_CODEC_PREFERENCE)
+            if codec is not None:
+                return codec
+        return create_preferred_codec(AUDIO_CODEC_PREFERENCE)
+
+    def _log_negotiated_media(self):
+        self.log(f"媒体协商结果: 冗余方式 {self.media_mode.value}, 线路采样率 {self.audio_manager.wire_rate}, "
+                 f"编码器 {self.tx_codec.name if self.media_mode is not RedundancyMode.LEGACY else '原始 PCM (旧版)'}, "
+                 f"每包最多 {self.packetization.peer_max_frames} 帧")
+
+    def _choose_wire_rate(self) -> int:
+        if self.media_mode is not RedundancyMode.LEGACY:
+            for rate in AUDIO_WIRE_RATE_PREFERENCE:
+                if rate in self.peer_offered_wire_rates:
+                    return rate
+        return PYAUDIO_RATE
+
+    def _configure_wire_rate(self, wire_rate: int):
+        # 旧版对端只认识固定的 PYAUDIO_RATE 原始 PCM
+        if self.media_mode is RedundancyMode.LEGACY:
+            wire_rate = PYAUDIO_RATE
+        self.audio_manager.configure_wire_rate(wire_rate)
+
+    def _choose_redundancy_mode(self) -> RedundancyMode:
+        if not self.peer_offered_redundancy_modes:
+            return RedundancyMode.LEGACY
+        for name in REDUNDANCY_MODE_PREFERENCE:
+            mode = RedundancyMode(name)
+            if mode in self.peer_offered_redundancy_modes:
+                return mode
+        return RedundancyMode.LEGACY
+
+    def handle_receiver_report_signal(self, payload, addr):
+        if self.app_state == AppState.IN_CALL and self.peer_full_address and addr == self.peer_full_address:
+            if len(payload) >= RECEIVER_REPORT_PAYLOAD.size:
+                loss_basis_points, = RECEIVER_REPORT_PAYLOAD.unpack_from(payload)
+                self.fec_controller.on_loss_report(loss_basis_points / 10000)
+                self.packetization.on_smoothed_loss(self.fec_controller.smoothed_loss)
+
+    def _maybe_send_receiver_report(self):
+        now = time.monotonic()
+        if now - self._last_receiver_report_time < FEC_REPORT_INTERVAL_S:
+            return
+        self._last_receiver_report_time = now
+        loss_fraction = self.loss_monitor.take_loss_fraction()
+        if loss_fraction is not None and self.peer_full_address and self.media_mode is not RedundancyMode.LEGACY:
+            self._send_signal(PacketType.RECEIVER_REPORT, self.peer_full_address, RECEIVER_REPORT_PAYLOAD.pack(int(loss_fraction * 10000)))
+        last_parity_time = self.fec_decoder.last_parity_time
+        if self.media_mode is RedundancyMode.FEC and self._redundancy_playout_span and last_parity_time \
+                and now - last_parity_time > FEC_PARITY_IDLE_RESET_S:
+            self._redundancy_playout_span = 0
+            self.fec_decoder.last_block_span = 0
+            self._apply_playout_minimum_depth()
+        if self._peer_packetization_frames > 1 and self._last_bundle_time \
+                and now - self._last_bundle_time > PACKETIZATION_IDLE_RESET_S:
+            self._update_peer_packetization(1)
+
+    def _get_rx_codec(self, payload_type: int) -> Optional[AudioCodec]:
+        codec = self.rx_codecs.get(payload_type)
+        if codec is None and payload_type not in self.rx_codecs:
+            codec = create_codec_by_payload_type(payload_type)
+            self.rx_codecs[payload_type] = codec
+            if codec:
+                self.log(f"接收端使用解码器: {codec.name} (payload_type={payload_type})")
+            else:
+                self.log(f"收到不支持的音频 payload_type={payload_type}，将丢弃此类音频包。", is_warning=True)
+        return codec
+
+    def handle_punch_signal(self, addr, is_ack: bool):
+        puncher = self.network_manager.hole_puncher
+        if puncher is None:
+            return
+        # 只接受当前通话对方、当前呼叫目标或本端正在打洞的地址；否则任何来源都能换掉保活目标
+        if addr != self.peer_full_address and addr != self.peer_address_for_call_attempt and not puncher.is_punching(addr):
+            self.log(f"忽略来自 {addr} 的打洞包: 不是当前对方，本端也未向其打洞。", is_warning=True)
+            return
+        puncher.on_punch(addr, is_ack)
+
+    def handle_punch_confirmed(self, address: Tuple[str, int]):
+        self.scheduler.call_soon(self._on_punch_confirmed, address)
+
+    def _on_punch_confirmed(self, address: Tuple[str, int]):
+        # 通话中的保活目标由 _start_in_call_media 登记为通话对方，不被打洞结果替换
+        keepalive = self.network_manager.keepalive
+        if keepalive and self.app_state != AppState.IN_CALL:
+            keepalive.set_target("peer", address)
+
+    def _stop_punching(self):
+        puncher = self.network_manager.hole_puncher
+        if puncher:
+            for address in {self.peer_full_address, self.peer_address_for_call_attempt} - {None}:
+                puncher.cancel(address)
+
+    def handle_check_signal(self, addr, transaction_id: bytes, is_response: bool):
+        checker = self.network_manager.connectivity_checker
+        if checker is None or len(transaction_id) != CHECK_TRANSACTION_ID_SIZE:
+            return
+        if is_response:
+            checker.on_response(addr, transaction_id)
+        else:
+            checker.on_request(addr, transaction_id)
+
+    def handle_relay_control(self, addr, data: bytes):
+        if self.network_manager.relay_client:
+            self.network_manager.relay_client.on_control(addr, data)
+
+    def set_peer_candidates(self, candidates: List[Candidate]):
+        self.peer_candidates = sorted(candidates, key=lambda c: c.priority, reverse=True)
+        self.log(f"对方候选地址: {self.peer_candidates}")
+
+    def prepare_path_to_peer(self, address: Tuple[str, int]):
+        """
+        向对方打洞。本端 NAT 只放行已联系过的地址时，对方的呼叫请求要等本端打洞包建立规则后才能进来；
+        行为探测表明本端可直接接收 (DIRECT) 时无需打洞。
+        """
+        puncher = self.network_manager.hole_puncher
+        if HOLE_PUNCH_ENABLED and puncher and self.network_manager.connectivity_strategy is not ConnectivityStrategy.DIRECT:
+            puncher.punch(address)
+
     def handle_speaker_status_signal(self, payload, addr):
         if self.app_state == AppState.IN_CALL and self.peer_full_address and addr == self.peer_full_address:
             if payload == b"ON":
@@ -281,15 +602,172 @@ class CallStateManager:
         if not is_network_ready: return
         if not is_peer_info_valid: return
 
-        self.peer_address_for_call_attempt = (peer_ip, int(peer_port))
+        self._release_relay()
+        self._relay_fallback_tried = False
+        self._begin_signal_session(self._new_session_id(), 0, None)
+        target = (peer_ip, int(peer_port))
+        self.peer_address_for_call_attempt = target
         self.set_app_state(AppState.CALL_INITIATING_REQUEST, reason=f"向 {self.peer_address_for_call_attempt} 发送呼叫请求", peer_address_tuple=self.peer_address_for_call_attempt)
 
-        self.call_request_ack_timer_id = self.master.after(CALL_REQUEST_ACK_TIMEOUT_MS, self.handle_call_request_ack_timeout)
+        checker = self.network_manager.connectivity_checker
+        candidates = self.peer_candidates if any(c.address == target for c in self.peer_candidates) else []
+        direct_candidates = [c for c in candidates if c.type is not CandidateType.RELAY]
+        if checker and (len(direct_candidates) > 1 or len(direct_candidates) < len(candidates)):
+            # 同一 NAT 后的双方可经局域网 host 候选直连，不必绕经路由器回流；检查完成后向 RTT 最低的地址呼叫，
+            # 全部无响应且对方有中继候选时改经中继
+            checker.check(direct_candidates, lambda best: self._schedule_timer(0, self._on_connectivity_checked, target, best))
+            return
+        self._send_call_request()
+
+    def _on_connectivity_checked(self, target: Tuple[str, int], best: Optional[Tuple[str, int]]):
+        if self.app_state != AppState.CALL_INITIATING_REQUEST or self.peer_address_for_call_attempt != target:
+            return
+        if best is None and self._try_relay_fallback(target, request_failed=False):
+            return
+        if best:
+            rtt_ms = self.network_manager.connectivity_checker.rtt_ms(best)
+            if rtt_ms is not None:
+                # 以检查测得的 RTT 作为首个样本，呼叫请求丢失时约一个 RTO 后即重传，而不是固定等待
+                self.reliable_signaling.observe_rtt(rtt_ms)
+        if best and best != target:
+            self.log(f"连通性检查选用 {best} 代替 {target}。")
+            self.peer_address_for_call_attempt = best
+        self._send_call_request()
+
+    def _try_relay_fallback(self, target: Tuple[str, int], request_failed: bool) -> bool:
+        relay_client = self.network_manager.relay_client
+        relay_candidate = next((c for c in self.peer_candidates if c.type is CandidateType.RELAY and c.token), None)
+        if self._relay_fallback_tried or relay_client is None or relay_candidate is None:
+            return False
+        self._relay_fallback_tried = True
+        self.log(f"无法直连 {target}，改经中继 {relay_candidate.address} 呼叫。", is_warning=True)
+        relay_client.connect(relay_candidate.address, relay_candidate.token,
+                             lambda relay_address: self._schedule_timer(0, self._on_relay_connected, target, relay_address, request_failed))
+        return True
+
+    def _on_relay_connected(self, target: Tuple[str, int], relay_address: Optional[Tuple[str, int]], request_failed: bool):
+        if self.app_state != AppState.CALL_INITIATING_REQUEST or self.peer_address_for_call_attempt != target:
+            if relay_address and self.network_manager.relay_client:
+                self.network_manager.relay_client.release(relay_address)
+            return
+        if relay_address is None:
+            if request_failed:
+                self._handle_call_error(f"呼叫请求失败 ({target[0]}) - 无应答", target)
+            else:
+                self._send_call_request()
+            return
+        self.peer_address_for_call_attempt = relay_address
+        self.relayed_peer_address = relay_address
+        self._send_call_request()
+
+    def _release_relay(self):
+        relayed_peer_address, self.relayed_peer_address = self.relayed_peer_address, None
+        if relayed_peer_address and self.network_manager.relay_client:
+            self.network_manager.relay_client.release(relayed_peer_address)
+
+    def _send_call_request(self):
+        target = self.peer_address_for_call_attempt
+        self.prepare_path_to_peer(target)
+        if not self._send_signal(PacketType.CALL_REQUEST, target, self._build_call_offer(),
+                                 on_failed=lambda: self._on_call_request_unanswered(target)):
+            self._transition_to_call_ended_state(AppState.CALL_ENDED_REQUEST_FAILED, "呼叫请求发送错误", target, cleanup_resources=False)
+
+    def _on_call_request_unanswered(self, target: Tuple[str, int]):
+        if self.app_state != AppState.CALL_INITIATING_REQUEST or self.peer_address_for_call_attempt != target:
+            return
+        if self._try_relay_fallback(target, request_failed=True):
+            return
+        self._handle_call_error(f"呼叫请求失败 ({target[0]}) - 无应答", target)
 
-        if not self.network_manager.send_packet(SignalType.CALL_REQUEST_SIGNAL_PREFIX.value, self.peer_address_for_call_attempt):
-            self.master.after_cancel(self.call_request_ack_timer_id)
-            self.call_request_ack_timer_id = None
-            self._transition_to_call_ended_state(AppState.CALL_ENDED_REQUEST_FAILED, "呼叫请求发送错误", self.peer_address_for_call_attempt, cleanup_resources=False)
+    def _build_call_offer(self) -> bytes:
+        # 呼叫请求始终用旧版 ASCII 格式：发出时还不知道对方是否支持二进制信令，旧版对端会忽略 sig/sid 项
+        offer = REDUNDANCY_MODE_PREFERENCE + [f"rate={rate}" for rate in AUDIO_WIRE_RATE_PREFERENCE]
+        offer += [f"codec={name}" for name in offered_codec_names(AUDIO_CODEC_PREFERENCE)]
+        offer += [f"maxptime={PACKETIZATION_MAX_FRAMES * PACKETIZATION_FRAME_MS:g}"]
+        offer += [f"sig={SIGNAL_PROTOCOL_VERSION}", f"sid={self.session_id:08x}"]
+        return ",".join(offer).encode('ascii')
+
+    def _build_call_answer(self) -> bytes:
+        # 只回应对方提供过的项：不认识某项的对端不会提供它，也就不必在应答中出现
+        if self.peer_offered_redundancy_modes is None:
+            return b""
+        answer = [self.media_mode.value]
+        if self.peer_offered_wire_rates:
+            answer.append(f"rate={self.audio_manager.wire_rate}")
+        if self.peer_offered_codecs:
+            answer.append(f"codec={self.tx_codec.name}")
+        if self.peer_max_packet_frames:
+            answer.append(f"maxptime={PACKETIZATION_MAX_FRAMES * PACKETIZATION_FRAME_MS:g}")
+        return ",".join(answer).encode('ascii')
+
+    @staticmethod
+    def _new_session_id() -> int:
+        return int.from_bytes(os.urandom(4), "big") or 1
+
+    @classmethod
+    def _parse_signal_offer(cls, payload: bytes) -> Tuple[int, int]:
+        """呼叫请求中对方的信令版本与会话 ID；旧版对端两者均为 0。"""
+        version, session_id = 0, 0
+        for token in cls._offer_tokens(payload):
+            key, _, value = token.partition('=')
+            try:
+                if key == "sig":
+                    # 只与同一版本的对端使用二进制信令；更早的版本退回 ASCII
+                    version = SIGNAL_PROTOCOL_VERSION if int(value) >= SIGNAL_PROTOCOL_VERSION else 0
+                elif key == "sid":
+                    session_id = int(value, 16) & 0xFFFFFFFF
+            except ValueError:
+                continue
+        return (version, session_id) if session_id else (0, 0)
+
+    def _begin_signal_session(self, session_id: int, peer_signal_version: int, peer_address: Optional[Tuple[str, int]]):
+        self.session_id = session_id
+        self.peer_signal_version = peer_signal_version
+        self.signal_peer_address = peer_address
+        self.reliable_signaling.reset()
+
+    def accept_signal_session(self, addr, packet_type: int, session_id: int, message_id: int = 0) -> bool:
+        """
+        二进制信令的会话检查：不属于当前会话的 (如上一通话迟到的重传) 丢弃。
+        带消息 ID 的信令先确认再去重——确认本身可能丢失，对方重传的副本同样需要确认。
+        """
+        needs_ack = message_id and packet_type != PacketType.ACK
+        if not self.session_id or session_id != self.session_id:
+            if needs_ack and packet_type == PacketType.HANGUP:
+                # 仍然确认，免得对方为一个早已结束的会话不停重试挂断
+                self.network_manager.send_packet(build_signal(PacketType.ACK, session_id, message_id=message_id), addr)
+            self.log(f"忽略来自 {addr} 的 {PacketType(packet_type).name}: 会话 {session_id:08x} 不是当前会话。", is_warning=True)
+            return False
+        if self.peer_signal_version < SIGNAL_PROTOCOL_VERSION:
+            # 主叫收到对方以二进制帧回应本端给出的会话 ID，此后改用二进制信令
+            self.peer_signal_version = SIGNAL_PROTOCOL_VERSION
+            self.signal_peer_address = addr
+            self.log(f"对方 {addr} 支持二进制信令 (版本 {SIGNAL_PROTOCOL_VERSION})。")
+        if needs_ack:
+            self.network_manager.send_packet(build_signal(PacketType.ACK, session_id, message_id=message_id), addr)
+            if self.reliable_signaling.is_duplicate(session_id, message_id):
+                return False
+        return True
+
+    def _peer_uses_binary_signaling(self, address) -> bool:
+        return self.peer_signal_version >= SIGNAL_PROTOCOL_VERSION and address == self.signal_peer_address
+
+    def _send_signal(self, packet_type: PacketType, address, payload: bytes = b"",
+                     on_acked: Optional[Callable[[], None]] = None, on_failed: Optional[Callable[[], None]] = None) -> bool:
+        """
+        按对方能力以二进制帧或旧版 ASCII 发送信令。需要确认的 (二进制对端的 RELIABLE_PACKET_TYPES，
+        旧版对端会回 ACK 的呼叫请求与挂断) 交给可靠层重传，以包类型为键；其余只发一次。
+        """
+        if self._peer_uses_binary_signaling(address):
+            if packet_type in RELIABLE_PACKET_TYPES:
+                message_id = self.reliable_signaling.next_message_id()
+                data = build_signal(packet_type, self.session_id, payload, message_id)
+                return self.reliable_signaling.send(packet_type, data, address, message_id, on_acked, on_failed)
+            return self.network_manager.send_packet(build_signal(packet_type, self.session_id, payload), address)
+        data = build_legacy_signal(packet_type, payload)
+        if packet_type in LEGACY_ACKNOWLEDGED_PACKET_TYPES:
+            return self.reliable_signaling.send(packet_type, data, address, 0, on_acked, on_failed)
+        return self.network_manager.send_packet(data, address)
 
     def _proceed_with_call_setup(self, is_accepting_call=False):
         if not is_accepting_call:
@@ -303,10 +781,31 @@ class CallStateManager:
         self.peer_wants_to_receive_audio = True
         self.my_speaker_switch_is_on = True
         self.send_sequence_number = 0
+        self._accepted_at = time.monotonic() if is_accepting_call else None
+        self.tx_codec = self._choose_codec() if is_accepting_call else create_preferred_codec(AUDIO_CODEC_PREFERENCE)
+        self.rx_codecs.clear()
+        self.vad.reset()
+        self.fec_encoder.reset()
+        self.fec_decoder.reset()
+        self.fec_controller.reset()
+        self.loss_monitor.reset()
+        self.red_encoder.reset()
+        self.bundler.reset()
+        self.packetization.reset()
+        if is_accepting_call and self.peer_max_packet_frames:
+            self.packetization.limit_frames(self.peer_max_packet_frames)
+        self._pending_parity_packets = []
+        self._last_receiver_report_time = 0.0
+        self._redundancy_playout_span = 0
+        self._peer_packetization_frames = 1
+        self._last_bundle_time = None
+        self.media_mode = self._choose_redundancy_mode() if is_accepting_call else RedundancyMode.LEGACY
+        self._configure_wire_rate(self._choose_wire_rate() if is_accepting_call else PYAUDIO_RATE)
         self.audio_manager.clear_played_sequence_numbers()
 
         if is_accepting_call:
-            self.network_manager.send_packet(SignalType.CALL_ACCEPTED_SIGNAL.value, self.peer_full_address)
+            self._log_negotiated_media()
+            self._send_signal(PacketType.CALL_ACCEPTED, self.peer_full_address, self._build_call_answer())
             self._send_my_speaker_status()
             self._play_notification_sound(SOUND_CALL_CONNECTED)
             self.set_app_state(AppState.IN_CALL, reason=f"已接听来自 {self.peer_full_address[0]} 的呼叫", peer_address_tuple=self.peer_full_address)
@@ -316,8 +815,7 @@ class CallStateManager:
     def _send_my_speaker_status(self):
         if self.peer_full_address:
             status_payload = b"ON" if self.my_speaker_switch_is_on else b"OFF"
-            signal = SignalType.SPEAKER_STATUS_SIGNAL_PREFIX.value + status_payload
-            self.network_manager.send_packet(signal, self.peer_full_address)
+            self._send_signal(PacketType.SPEAKER_STATUS, self.peer_full_address, status_payload)
 
     def _handle_local_hangup_action(self):
         target_address = self._determine_hangup_target_address()
@@ -343,7 +841,7 @@ class CallStateManager:
 
     def _terminate_call_session(self, final_state: AppState, reason: str, peer_address, *, send_hangup: bool, is_rejection: bool = False):
         self._cleanup_active_call_resources()
-        if self.call_request_ack_timer_id: self.master.after_cancel(self.call_request_ack_timer_id)
+        self._cancel_call_signals()
 
         if send_hangup and peer_address:
             self._send_hangup_and_begin_ack_wait(peer_address, is_rejection)
@@ -353,14 +851,14 @@ class CallStateManager:
 
     def _transition_to_call_ended_state(self, target_ended_state: AppState, reason: str, peer_address_tuple=None, cleanup_resources: bool = True, cancel_active_hangup_retries: bool = True):
         if cleanup_resources: self._cleanup_active_call_resources()
-        if self.call_request_ack_timer_id: self.master.after_cancel(self.call_request_ack_timer_id)
+        self._cancel_call_signals()
         
         final_peer_addr = peer_address_tuple or self.current_hangup_target_address or self.peer_full_address
         self._simple_reset_call_vars_and_set_state(reason, target_ended_state, final_peer_addr, cancel_active_hangup_retries=cancel_active_hangup_retries)
 
         if target_ended_state != AppState.CALL_ENDED_APP_CLOSING:
-            if self.final_idle_status_timer_id: self.master.after_cancel(self.final_idle_status_timer_id)
-            self.final_idle_status_timer_id = self.master.after(CALL_END_UI_RESET_DELAY_MS, self._finalize_ui_after_hangup_delay)
+            if self.final_idle_status_timer_id: self._cancel_timer(self.final_idle_status_timer_id)
+            self.final_idle_status_timer_id = self._schedule_timer(CALL_END_UI_RESET_DELAY_MS, self._finalize_ui_after_hangup_delay)
 
     def _finalize_ui_after_hangup_delay(self):
         self.final_idle_status_timer_id = None 
@@ -368,32 +866,36 @@ class CallStateManager:
             self.set_app_state(AppState.IDLE, "通话结束，恢复空闲")
 
     def _simple_reset_call_vars_and_set_state(self, reason, target_state, peer_addr, *, cancel_active_hangup_retries=True):
+        # 呼叫结束时仍在进行的打洞 (对方未响应) 不再需要
+        self._stop_punching()
         self.peer_full_address = None
         self.peer_address_for_call_attempt = None
         self.peer_wants_to_receive_audio = True
         self.my_speaker_switch_is_on = True
 
         if cancel_active_hangup_retries:
-            if self.hangup_ack_timer_id: self.master.after_cancel(self.hangup_ack_timer_id)
-            self.current_hangup_target_address = None
-            self.pending_call_rejection_ack_address = None
-            self.hangup_retry_count = 0
+            self._cancel_hangup_wait()
         self.set_app_state(target_state, reason=reason, peer_address_tuple=peer_addr)
 
     def _send_hangup_and_begin_ack_wait(self, target_address, is_rejection_context: bool):
         self.current_hangup_target_address = target_address
-        self.hangup_retry_count = 0 
         self.pending_call_rejection_ack_address = target_address if is_rejection_context else None
 
-        if self.network_manager.send_packet(SignalType.HANGUP_SIGNAL.value, self.current_hangup_target_address):
-            if self.hangup_ack_timer_id: self.master.after_cancel(self.hangup_ack_timer_id)
-            self.hangup_ack_timer_id = self.master.after(HANGUP_ACK_TIMEOUT_MS, self.handle_hangup_ack_timeout)
-        else: 
+        if not self._send_signal(PacketType.HANGUP, target_address,
+                                 on_acked=lambda: self._on_hangup_wait_finished(target_address, acknowledged=True),
+                                 on_failed=lambda: self._on_hangup_wait_finished(target_address, acknowledged=False)):
             self.current_hangup_target_address = None
             self.pending_call_rejection_ack_address = None
 
+    def _cancel_call_signals(self):
+        for packet_type in (PacketType.CALL_REQUEST, PacketType.CALL_ACCEPTED, PacketType.SPEAKER_STATUS):
+            self.reliable_signaling.cancel(packet_type)
+
     def _cleanup_active_call_resources(self):
-        if self.app_state != AppState.IN_CALL:
+        if self.app_state in PREWARM_MEDIA_STATES:
+            # 未接通的呼叫只有预热的音频流，播放从未开始
+            self._release_prewarmed_media(call_ending=True)
+        elif self.app_state != AppState.IN_CALL:
             self._stop_in_call_media()
 
     def _determine_hangup_target_address(self):
@@ -405,23 +907,78 @@ class CallStateManager:
         return self.current_hangup_target_address
 
     def _play_notification_sound(self, sound_file_name):
+        if winsound is None:
+            return
         sound_path = resource_path(sound_file_name)
         threading.Thread(target=lambda: winsound.PlaySound(sound_path, winsound.SND_FILENAME), daemon=True).start()
 
-    def _start_in_call_media(self):
-        self.log("媒体会话启动：打开音频流并启动发送线程。")
-        if not self.audio_manager.open_input_stream():
-            self._handle_call_error("麦克风打开失败", self.peer_full_address)
+    def _prewarm_media(self):
+        if not FAST_CONNECT_PREWARM_AUDIO or not self.audio_manager.is_initialized():
             return
-        if not self.audio_manager.open_output_stream():
-            self._handle_call_error("扬声器打开失败", self.peer_full_address)
+        threading.Thread(target=self._prewarm_media_target, daemon=True, name="AudioPrewarmThread").start()
+
+    def _prewarm_media_target(self):
+        with self._media_lock:
+            if self.app_state not in PREWARM_MEDIA_STATES or self.audio_manager.streams_open():
+                return
+            started = time.monotonic()
+            opened = self.audio_manager.open_input_stream() and self.audio_manager.open_output_stream()
+            elapsed_ms = (time.monotonic() - started) * 1000
+            if opened:
+                self.log(f"音频流已预热 (打开耗时 {elapsed_ms:.0f} ms)，接通后直接复用。")
+            else:
+                self.log("音频流预热失败，将在通话建立时重试。", is_warning=True)
+                self.audio_manager.close_input_stream()
+                self.audio_manager.close_output_stream()
+        # 打开期间呼叫可能已被取消或拒绝；那时的释放请求拿不到锁而被跳过，由这里补上
+        if self.app_state not in PREWARM_MEDIA_STATES and self.app_state != AppState.IN_CALL:
+            self._release_prewarmed_media()
+
+    def _release_prewarmed_media(self, call_ending: bool = False):
+        """call_ending: 呼叫正在结束但状态尚未离开振铃/等待接听，不必再按状态判断。"""
+        if not self._media_lock.acquire(blocking=False):
+            # 预热线程仍在打开设备，结束后会发现状态已变并自行释放
             return
+        try:
+            if not call_ending and (self.app_state in PREWARM_MEDIA_STATES or self.app_state == AppState.IN_CALL):
+                return
+            if self.audio_manager.audio_stream_in or self.audio_manager.audio_stream_out:
+                self.log("呼叫未接通，关闭预热的音频流。")
+                self.audio_manager.close_input_stream()
+                self.audio_manager.close_output_stream()
+        finally:
+            self._media_lock.release()
 
+    def _start_in_call_media(self):
+        with self._media_lock:
+            if self.audio_manager.streams_open():
+                self.log("媒体会话启动：复用预热的音频流并启动发送线程。")
+                self.audio_manager.resume_warm_streams()
+            else:
+                self.log("媒体会话启动：打开音频流并启动发送线程。")
+                if not self.audio_manager.open_input_stream():
+                    self._handle_call_error("麦克风打开失败", self.peer_full_address)
+                    return
+                if not self.audio_manager.open_output_stream():
+                    self._handle_call_error("扬声器打开失败", self.peer_full_address)
+                    return
+        self.audio_manager.start_playout()
+
+        self.media_sender = self.network_manager.create_media_sender(self.peer_full_address)
+        if self.media_sender is None:
+            self._handle_call_error("网络套接字不可用", self.peer_full_address)
+            return
+        if self.network_manager.keepalive:
+            # 静音或对方关闭扬声器时不发媒体包，由保活维持双方 NAT 映射
+            self.network_manager.keepalive.set_target("peer", self.peer_full_address)
         self.send_thread = threading.Thread(target=self._send_audio_loop_target, daemon=True, name="SendAudioThread")
         self.send_thread.start()
 
     def _stop_in_call_media(self):
         self.log("媒体会话停止：关闭音频流并停止发送线程。")
+        if self.network_manager.keepalive:
+            self.network_manager.keepalive.set_target("peer", None)
+        self.audio_manager.stop_playout()
         self.audio_manager.close_input_stream()
         self.audio_manager.close_output_stream()
         self.audio_manager.clear_played_sequence_numbers()
@@ -429,29 +986,92 @@ class CallStateManager:
             self.send_thread.join(timeout=0.25)
         self.send_thread = None
 
+    def _send_datagram(self, datagram):
+        if datagram:
+            self.media_sender.send(datagram)
+            if self._accepted_at is not None:
+                self._log_connect_latency()
+
+    def _log_connect_latency(self):
+        accepted_at, self._accepted_at = self._accepted_at, None
+        if accepted_at is not None:
+            self.log(f"接通耗时: 从接听到发出首个音频数据报 {(time.monotonic() - accepted_at) * 1000:.1f} ms")
+
+    def _apply_packetization(self):
+        frames_per_packet = self.packetization.frames_per_packet
+        if frames_per_packet != self.bundler.frames_per_packet:
+            self._send_datagram(self.bundler.set_frames_per_packet(frames_per_packet))
+        # 一个数据报丢失即丢失连续 frames_per_packet 帧，冗余帧距离需跨过整个数据报
+        self.red_encoder.distance = max(RED_DISTANCE_FRAMES, self.bundler.frames_per_packet)
+
+    def _send_media_frame(self, seq_num: int, payload_type: int, payload: bytes):
+        if self.media_mode is RedundancyMode.RED:
+            self._send_datagram(self.bundler.add_red_frame(seq_num, payload_type, payload,
+                                                           *self.red_encoder.next_redundancy(seq_num, payload_type, payload)))
+            return
+        self._send_datagram(self.bundler.add_frame(seq_num, payload_type, payload))
+        self._pending_parity_packets += self.fec_encoder.configure(*self.fec_controller.current_setting(self.bundler.frames_per_packet))
+        self._pending_parity_packets += self.fec_encoder.add(seq_num, payload_type, payload)
+
+    def _end_media_frame(self):
+        self._send_datagram(self.bundler.tick())
+        if self._pending_parity_packets:
+            # 校验包单独发送，不与其保护的数据帧放进同一数据报；先发出已积累的数据帧，避免校验包先于数据到达
+            self._send_datagram(self.bundler.flush())
+            for parity_packet in self._pending_parity_packets:
+                self.media_sender.send(parity_packet)
+            self._pending_parity_packets = []
+
     def _send_audio_loop_target(self):
         self.log("发送线程已启动。")
         read_error_count = 0
+        frames_since_sid = None
+        dtx_stats = {"speech_frames": 0, "suppressed_frames": 0, "sid_packets": 0}
         while self.app_state == AppState.IN_CALL:
+            self._maybe_send_receiver_report()
             should_send = (not self.audio_manager.mic_muted) and self.peer_wants_to_receive_audio
             if not should_send:
-                time.sleep(PYAUDIO_CHUNK / PYAUDIO_RATE)
+                self._send_datagram(self.bundler.flush())
+                self.audio_manager.discard_mic_input()
+                time.sleep(self.audio_manager.frame_duration_s)
                 continue
             try:
                 audio_data = self.audio_manager.read_chunk_from_mic()
                 if audio_data is None: break
-                packet = struct.pack("!I", self.send_sequence_number) + audio_data
-                self.network_manager.send_packet(packet, self.peer_full_address)
-                self.network_manager.send_packet(packet, self.peer_full_address) # FEC
+                if self.media_mode is RedundancyMode.LEGACY:
+                    self.media_sender.send_legacy_audio(self.send_sequence_number, audio_data, copies=2) # 旧版对端: 整包重复发送
+                    if self._accepted_at is not None:
+                        self._log_connect_latency()
+                    self.send_sequence_number = (self.send_sequence_number + 1) % MAX_SEQ_NUM
+                    continue
+                self._apply_packetization()
+                if VAD_ENABLED and not self.vad.is_speech(audio_data):
+                    if frames_since_sid is not None and frames_since_sid < CN_SID_INTERVAL_FRAMES:
+                        frames_since_sid += 1
+                        dtx_stats["suppressed_frames"] += 1
+                        payload = None
+                    else:
+                        frames_since_sid = 0
+                        dtx_stats["sid_packets"] += 1
+                        payload_type, payload = COMFORT_NOISE_PAYLOAD_TYPE, SID_PAYLOAD.pack(self.vad.comfort_noise_level())
+                else:
+                    frames_since_sid = None
+                    dtx_stats["speech_frames"] += 1
+                    payload_type, payload = self.tx_codec.payload_type, self.tx_codec.encode(audio_data)
+                if payload is not None:
+                    self._send_media_frame(self.send_sequence_number, payload_type, payload)
+                self._end_media_frame()
                 self.send_sequence_number = (self.send_sequence_number + 1) % MAX_SEQ_NUM
             except (IOError, OSError) as e: 
                 read_error_count += 1
                 if read_error_count >= MIC_READ_MAX_ERRORS:
                     self.log("麦克风连续读取错误过多，终止呼叫。", is_error=True)
-                    self.master.after(0, self._handle_call_error, "麦克风连续读取错误", self.peer_full_address)
+                    self._schedule_timer(0, self._handle_call_error, "麦克风连续读取错误", self.peer_full_address)
                     break 
             except Exception as e:
                 self.log(f"发送线程发生未知错误: {e}", is_error=True)
-                self.master.after(0, self._handle_call_error, f"音频发送未知错误", self.peer_full_address)
+                self._schedule_timer(0, self._handle_call_error, f"音频发送未知错误", self.peer_full_address)
                 break 
-        self.log("发送线程已停止。")
\ No newline at end of file
+        self.log(f"发送线程已停止。DTX 统计: {dtx_stats}, 数据报: {self.bundler.datagrams_sent} (含媒体包 {self.bundler.packets_bundled}), "
+                 f"FEC 校验包: {self.fec_encoder.parity_packets_sent}, "
+                 f"FEC 接收: {self.fec_decoder.stats}, 发送失败: {self.media_sender.send_errors if self.media_sender else 0}")
\ No newline at end of file
@@ -86,6 +86,9 @@ class SingleThreadPreciseTimer:
             self._thread.join(timeout=1.0)
 
 class FeatureCodeManager:
+    # 扩展特征码: "v2;类型:IP:端口[@令牌];..."，携带全部候选地址；旧版客户端只能解析 "IP:端口" 形式
+    EXTENDED_PREFIX = "v2;"
+
     def __init__(self, key):
         self.key = key
 
@@ -93,11 +96,17 @@ class FeatureCodeManager:
         key_len = len(key_bytes)
         return bytes([s_bytes[i] ^ key_bytes[i % key_len] for i in range(len(s_bytes))])
 
-    def generate_feature_code(self, public_ip, public_port):
-        if not public_ip or public_port is None:
+    def generate_feature_code(self, public_ip, public_port, candidates=None):
+        """candidates: [(类型, IP, 端口[, 令牌])]；除公网地址外还有其他候选时生成扩展特征码。"""
+        extra = [c for c in candidates or [] if (c[1], c[2]) != (public_ip, public_port)]
+        if (not public_ip or public_port is None) and not extra:
             return None,
         try:
             plain_text = f"{public_ip}:{public_port}"
+            if extra:
+                listed = ([("srflx", public_ip, public_port)] if public_ip and public_port is not None else []) + extra
+                plain_text = self.EXTENDED_PREFIX + ";".join(f"{kind}:{ip}:{port}" + "".join(f"@{token}" for token in token_part)
+                                                             for kind, ip, port, *token_part in listed)
             key_bytes = self.key.encode('utf-8')
             xored_bytes = self._xor_string(plain_text.encode('utf-8'), key_bytes)
             feature_code = base64.urlsafe_b64encode(xored_bytes).decode('utf-8')
@@ -106,31 +115,65 @@ class FeatureCodeManager:
             return None, f"生成错误: {e}"
 
     def parse_feature_code(self, code_str):
+        """返回首选地址 (扩展特征码中的第一个候选) (ip, port, 错误信息)。"""
+        candidates, err_msg = self.parse_feature_code_candidates(code_str)
+        if err_msg:
+            return None, None, err_msg
+        _, ip, port = candidates[0][:3]
+        return ip, port, None
+
+    @staticmethod
+    def _parse_address(text):
+        if ':' not in text:
+            raise ValueError("解析出的文本不含':'分隔符")
+        ip, port_str = text.rsplit(':', 1)
+        port = int(port_str)
+        socket.inet_aton(ip)
+        if not (1 <= port <= 65535):
+            raise ValueError("端口号超出范围 (1-65535)")
+        return ip, port
+
+    def parse_feature_code_candidates(self, code_str):
+        """返回 ([(类型, IP, 端口[, 令牌])], 错误信息)；旧版特征码只含一个 srflx 候选。"""
         try:
             key_bytes = self.key.encode('utf-8')
             decoded_xored_bytes = base64.urlsafe_b64decode(code_str.encode('utf-8'))
             plain_text_bytes = self._xor_string(decoded_xored_bytes, key_bytes)
             plain_text = plain_text_bytes.decode('utf-8')
 
-            if ':' not in plain_text:
-                raise ValueError("解析出的文本不含':'分隔符")
-
-            ip, port_str = plain_text.split(':', 1)
-            port = int(port_str)
-            socket.inet_aton(ip)
-            if not (1 <= port <= 65535):
-                raise ValueError("端口号超出范围 (1-65535)")
-            return ip, port, None
+            if not plain_text.startswith(self.EXTENDED_PREFIX):
+                return [("srflx", *self._parse_address(plain_text))], None
+            candidates = []
+            for entry in plain_text[len(self.EXTENDED_PREFIX):].split(';'):
+                kind, _, address = entry.partition(':')
+                address, _, token = address.partition('@')
+                candidates.append((kind, *self._parse_address(address)) + ((token,) if token else ()))
+            if not candidates:
+                raise ValueError("扩展特征码不含候选地址")
+            return candidates, None
 
         except (binascii.Error, UnicodeDecodeError) as e:
-            return None, None, f"格式错误: {e}"
+            return None, f"格式错误: {e}"
         except ValueError as e:
-            return None, None, f"内容无效: {e}"
+            return None, f"内容无效: {e}"
         except (socket.error, OSError) as e:
-             return None, None, f"IP地址无效: {e}"
+             return None, f"IP地址无效: {e}"
         except Exception as e:
-            return None, None, f"未知解析错误: {e}"
+            return None, f"未知解析错误: {e}"
+
+def sequence_delta(seq_a, seq_b, modulus=2**32):
+    delta = (seq_a - seq_b) % modulus
+    if delta >= modulus // 2:
+        delta -= modulus
+    return delta
 
 def resource_path(relative_path):
     base_path = getattr(sys, '_MEIPASS', os.path.abspath("."))
-    return os.path.join(base_path, relative_path)
\ No newline at end of file
+    return os.path.join(base_path, relative_path)
+
+def user_data_path(filename):
+    """用户级可写数据目录 (Windows 为 %APPDATA%\\OtterVoice) 下的文件路径；目录按需创建。"""
+    base_dir = os.environ.get("APPDATA") or os.path.join(os.path.expanduser("~"), ".config")
+    data_dir = os.path.join(base_dir, "OtterVoice")
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
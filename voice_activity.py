@@ -0,0 +1,83 @@
+import os
+import math
+import struct
+import warnings
+from array import array
+
+from config import *
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+SID_PAYLOAD = struct.Struct("!H")
+UNIFORM_INT16_RMS = 32768 / math.sqrt(3)
+
+def _frame_rms(pcm):
+    if audioop:
+        return audioop.rms(pcm, 2)
+    samples = array('h', pcm)
+    return int(math.sqrt(sum(s * s for s in samples) / len(samples))) if samples else 0
+
+def _zero_crossings(pcm):
+    if audioop:
+        return audioop.cross(pcm, 2)
+    samples = array('h', pcm)
+    return sum(1 for a, b in zip(samples, samples[1:]) if (a < 0) != (b < 0))
+
+class VoiceActivityDetector:
+    """
+    基于能量与过零率的逐帧语音活动检测。噪声底噪自适应（快降慢升），
+    语音结束后保持 VAD_HANGOVER_FRAMES 帧以免切掉尾音。
+    """
+    def __init__(self):
+        self.noise_rms = float(VAD_INITIAL_NOISE_RMS)
+        self._hangover = 0
+        self.last_rms = 0
+
+    def reset(self):
+        self.noise_rms = float(VAD_INITIAL_NOISE_RMS)
+        self._hangover = 0
+        self.last_rms = 0
+
+    def is_speech(self, pcm: bytes) -> bool:
+        rms = _frame_rms(pcm)
+        self.last_rms = rms
+        sample_count = len(pcm) // 2
+        zcr = _zero_crossings(pcm) / sample_count if sample_count else 0.0
+
+        voiced = rms >= VAD_MIN_SPEECH_RMS and rms > self.noise_rms * VAD_ENERGY_THRESHOLD_RATIO
+        unvoiced = rms > self.noise_rms * VAD_UNVOICED_ENERGY_RATIO and zcr >= VAD_ZCR_UNVOICED_MIN
+
+        gain = VAD_NOISE_FALL_RATE if rms < self.noise_rms else VAD_NOISE_RISE_RATE
+        self.noise_rms += (rms - self.noise_rms) * gain
+
+        if voiced or unvoiced:
+            self._hangover = VAD_HANGOVER_FRAMES
+            return True
+        if self._hangover > 0:
+            self._hangover -= 1
+            return True
+        return False
+
+    def comfort_noise_level(self) -> int:
+        return int(min(self.noise_rms, 0xFFFF))
+
+class ComfortNoiseGenerator:
+    """按对方 SID 包中的噪声电平合成舒适噪声。"""
+    def __init__(self, frame_samples: int):
+        self.frame_samples = frame_samples
+        self.level_rms = 0
+
+    def set_level(self, level_rms: int):
+        self.level_rms = level_rms
+
+    def generate(self) -> bytes:
+        noise = os.urandom(self.frame_samples * 2)
+        factor = self.level_rms / UNIFORM_INT16_RMS
+        if audioop:
+            return audioop.mul(noise, 2, factor)
+        return array('h', [int(s * factor) for s in array('h', noise)]).tobytes()